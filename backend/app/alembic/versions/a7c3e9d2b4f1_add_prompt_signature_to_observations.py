@@ -0,0 +1,25 @@
+"""Add prompt signature and contract to studio observations
+
+Revision ID: a7c3e9d2b4f1
+Revises: f1a2b3c4d5e6
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9d2b4f1'
+down_revision = 'f1a2b3c4d5e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('studioobservation', sa.Column('prompt_signature', sa.JSON(), nullable=False, server_default='[]'))
+    op.add_column('studioobservation', sa.Column('contract', sa.JSON(), nullable=False, server_default='{}'))
+
+
+def downgrade():
+    op.drop_column('studioobservation', 'contract')
+    op.drop_column('studioobservation', 'prompt_signature')
@@ -0,0 +1,44 @@
+"""Add generation job queue
+
+Revision ID: b8d4f0e2c6a1
+Revises: a7c3e9d2b4f1
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'b8d4f0e2c6a1'
+down_revision = 'a7c3e9d2b4f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('generationjob',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('project_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('owner_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('params', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('worker_id', sa.String(length=100), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('error_message', sa.String(length=2000), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['project.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_generationjob_created_at'), 'generationjob', ['created_at'], unique=False)
+    op.create_index(op.f('ix_generationjob_status'), 'generationjob', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_generationjob_status'), table_name='generationjob')
+    op.drop_index(op.f('ix_generationjob_created_at'), table_name='generationjob')
+    op.drop_table('generationjob')
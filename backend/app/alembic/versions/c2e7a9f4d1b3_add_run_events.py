@@ -0,0 +1,31 @@
+"""Add run event log
+
+Revision ID: c2e7a9f4d1b3
+Revises: b8d4f0e2c6a1
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c2e7a9f4d1b3'
+down_revision = 'b8d4f0e2c6a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('runevent',
+        sa.Column('job_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('message', sa.JSON(), nullable=False),
+        sa.ForeignKeyConstraint(['job_id'], ['generationjob.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('job_id', 'seq')
+    )
+
+
+def downgrade():
+    op.drop_table('runevent')
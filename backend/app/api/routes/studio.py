@@ -1,75 +1,81 @@
 import hashlib
 import json
+import math
 import time
 import uuid
 from datetime import datetime
-from typing import Any, List
+from typing import Any, AsyncIterator, List
 
-from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-# Redis for rate limiting (optional)
-try:
-    import redis
-    REDIS_AVAILABLE = True
-except ImportError:
-    REDIS_AVAILABLE = False
-
-from app.api.deps import CurrentUser, get_db
+from app import async_crud
+from app.api.deps import AsyncSessionDep, CurrentUser, get_db
 from app.crud import (
     create_project, get_project, get_projects_by_owner, update_project, delete_project,
     create_snapshot, get_snapshot, get_snapshots_by_project, update_snapshot, delete_snapshot,
     create_code_generation, get_code_generation, get_code_generations_by_project, update_code_generation, delete_code_generation
 )
 from app.core.config import settings
+from app.core.db import async_engine
 from app.models import (
     Project, ProjectCreate, ProjectUpdate, ProjectPublic, ProjectsPublic,
     Snapshot, SnapshotCreate, SnapshotUpdate, SnapshotPublic, SnapshotsPublic,
     CodeGeneration, CodeGenerationCreate, CodeGenerationPublic, CodeGenerationsPublic,
     StreamingMessage, Message, PropInspectorUpdate, PropAnnotation,
-    PluginManifest, TestRun, AgentStage
+    AgentStage,
+    GenerationJob, GenerationJobCreate, GenerationJobPublic, JOB_TERMINAL_STATUSES
 )
-from app.services.openai_service import OpenAIService
+from app.services.job_queue import is_final, job_queue, progress_broker, status_message
+from app.services.job_worker import WorkerPool
+from app.services.llm_governor import estimate_tokens, llm_caller
+from app.services.openai_service import openai_service
 from app.services.test_driven_agent import TestDrivenAgent
 from app.services.plugin_system import PluginSystem, initialize_default_plugins
+from app.services.rate_limiter import RateLimitResult, format_retry_after, rate_limiter
+from app.services.run_events import run_event_log
 
 router = APIRouter()
 
-# Initialize services
-openai_service = OpenAIService()
-test_driven_agent = TestDrivenAgent()
+# Initialize services (the OpenAI service is shared so one governor covers the worker)
 plugin_system = PluginSystem()
+test_driven_agent = TestDrivenAgent(plugin_system)
+
+
+async def run_generation_job(job: GenerationJob) -> AsyncIterator[StreamingMessage]:
+    """Run a queued generation; the job outlives the connection that submitted it"""
+    # Charge the job's LLM calls to its owner
+    llm_caller.set(str(job.owner_id))
+    # The agent opens a short session for each unit of database work, so no
+    # connection is held for the length of the run
+    async for message in test_driven_agent.run_test_driven_generation(
+        prompt=job.params["prompt"],
+        project_id=job.project_id,
+        skip_tests=job.params.get("skip_tests", False),
+        use_plugins=job.params.get("use_plugins", []),
+        owner_id=job.owner_id
+    ):
+        yield message
+
+
+# Workers started and stopped with the application (see main.lifespan)
+generation_workers = WorkerPool(
+    job_queue,
+    progress_broker,
+    run_event_log,
+    run_generation_job,
+    size=settings.GENERATION_WORKERS,
+    heartbeat_seconds=settings.JOB_HEARTBEAT_SECONDS
+)
 
-# Redis client for rate limiting
-if REDIS_AVAILABLE and settings.ENVIRONMENT != "local":
-    redis_client = redis.Redis(host='localhost', port=6379, db=0)
-else:
-    redis_client = None
+async def check_rate_limit(user_id: str, tokens: int) -> RateLimitResult:
+    """Charge a request's estimated LLM tokens to the user's allowance"""
+    return await rate_limiter.acquire(user_id, tokens)
 
 
-async def check_rate_limit(user_id: str) -> bool:
-    """Check if user has exceeded rate limit (60 prompts/hour)"""
-    if not redis_client:
-        return True  # No rate limiting if Redis unavailable
-    
-    try:
-        key = f"rate_limit:{user_id}"
-        current = redis_client.get(key)
-        
-        if current is None:
-            # First request
-            redis_client.setex(key, 3600, 1)  # 1 hour expiry
-            return True
-        elif int(current) < 60:
-            # Under limit
-            redis_client.incr(key)
-            return True
-        else:
-            # Over limit
-            return False
-    except:
-        # Redis error, allow request
-        return True
+def rate_limit_message(result: RateLimitResult) -> str:
+    return f"Rate limit exceeded. Please try again in {format_retry_after(result.retry_after)}."
 
 
 async def verify_websocket_token(token: str | None) -> str | None:
@@ -218,6 +224,70 @@ def get_code_generation_endpoint(
     return generation
 
 
+# Generation Jobs
+
+@router.post("/projects/{project_id}/jobs/", response_model=GenerationJobPublic, status_code=202)
+async def submit_generation_job(
+    *,
+    session: AsyncSessionDep,
+    current_user: CurrentUser,
+    project_id: uuid.UUID,
+    job_in: GenerationJobCreate,
+) -> Any:
+    """Queue a test-driven generation; follow it over the WebSocket with its id"""
+    project = await async_crud.get_project(session=session, project_id=project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    tokens = TestDrivenAgent.estimate_run_tokens(job_in.prompt, job_in.skip_tests)
+    limit = await check_rate_limit(str(current_user.id), tokens)
+    if not limit.allowed:
+        raise HTTPException(
+            status_code=429,
+            detail=rate_limit_message(limit),
+            headers={"Retry-After": str(math.ceil(limit.retry_after))}
+        )
+    
+    job = GenerationJob(project_id=project_id, owner_id=current_user.id, params=job_in.model_dump())
+    return await job_queue.submit(job)
+
+
+@router.get("/jobs/{job_id}", response_model=GenerationJobPublic)
+async def get_generation_job(*, current_user: CurrentUser, job_id: uuid.UUID) -> Any:
+    """Get a generation job's status"""
+    job = await job_queue.get(job_id)
+    if not job or job.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=GenerationJobPublic)
+async def cancel_generation_job(*, current_user: CurrentUser, job_id: uuid.UUID) -> Any:
+    """Cancel a queued or running job; a running job stops at its next heartbeat"""
+    job = await job_queue.get(job_id)
+    if not job or job.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job = await job_queue.cancel(job_id)
+    await progress_broker.publish(job.id, status_message(job))
+    return job
+
+
+async def stream_job(
+    websocket: WebSocket, job: GenerationJob, progress: AsyncIterator[dict], last_seq: int = 0
+) -> None:
+    """Send a job's logged messages after last_seq, then its live progress until it finishes"""
+    await websocket.send_json(status_message(job))
+    finished = job.status in JOB_TERMINAL_STATUSES
+    final = False
+    async for message in run_event_log.replay(job.id, last_seq, None if finished else progress):
+        await websocket.send_json(message)
+        final = is_final(message)
+    if finished and not final:
+        # Finished without a logged status, e.g. cancelled while queued
+        await websocket.send_json(status_message(job))
+
+
 # Enhanced WebSocket with Test-Driven Generation
 
 @router.websocket("/projects/{project_id}/generate/stream")
@@ -225,9 +295,13 @@ async def websocket_generate_code(
     websocket: WebSocket,
     project_id: uuid.UUID,
     token: str = Query(None),
-    session: Session = Depends(get_db),
 ):
-    """WebSocket endpoint for streaming test-driven code generation"""
+    """WebSocket endpoint for streaming test-driven code generation
+    
+    The connection can stay open for hours, so it never holds a database
+    session: each message that needs one opens its own and returns the
+    connection to the pool when done.
+    """
     
     await websocket.accept()
     
@@ -238,14 +312,12 @@ async def websocket_generate_code(
         await websocket.close()
         return
     
-    # Check rate limiting
-    if not await check_rate_limit(user_id):
-        await websocket.send_json({"type": "error", "content": "Rate limit exceeded. Please try again later."})
-        await websocket.close()
-        return
+    # Charge every LLM call made on this connection to the user
+    llm_caller.set(user_id)
     
     # Verify project access
-    project = get_project(session=session, project_id=project_id)
+    async with AsyncSession(async_engine) as session:
+        project = await async_crud.get_project(session=session, project_id=project_id)
     if not project or str(project.owner_id) != user_id:
         await websocket.send_json({"type": "error", "content": "Project not found or access denied"})
         await websocket.close()
@@ -265,14 +337,40 @@ async def websocket_generate_code(
                     await websocket.send_json({"type": "error", "content": "Prompt is required"})
                     continue
                 
-                # Start test-driven generation
-                async for message in test_driven_agent.run_test_driven_generation(
-                    prompt=prompt,
+                tokens = TestDrivenAgent.estimate_run_tokens(prompt, skip_tests)
+                limit = await check_rate_limit(user_id, tokens)
+                if not limit.allowed:
+                    await websocket.send_json({"type": "error", "content": rate_limit_message(limit)})
+                    continue
+                
+                # Queue the generation and follow its progress; a worker runs it,
+                # so it carries on if this connection drops
+                job = GenerationJob(
                     project_id=project_id,
-                    session=session,
-                    skip_tests=skip_tests
-                ):
-                    await websocket.send_json(message.model_dump())
+                    owner_id=uuid.UUID(user_id),
+                    params={"prompt": prompt, "skip_tests": skip_tests, "use_plugins": use_plugins}
+                )
+                # Subscribe before submitting so no progress is missed
+                async with progress_broker.subscribe(job.id) as progress:
+                    job = await job_queue.submit(job)
+                    await stream_job(websocket, job, progress)
+            
+            elif data.get("type") == "subscribe":
+                # Re-attach to a run after reconnecting: replay what the client
+                # missed since last_seq, then carry on live
+                try:
+                    job_id = uuid.UUID(str(data.get("run_id")))
+                    last_seq = int(data.get("last_seq", 0))
+                except (TypeError, ValueError):
+                    await websocket.send_json({"type": "error", "content": "A valid run_id is required"})
+                    continue
+                
+                async with progress_broker.subscribe(job_id) as progress:
+                    job = await job_queue.get(job_id)
+                    if not job or str(job.owner_id) != user_id:
+                        await websocket.send_json({"type": "error", "content": "Run not found"})
+                        continue
+                    await stream_job(websocket, job, progress, last_seq)
             
             elif data.get("type") == "improve":
                 code = data.get("code", "")
@@ -282,6 +380,12 @@ async def websocket_generate_code(
                     await websocket.send_json({"type": "error", "content": "Code and improvement request are required"})
                     continue
                 
+                tokens = estimate_tokens(code + improvement_request) + openai_service.config.max_tokens
+                limit = await check_rate_limit(user_id, tokens)
+                if not limit.allowed:
+                    await websocket.send_json({"type": "error", "content": rate_limit_message(limit)})
+                    continue
+                
                 # Stream improved code
                 async for message in openai_service.improve_code(code, improvement_request):
                     await websocket.send_json(message.model_dump())
@@ -294,7 +398,7 @@ async def websocket_generate_code(
                 
                 if component_id and prop_name is not None:
                     # Apply prop patch and trigger hot reload
-                    await handle_prop_patch(websocket, component_id, prop_name, new_value, session)
+                    await handle_prop_patch(websocket, component_id, prop_name, new_value)
             
             elif data.get("type") == "use_plugin":
                 # Execute plugin
@@ -303,7 +407,7 @@ async def websocket_generate_code(
                 
                 if plugin_name and input_files:
                     try:
-                        output_files = await plugin_system.execute_plugin(plugin_name, input_files, session)
+                        output_files = await plugin_system.execute_plugin(plugin_name, input_files)
                         await websocket.send_json({
                             "type": "plugin_result",
                             "plugin_name": plugin_name,
@@ -323,7 +427,7 @@ async def websocket_generate_code(
         await websocket.close()
 
 
-async def handle_prop_patch(websocket: WebSocket, component_id: str, prop_name: str, new_value: Any, session: Session):
+async def handle_prop_patch(websocket: WebSocket, component_id: str, prop_name: str, new_value: Any):
     """Handle prop inspector updates with hot reload"""
     
     # Send hot reload message
@@ -338,33 +442,18 @@ async def handle_prop_patch(websocket: WebSocket, component_id: str, prop_name:
 # Plugin Management Routes
 
 @router.get("/plugins/", response_model=List[dict])
-async def get_plugins(session: Session = Depends(get_db)):
+async def get_plugins():
     """Get all available plugins"""
     
-    # Initialize plugin system if needed
-    await plugin_system.initialize(session)
-    
-    plugins = session.query(PluginManifest).all()
-    return [
-        {
-            "id": str(plugin.id),
-            "name": plugin.name,
-            "version": plugin.version,
-            "description": plugin.description,
-            "enabled": plugin.enabled,
-            "verified": plugin.verified,
-            "inputs": plugin.inputs,
-            "outputs": plugin.outputs,
-            "estimated_cost_ms": plugin.estimated_cost_ms
-        }
-        for plugin in plugins
-    ]
+    if plugin_system.plugins_json is None:
+        # Built at startup; only missing when the app runs without its lifespan
+        await plugin_system.refresh()
+    return Response(content=plugin_system.plugins_json, media_type="application/json")
 
 
 @router.post("/plugins/install")
 async def install_plugin(
     *,
-    session: Session = Depends(get_db),
     current_user: CurrentUser,
     git_url: str
 ):
@@ -374,7 +463,7 @@ async def install_plugin(
         raise HTTPException(status_code=403, detail="Only administrators can install plugins")
     
     try:
-        plugin = await plugin_system.install_plugin_from_url(git_url, session)
+        plugin = await plugin_system.install_plugin_from_url(git_url)
         return {
             "message": f"Plugin {plugin.name} installed successfully",
             "plugin": {
@@ -390,7 +479,6 @@ async def install_plugin(
 @router.delete("/plugins/{plugin_name}")
 async def remove_plugin(
     *,
-    session: Session = Depends(get_db),
     current_user: CurrentUser,
     plugin_name: str
 ):
@@ -400,29 +488,19 @@ async def remove_plugin(
         raise HTTPException(status_code=403, detail="Only administrators can remove plugins")
     
     try:
-        await plugin_system.remove_plugin(plugin_name, session)
+        await plugin_system.remove_plugin(plugin_name)
         return {"message": f"Plugin {plugin_name} removed successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/plugins/tools")
-async def get_available_tools(session: Session = Depends(get_db)):
+@router.get("/plugins/tools", response_model=List[dict])
+async def get_available_tools():
     """Get available plugin tools"""
     
-    await plugin_system.initialize(session)
-    tools = plugin_system.get_available_tools()
-    
-    return [
-        {
-            "name": tool.name,
-            "description": tool.description,
-            "inputs": tool.inputs,
-            "outputs": tool.outputs,
-            "cost_estimate": tool.cost_estimate
-        }
-        for tool in tools
-    ]
+    if plugin_system.tools_json is None:
+        await plugin_system.refresh()
+    return Response(content=plugin_system.tools_json, media_type="application/json")
 
 
 # Test Run Management
@@ -430,7 +508,7 @@ async def get_available_tools(session: Session = Depends(get_db)):
 @router.get("/projects/{project_id}/test-runs/")
 async def get_test_runs(
     *,
-    session: Session = Depends(get_db),
+    session: AsyncSessionDep,
     current_user: CurrentUser,
     project_id: uuid.UUID,
     skip: int = 0,
@@ -438,18 +516,13 @@ async def get_test_runs(
 ):
     """Get test runs for project"""
     
-    project = get_project(session=session, project_id=project_id)
+    project = await async_crud.get_project(session=session, project_id=project_id)
     if not project or project.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    from sqlmodel import select
-    test_runs = session.exec(
-        select(TestRun)
-        .where(TestRun.project_id == project_id)
-        .offset(skip)
-        .limit(limit)
-        .order_by(TestRun.created_at.desc())
-    ).all()
+    test_runs = await async_crud.get_test_runs_by_project(
+        session=session, project_id=project_id, skip=skip, limit=limit
+    )
     
     return [
         {
@@ -468,18 +541,18 @@ async def get_test_runs(
 @router.get("/test-runs/{test_run_id}")
 async def get_test_run_details(
     *,
-    session: Session = Depends(get_db),
+    session: AsyncSessionDep,
     current_user: CurrentUser,
     test_run_id: uuid.UUID
 ):
     """Get detailed test run information"""
     
-    test_run = session.get(TestRun, test_run_id)
+    test_run = await async_crud.get_test_run(session=session, test_run_id=test_run_id)
     if not test_run:
         raise HTTPException(status_code=404, detail="Test run not found")
     
     # Check project ownership
-    project = get_project(session=session, project_id=test_run.project_id)
+    project = await async_crud.get_project(session=session, project_id=test_run.project_id)
     if not project or project.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
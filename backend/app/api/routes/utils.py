@@ -1,8 +1,12 @@
+from typing import Any
+
 from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
 from app.models import Message
+from app.services.db_metrics import db_metrics
+from app.services.openai_service import openai_service
 from app.utils import generate_test_email, send_email
 
 router = APIRouter(prefix="/utils", tags=["utils"])
@@ -29,3 +33,23 @@ def test_email(email_to: EmailStr) -> Message:
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get("/health-check/llm")
+async def llm_health_check() -> dict[str, Any]:
+    """
+    LLM provider circuit breaker state.
+    """
+    return openai_service.get_breaker_stats()
+
+
+@router.get(
+    "/db-metrics/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+async def db_pool_metrics() -> dict[str, Any]:
+    """
+    Connection pool usage per engine: checkout waits and timeouts,
+    connections in use and in overflow, hold times, invalidations.
+    """
+    return db_metrics.get_stats()
@@ -0,0 +1,45 @@
+"""Async counterparts of the app.crud functions used by async routes and the agent"""
+
+import uuid
+from typing import Any
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models import Project, StudioObservation, TestRun
+
+
+async def get_project(*, session: AsyncSession, project_id: uuid.UUID) -> Project | None:
+    return await session.get(Project, project_id)
+
+
+# Test Run CRUD operations
+async def create_test_run(*, session: AsyncSession, project_id: uuid.UUID, **kwargs: Any) -> TestRun:
+    db_test_run = TestRun(project_id=project_id, **kwargs)
+    session.add(db_test_run)
+    await session.commit()
+    await session.refresh(db_test_run)
+    return db_test_run
+
+
+async def get_test_run(*, session: AsyncSession, test_run_id: uuid.UUID) -> TestRun | None:
+    return await session.get(TestRun, test_run_id)
+
+
+async def get_test_runs_by_project(*, session: AsyncSession, project_id: uuid.UUID, skip: int = 0, limit: int = 100) -> list[TestRun]:
+    statement = select(TestRun).where(TestRun.project_id == project_id).offset(skip).limit(limit).order_by(TestRun.created_at.desc())
+    return list((await session.exec(statement)).all())
+
+
+# Observability CRUD operations
+async def create_studio_observation(*, session: AsyncSession, **kwargs: Any) -> StudioObservation:
+    db_observation = StudioObservation(**kwargs)
+    session.add(db_observation)
+    await session.commit()
+    await session.refresh(db_observation)
+    return db_observation
+
+
+async def get_recent_studio_observations(*, session: AsyncSession, limit: int = 100) -> list[StudioObservation]:
+    statement = select(StudioObservation).order_by(StudioObservation.created_at.desc()).limit(limit)
+    return list((await session.exec(statement)).all())
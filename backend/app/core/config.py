@@ -69,6 +69,22 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # Connection pools, per engine (sync and async) and per worker process:
+    # with `fastapi run --workers 4` the database sees up to
+    # 2 * 4 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # How long a checkout waits for a free connection before failing
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    # Connections older than this are replaced (-1 never)
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # Test connections on checkout, so a restarted database is not an error
+    DB_POOL_PRE_PING: bool = True
+    # Per-statement limit enforced by Postgres; 0 disables it
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    # Connections checked out of the pool longer than this are logged
+    DB_CONNECTION_HOLD_WARNING_SECONDS: float = 5.0
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -81,6 +97,107 @@ class Settings(BaseSettings):
     # OpenAI API configuration
     OPENAI_API_KEY: str | None = None
 
+    # Shared Redis instance (optional), e.g. redis://redis:6379/0
+    REDIS_URL: str | None = None
+
+    # Completion cache
+    COMPLETION_CACHE_ENABLED: bool = True
+    COMPLETION_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    COMPLETION_CACHE_TTL_SECONDS: int = 60 * 60 * 24
+    # Directory for the shared disk tier, used when REDIS_URL is not set
+    COMPLETION_CACHE_DIR: str | None = None
+
+    # Test results memoized by workspace content (same shared tier as completions)
+    TEST_RESULT_CACHE_ENABLED: bool = True
+    TEST_RESULT_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    TEST_RESULT_CACHE_TTL_SECONDS: int = 60 * 60 * 24
+
+    # LLM admission control (per worker process)
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_MAX_CONCURRENCY_PER_USER: int = 4
+    LLM_TOKENS_PER_MINUTE: int = 90000
+
+    # Per-user rate limit on LLM work, charged by each request's estimated
+    # tokens (shared through REDIS_URL, otherwise per worker process)
+    RATE_LIMIT_TOKENS_PER_HOUR: int = 1_000_000
+    RATE_LIMIT_BURST_TOKENS: int = 200_000
+
+    # LLM retries and hedging
+    LLM_REQUEST_TIMEOUT_SECONDS: float = 60.0
+    LLM_RETRY_MAX_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    LLM_RETRY_MAX_DELAY_SECONDS: float = 8.0
+    # Stages whose calls are duplicated once their p95 latency has elapsed.
+    # Only buffered calls are hedged, not streamed ones (the scaffold streams)
+    LLM_HEDGE_STAGES: list[str] = ["repair"]
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+
+    # LLM circuit breaker
+    LLM_BREAKER_WINDOW_SECONDS: float = 60.0
+    LLM_BREAKER_MIN_CALLS: int = 10
+    LLM_BREAKER_ERROR_RATE: float = 0.5
+    LLM_BREAKER_SLOW_CALL_SECONDS: float = 20.0
+    LLM_BREAKER_SLOW_CALL_RATE: float = 0.8
+    LLM_BREAKER_OPEN_SECONDS: float = 30.0
+
+    # Repair: concurrent candidates per attempt (first to pass all tests wins),
+    # sampled at these temperatures, within a wall-clock budget per run. Only
+    # the first candidate's files stream; if another wins, its files are sent
+    # once chosen
+    REPAIR_CANDIDATES: int = 3
+    REPAIR_TEMPERATURES: list[float] = [0.2, 0.5, 0.8]
+    REPAIR_BUDGET_SECONDS: float = 120.0
+
+    # Pre-warmed test sandboxes (per worker process); 0 disables the pool
+    SANDBOX_POOL_SIZE: int = 2
+    # Parent directory for sandboxes; defaults to the system temp directory
+    SANDBOX_ROOT: str | None = None
+    SANDBOX_MAX_USES: int = 20
+    SANDBOX_INSTALL_TIMEOUT_SECONDS: float = 180.0
+    SANDBOX_TEST_TIMEOUT_SECONDS: float = 30.0
+
+    # Installed node_modules trees shared by dependency set
+    NODE_MODULES_CACHE_DIR: str | None = None
+    NODE_MODULES_CACHE_MAX_BYTES: int = 5 * 1024 * 1024 * 1024
+    # "symlink", "hardlink" or "reflink" (falls back to hardlink, then copy)
+    NODE_MODULES_LINK_MODE: str = "symlink"
+    # Install only from a pre-seeded npm cache, never the registry
+    NPM_OFFLINE: bool = False
+    NPM_CACHE_DIR: str | None = None
+
+    # Plugin installs (git clone)
+    PLUGIN_INSTALL_TIMEOUT_SECONDS: float = 90.0
+    # How often plugin manifests are checked for changes; 0 disables the watcher
+    PLUGIN_WATCH_INTERVAL_SECONDS: float = 5.0
+
+    # Generation jobs: "postgres" (durable, shared by all workers) or "memory"
+    JOB_QUEUE_BACKEND: Literal["postgres", "memory"] = "postgres"
+    # Jobs run concurrently per worker process
+    GENERATION_WORKERS: int = 2
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    # A running job whose heartbeat is older than this is reclaimed
+    JOB_LEASE_SECONDS: float = 60.0
+    JOB_HEARTBEAT_SECONDS: float = 10.0
+    JOB_MAX_ATTEMPTS: int = 2
+
+    # Test run state is written behind the agent: at stage changes, or at most
+    # this long after an unwritten change
+    RUN_STATE_FLUSH_INTERVAL_SECONDS: float = 0.5
+
+    # Run event log (replay on reconnect): written in batches of up to this
+    # many messages, or after this long
+    RUN_EVENT_BATCH_SIZE: int = 50
+    RUN_EVENT_FLUSH_INTERVAL_SECONDS: float = 0.25
+
+    # Prompt token budgets per agent stage
+    PROMPT_TOKEN_BUDGET_UNIT_TEST: int = 3000
+    PROMPT_TOKEN_BUDGET_REPAIR: int = 4000
+
+    # Near-duplicate prompt reuse
+    PROMPT_REUSE_ENABLED: bool = True
+    PROMPT_REUSE_SIMILARITY_THRESHOLD: float = 0.8
+    PROMPT_INDEX_MAX_ENTRIES: int = 10000
+
     @model_validator(mode="after")
     def _set_default_emails_from(self) -> Self:
         if not self.EMAILS_FROM_NAME:
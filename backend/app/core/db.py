@@ -1,10 +1,37 @@
+from typing import Any
+
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
 from app.models import User, UserCreate
-
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+from app.services.db_metrics import TimedAsyncQueuePool, TimedQueuePool, db_metrics
+
+
+def engine_options() -> dict[str, Any]:
+    """Pool sizing and timeouts from settings; each engine gets its own pool per process"""
+    options: dict[str, Any] = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        # Set per connection by the server, so it also covers the async driver
+        options["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI), poolclass=TimedQueuePool, **engine_options())
+# The same database through psycopg's async driver, for async routes and the
+# agent, so their queries do not block the event loop
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI), poolclass=TimedAsyncQueuePool, **engine_options()
+)
+db_metrics.instrument(engine, "sync")
+db_metrics.instrument(async_engine, "async")
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
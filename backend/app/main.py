@@ -1,10 +1,15 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.api.routes.studio import generation_workers, plugin_system
 from app.core.config import settings
+from app.services.sandbox_pool import sandbox_pool
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,10 +19,27 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Start warming test sandboxes before the first generation needs one
+    if sandbox_pool.size > 0:
+        await sandbox_pool.start()
+    # Build the plugin catalog once; it is rebuilt when a manifest changes
+    await plugin_system.start(settings.PLUGIN_WATCH_INTERVAL_SECONDS)
+    # Run queued generations in this process
+    await generation_workers.start()
+    yield
+    await generation_workers.close()
+    await plugin_system.close()
+    await sandbox_pool.close()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
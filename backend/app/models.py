@@ -199,6 +199,63 @@ class TestRun(SQLModel, table=True):
     error_message: str | None = Field(default=None, max_length=2000)
 
 
+# Background Generation Jobs
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+JOB_TERMINAL_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+# Properties to receive on job submission
+class GenerationJobCreate(SQLModel):
+    prompt: str = Field(min_length=1, max_length=5000)
+    skip_tests: bool = Field(default=False)
+    use_plugins: list[str] = Field(default_factory=list)
+
+
+# Database model for a queued agent run; workers claim rows with SKIP LOCKED
+class GenerationJob(SQLModel, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    project_id: uuid.UUID = Field(foreign_key="project.id", nullable=False, ondelete="CASCADE")
+    owner_id: uuid.UUID = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
+    params: dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON))
+    
+    status: JobStatus = Field(default=JobStatus.QUEUED, index=True)
+    attempts: int = Field(default=0)
+    worker_id: str | None = Field(default=None, max_length=100)
+    started_at: datetime | None = Field(default=None)
+    heartbeat_at: datetime | None = Field(default=None)  # Stale heartbeats are reclaimed
+    finished_at: datetime | None = Field(default=None)
+    error_message: str | None = Field(default=None, max_length=2000)
+
+
+# Append-only log of the messages a job sent, for replay on reconnect
+class RunEvent(SQLModel, table=True):
+    job_id: uuid.UUID = Field(foreign_key="generationjob.id", primary_key=True, ondelete="CASCADE")
+    seq: int = Field(primary_key=True)  # Monotonic within the job, from 1
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    message: dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON))
+
+
+# Properties to return via API
+class GenerationJobPublic(SQLModel):
+    id: uuid.UUID
+    created_at: datetime
+    project_id: uuid.UUID
+    params: dict[str, Any]
+    status: JobStatus
+    attempts: int
+    started_at: datetime | None
+    finished_at: datetime | None
+    error_message: str | None
+
+
 # Plugin System Models
 class PluginManifest(SQLModel, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
@@ -247,6 +304,8 @@ class StudioObservation(SQLModel, table=True):
     # Prompt analysis
     prompt_hash: str = Field(max_length=64, index=True)
     prompt_text: str = Field(max_length=5000)
+    prompt_signature: list[int] = Field(default_factory=list, sa_column=Column(JSON))  # MinHash for near-duplicate lookup
+    contract: dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON))  # Interpreted contract, reusable
     
     # Generation results
     diff_patch: str = Field(default="", max_length=10000)  # Git-style diff
@@ -328,13 +387,14 @@ class CodeGenerationsPublic(SQLModel):
 
 # Enhanced WebSocket message types
 class StreamingMessage(SQLModel):
-    type: Literal["token", "file_closed", "build_progress", "build_ok", "build_error", "stage_complete", "test_result", "reasoning_step"] 
+    type: Literal["token", "file_closed", "build_progress", "build_ok", "build_error", "stage_complete", "test_result", "reasoning_step", "job_status", "error"] 
     content: str | None = None
     filename: str | None = None
     stage: AgentStage | None = None
     progress_pct: int | None = None
     test_results: dict[str, Any] | None = None
     reasoning_data: dict[str, Any] | None = None
+    data: dict[str, Any] | None = None
     stream_metadata: dict[str, Any] = Field(default_factory=dict)
 
 
@@ -0,0 +1,163 @@
+"""
+Circuit Breaker for AI Studio
+
+Tracks the rolling error rate and latency of calls to a dependency. When
+either crosses its threshold the circuit opens and calls fail immediately
+instead of each waiting for its own timeout; after a cool-down a limited
+number of probe calls decide whether to close it again.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker driven by a rolling time window"""
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 60.0,
+        min_calls: int = 10,
+        error_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 20.0,
+        slow_call_rate_threshold: float = 0.8,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        is_failure: Callable[[BaseException], bool] = lambda e: True
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.is_failure = is_failure
+
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        # (timestamp, failed, slow) per completed call
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(CircuitState.HALF_OPEN)
+        return self._state
+
+    def is_open(self) -> bool:
+        """True when a call made now would be rejected"""
+        state = self.state
+        if state == CircuitState.OPEN:
+            return True
+        return state == CircuitState.HALF_OPEN and self._probes_in_flight >= self.half_open_max_calls
+
+    def check(self) -> None:
+        """Fail fast without reserving a probe slot"""
+        if self.is_open():
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Wrap a single call to the dependency and record its outcome"""
+        self.check()
+
+        probe = self._state == CircuitState.HALF_OPEN
+        if probe:
+            self._probes_in_flight += 1
+
+        started = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # A cancelled call (e.g. a losing hedge) says nothing about health
+            raise
+        except Exception as e:
+            self._record(self.is_failure(e), time.monotonic() - started)
+            raise
+        else:
+            self._record(False, time.monotonic() - started)
+        finally:
+            if probe:
+                self._probes_in_flight -= 1
+
+    def _record(self, failed: bool, latency: float) -> None:
+        now = time.monotonic()
+        slow = latency >= self.slow_call_seconds
+
+        if self._state == CircuitState.HALF_OPEN:
+            if failed or slow:
+                self._transition(CircuitState.OPEN)
+            else:
+                self._transition(CircuitState.CLOSED)
+            return
+
+        self._calls.append((now, failed, slow))
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+        if self._state == CircuitState.CLOSED and len(self._calls) >= self.min_calls:
+            error_rate, slow_rate = self._rates()
+            if error_rate >= self.error_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                self._transition(CircuitState.OPEN)
+
+    def _rates(self) -> Tuple[float, float]:
+        if not self._calls:
+            return 0.0, 0.0
+        total = len(self._calls)
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        slow = sum(1 for _, _, is_slow in self._calls if is_slow)
+        return failures / total, slow / total
+
+    def _transition(self, state: CircuitState) -> None:
+        if state == self._state:
+            return
+
+        logger.warning(f"Circuit '{self.name}' {self._state.value} -> {state.value}")
+        self._state = state
+        if state == CircuitState.OPEN:
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+        elif state == CircuitState.CLOSED:
+            self._calls.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        state = self.state
+        error_rate, slow_rate = self._rates()
+        retry_in = 0.0
+        if state == CircuitState.OPEN:
+            retry_in = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+        return {
+            "name": self.name,
+            "state": state.value,
+            "window_calls": len(self._calls),
+            "error_rate": error_rate,
+            "slow_call_rate": slow_rate,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_in_seconds": retry_in,
+        }
@@ -0,0 +1,286 @@
+"""
+Completion Cache for AI Studio
+
+Content-addressed cache for LLM completions. Requests are keyed by a hash of
+the full request (model, messages, temperature, max_tokens) and served from an
+in-process LRU tier, backed by an optional shared Redis or disk tier.
+Identical concurrent requests are coalesced into a single upstream call.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Redis for the shared tier (optional)
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(request: Dict[str, Any], namespace: str = "completion") -> str:
+    """Hash a request into a stable cache key"""
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class LRUCacheTier:
+    """In-process LRU tier bounded by the total size of cached values"""
+
+    def __init__(self, max_bytes: int, ttl_seconds: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at, _ = entry
+        if expires_at and expires_at < time.monotonic():
+            self._remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        size = len(key) + len(value.encode())
+        if size > self.max_bytes:
+            # Never let a single oversized value flush the whole tier
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else 0.0
+        self._entries[key] = (value, expires_at, size)
+        self.current_bytes += size
+
+        while self.current_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self.current_bytes -= size
+
+
+class RedisCacheTier:
+    """Shared tier stored in Redis with per-key TTLs"""
+
+    def __init__(self, url: str, ttl_seconds: int):
+        self.client = aioredis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            value = await self.client.get(key)
+        except Exception as e:
+            logger.warning(f"Completion cache Redis read failed: {e}")
+            return None
+        return value.decode() if value is not None else None
+
+    async def set(self, key: str, value: str) -> None:
+        try:
+            await self.client.set(key, value, ex=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Completion cache Redis write failed: {e}")
+
+
+class DiskCacheTier:
+    """Shared tier stored as one file per key, for hosts without Redis"""
+
+    def __init__(self, directory: str, ttl_seconds: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self._write, key, value)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key.replace(":", "_")
+
+    def _read(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("expires_at", 0) < time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return entry.get("value")
+
+    def _write(self, key: str, value: str) -> None:
+        entry = {"expires_at": time.time() + self.ttl_seconds, "value": value}
+        try:
+            # Write atomically so concurrent readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Completion cache disk write failed: {e}")
+
+
+class _LeaderCancelled(Exception):
+    """Set on an in-flight request whose leading caller was cancelled"""
+
+
+class CompletionCache:
+    """Two-tier completion cache with single-flight request coalescing"""
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: int,
+        shared: Optional[Any] = None
+    ):
+        self.local = LRUCacheTier(max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+        self.shared = shared
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[str]]
+    ) -> str:
+        """Return the cached value for key, computing it at most once"""
+
+        value = self.local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        # Join an identical request that is already in flight
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except _LeaderCancelled:
+                # Only the leader's caller went away; retry, and the first
+                # follower back becomes the new leader
+                return await self.get_or_compute(key, compute)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Mark exceptions as retrieved when no follower was waiting on them
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+
+        try:
+            value = await self._get_shared(key)
+            if value is not None:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+                value = await compute()
+                if value:
+                    await self._set_shared(key, value)
+
+            if value:
+                self.local.set(key, value)
+            future.set_result(value)
+            return value
+
+        except asyncio.CancelledError:
+            # Followers were not cancelled themselves; let them take over
+            future.set_exception(_LeaderCancelled())
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def lookup(self, key: str) -> Optional[str]:
+        """Return the cached value for key without computing it (for streams)"""
+
+        value = self.local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        value = await self._get_shared(key)
+        if value is not None:
+            self.shared_hits += 1
+            self.local.set(key, value)
+        else:
+            self.misses += 1
+        return value
+
+    async def store(self, key: str, value: str) -> None:
+        if value:
+            self.local.set(key, value)
+            await self._set_shared(key, value)
+
+    def clear(self) -> None:
+        self.local.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            "entries": len(self.local),
+            "bytes": self.local.current_bytes,
+            "evictions": self.local.evictions,
+        }
+
+    async def _get_shared(self, key: str) -> Optional[str]:
+        if self.shared is None:
+            return None
+        return await self.shared.get(key)
+
+    async def _set_shared(self, key: str, value: str) -> None:
+        if self.shared is not None:
+            await self.shared.set(key, value)
+
+
+def build_shared_tier(
+    redis_url: Optional[str],
+    directory: Optional[str],
+    ttl_seconds: int
+) -> Optional[Any]:
+    """Pick the shared tier from configuration: Redis first, then disk"""
+    if redis_url and REDIS_AVAILABLE:
+        return RedisCacheTier(redis_url, ttl_seconds)
+    if directory:
+        return DiskCacheTier(directory, ttl_seconds)
+    return None
@@ -0,0 +1,136 @@
+"""
+Database Connection Metrics for AI Studio
+
+Instruments the engines' connection pools so they can be sized from data:
+how long a checkout waits for a free connection (and how often it times
+out), how many connections are in use and in overflow, how long each is
+held, and how often connections are opened or invalidated.
+
+Long holds are logged. Code that keeps a session's transaction open
+across slow work (an LLM call, a WebSocket that lives for hours) holds a
+pooled connection the whole time and starves everyone else.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited"""
+
+    timeouts = 0
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        # Read by ConnectionMetrics' checkout listener
+        record.info["checkout_wait"] = time.perf_counter() - started
+        return record
+
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """TimedQueuePool for async engines"""
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    in_use: int = 0
+    connects: int = 0
+    invalidations: int = 0
+    long_holds: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    total_held_seconds: float = 0.0
+    max_held_seconds: float = 0.0
+
+
+class ConnectionMetrics:
+    """Pool event counters and timings, per instrumented engine"""
+
+    def __init__(self, hold_warning_seconds: float = 5.0):
+        self.hold_warning_seconds = hold_warning_seconds
+        self.engines: Dict[str, Any] = {}
+        self.pools: Dict[str, PoolStats] = {}
+
+    def instrument(self, engine: Any, name: str) -> None:
+        """Listen to the engine's pool (idempotent per name)"""
+        if name in self.engines:
+            return
+        # Async engines fire pool events on their sync engine
+        target = getattr(engine, "sync_engine", engine)
+        stats = self.pools[name] = PoolStats()
+        self.engines[name] = target
+
+        def on_connect(dbapi_connection: Any, record: Any) -> None:
+            stats.connects += 1
+
+        def on_checkout(dbapi_connection: Any, record: Any, proxy: Any) -> None:
+            wait = record.info.pop("checkout_wait", 0.0)
+            record.info["checked_out_at"] = time.monotonic()
+            stats.checkouts += 1
+            stats.in_use += 1
+            stats.total_wait_seconds += wait
+            stats.max_wait_seconds = max(stats.max_wait_seconds, wait)
+
+        def on_checkin(dbapi_connection: Any, record: Any) -> None:
+            started = record.info.pop("checked_out_at", None)
+            if started is None:
+                return  # Checked out before instrumenting
+            held = time.monotonic() - started
+            stats.in_use -= 1
+            stats.total_held_seconds += held
+            stats.max_held_seconds = max(stats.max_held_seconds, held)
+            if held >= self.hold_warning_seconds:
+                stats.long_holds += 1
+                logger.warning(f"Database connection ({name}) held for {held:.1f}s")
+
+        def on_invalidate(dbapi_connection: Any, record: Any, exception: Any) -> None:
+            stats.invalidations += 1
+
+        event.listen(target, "connect", on_connect)
+        event.listen(target, "checkout", on_checkout)
+        event.listen(target, "checkin", on_checkin)
+        event.listen(target, "invalidate", on_invalidate)
+        event.listen(target, "soft_invalidate", on_invalidate)
+
+    def get_stats(self) -> Dict[str, Any]:
+        report = {}
+        for name, stats in self.pools.items():
+            pool = self.engines[name].pool
+            returned = stats.checkouts - stats.in_use
+            report[name] = {
+                # Live pool state
+                "size": pool.size() if isinstance(pool, QueuePool) else None,
+                "checked_in": pool.checkedin() if isinstance(pool, QueuePool) else None,
+                "overflow": max(pool.overflow(), 0) if isinstance(pool, QueuePool) else None,
+                "in_use": stats.in_use,
+                # Since startup
+                "checkouts": stats.checkouts,
+                "timeouts": getattr(pool, "timeouts", 0),
+                "connects": stats.connects,
+                "invalidations": stats.invalidations,
+                "long_holds": stats.long_holds,
+                "avg_wait_ms": round(stats.total_wait_seconds / stats.checkouts * 1000, 2) if stats.checkouts else 0.0,
+                "max_wait_ms": round(stats.max_wait_seconds * 1000, 2),
+                "avg_held_ms": round(stats.total_held_seconds / returned * 1000, 2) if returned else 0.0,
+                "max_held_ms": round(stats.max_held_seconds * 1000, 2),
+            }
+        return report
+
+
+# Global metrics instance (engines are instrumented at startup)
+db_metrics = ConnectionMetrics(settings.DB_CONNECTION_HOLD_WARNING_SECONDS)
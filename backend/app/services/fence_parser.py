@@ -0,0 +1,275 @@
+"""
+Incremental Code-Fence Parser for AI Studio
+
+State-machine parser for LLM output that returns files as fenced code blocks.
+Accepts the response in arbitrary chunks (e.g. from stream_completion) and
+emits file_start, file_chunk and file_closed events as soon as they can be
+decided, touching each character a constant number of times.
+
+Recognized openings:
+    ```src/App.tsx            filename as the info string
+    ```tsx src/App.tsx        language plus filename (also tsx:src/App.tsx,
+                              tsx title="src/App.tsx", filename=...)
+    ```tsx                    language only; the filename is taken from a
+    // src/App.tsx            leading path comment, otherwise the block is
+                              not a file and is skipped
+
+Closing fences must use the opening fence character and be at least as long.
+CRLF line endings are read as LF, in fences and in file content alike.
+Inside markdown files, language-tagged fences open nested blocks whose bare
+closing fence is file content rather than the end of the file.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+FENCE_OPEN = re.compile(r"^ {0,3}(`{3,}|~{3,})(.*)$")
+# A line that may still turn out to be a bare (closing) fence
+FENCE_PREFIX = re.compile(r"^ {0,3}(`*|~*)[ \t]*$")
+PATH_TOKEN = re.compile(r"^[\w@.\-/\[\]()+]+$")
+PATH_COMMENT = re.compile(r"^\s*(?://|#|/\*|<!--)\s*([\w@.\-/\[\]()+]+?)\s*(?:\*/|-->)?\s*$")
+MARKDOWN_EXTENSIONS = (".md", ".mdx", ".markdown")
+
+# Parser states
+OUTSIDE = "outside"
+AWAITING_NAME = "awaiting_name"
+IN_FILE = "in_file"
+SKIPPING = "skipping"
+
+
+@dataclass
+class FenceEvent:
+    type: str  # "file_start", "file_chunk" or "file_closed"
+    filename: str
+    text: str = ""
+    # Set on file_closed when the stream ended before the closing fence
+    truncated: bool = False
+
+
+def looks_like_path(token: str) -> bool:
+    token = token.strip("\"'")
+    if not token or not PATH_TOKEN.match(token):
+        return False
+    return "/" in token or bool(re.search(r"\.[A-Za-z0-9]+$", token))
+
+
+def filename_from_info(info: str) -> Optional[str]:
+    """Extract a filename from a fence info string, if it has one"""
+    info = info.strip()
+    if not info:
+        return None
+
+    attribute = re.search(r"(?:title|filename|file|path)=[\"']?([^\"'\s]+)", info)
+    if attribute:
+        return attribute.group(1)
+
+    for token in re.split(r"[\s:]+", info):
+        if looks_like_path(token):
+            return token.strip("\"'")
+    return None
+
+
+class FenceParser:
+    """Incremental parser turning fenced LLM output into file events"""
+
+    def __init__(self) -> None:
+        self.files: Dict[str, str] = {}
+        self._state = OUTSIDE
+        self._fence: Tuple[str, int] = ("`", 3)
+        self._nested: List[Tuple[str, int]] = []
+
+        # Current line: pieces still held back, and whether the line has
+        # already been classified as content and is streaming through
+        self._line: List[str] = []
+        self._streaming_line = False
+        self._line_fence: Optional[Tuple[str, int]] = None
+
+        self._filename: Optional[str] = None
+        self._content: List[str] = []
+        self._newline_pending = False
+        # Text emitted during the current feed(), sent as a single file_chunk
+        self._unsent: List[str] = []
+        # The previous chunk ended in \r, possibly the first half of a CRLF
+        self._carriage_return = False
+
+    def feed(self, chunk: str) -> List[FenceEvent]:
+        """Consume a chunk of the response and return the events it completes"""
+        events: List[FenceEvent] = []
+        if self._carriage_return:
+            chunk = "\r" + chunk
+            self._carriage_return = False
+        if chunk.endswith("\r"):
+            chunk = chunk[:-1]
+            self._carriage_return = True
+        chunk = chunk.replace("\r\n", "\n")
+        start = 0
+        while True:
+            newline = chunk.find("\n", start)
+            if newline == -1:
+                self._partial(chunk[start:], events)
+                break
+            line = chunk[start:newline]
+            if self._state == IN_FILE and not self._streaming_line and not self._line \
+                    and line.lstrip(" ")[:1] not in ("`", "~"):
+                # Fast path: a whole line that cannot be a fence
+                self._emit(line, events)
+                self._newline_pending = True
+            else:
+                self._partial(line, events)
+                self._end_line(events)
+            start = newline + 1
+        self._flush(events)
+        return events
+
+    def close(self) -> List[FenceEvent]:
+        """Flush the final line; an unterminated file is closed as truncated"""
+        events: List[FenceEvent] = []
+        self._carriage_return = False  # A final line ending, not content
+        if self._line or self._streaming_line:
+            self._end_line(events)
+        self._flush(events)
+        if self._state == IN_FILE and self._filename:
+            events.append(FenceEvent("file_closed", self._filename, truncated=True))
+        self._state = OUTSIDE
+        self._filename = None
+        return events
+
+    def _partial(self, text: str, events: List[FenceEvent]) -> None:
+        if not text:
+            return
+
+        if self._state != IN_FILE:
+            self._line.append(text)
+            return
+
+        if self._streaming_line:
+            self._emit(text, events)
+            return
+
+        self._line.append(text)
+        held = "".join(self._line)
+        if FENCE_PREFIX.match(held):
+            return  # Could still be the closing fence
+
+        # The line is content; remember whether it opens a fence, then stream it.
+        # Anything after the fence characters means it carries an info string.
+        opening = FENCE_OPEN.match(held)
+        if opening:
+            self._line_fence = (opening.group(1)[0], len(opening.group(1)))
+        self._line = []
+        self._streaming_line = True
+        self._emit(held, events)
+
+    def _end_line(self, events: List[FenceEvent]) -> None:
+        line = "".join(self._line).rstrip("\r")
+        self._line = []
+        streamed = self._streaming_line
+        line_fence = self._line_fence
+        self._streaming_line = False
+        self._line_fence = None
+
+        if self._state == OUTSIDE:
+            self._open(line, events)
+        elif self._state == AWAITING_NAME:
+            self._name_from_first_line(line, events)
+        elif self._state == SKIPPING:
+            if self._is_closing(line, self._fence):
+                self._state = OUTSIDE
+        elif streamed:
+            if line_fence and self._is_markdown():
+                self._nested.append(line_fence)
+            self._newline_pending = True
+        else:
+            self._held_line(line, events)
+
+    def _held_line(self, line: str, events: List[FenceEvent]) -> None:
+        """A complete line that looked like a possible fence while streaming"""
+        if self._nested and self._is_closing(line, self._nested[-1]):
+            self._nested.pop()
+        elif self._is_closing(line, self._fence):
+            self._close(events)
+            return
+        self._emit(line, events)
+        self._newline_pending = True
+
+    def _open(self, line: str, events: List[FenceEvent]) -> None:
+        match = FENCE_OPEN.match(line)
+        if not match:
+            return
+
+        fence, info = match.group(1), match.group(2)
+        if fence[0] == "`" and "`" in info:
+            return  # Inline code span, not a fence
+
+        self._fence = (fence[0], len(fence))
+        self._nested = []
+        filename = filename_from_info(info)
+        if filename:
+            self._start(filename, events)
+        elif info.strip():
+            self._state = AWAITING_NAME
+        else:
+            self._state = SKIPPING
+
+    def _name_from_first_line(self, line: str, events: List[FenceEvent]) -> None:
+        if self._is_closing(line, self._fence):
+            self._state = OUTSIDE
+            return
+
+        comment = PATH_COMMENT.match(line)
+        if comment and looks_like_path(comment.group(1)):
+            self._start(comment.group(1), events)
+            self._emit(line, events)
+            self._newline_pending = True
+        else:
+            self._state = SKIPPING
+
+    def _start(self, filename: str, events: List[FenceEvent]) -> None:
+        self._state = IN_FILE
+        self._filename = filename
+        self._content = []
+        self._newline_pending = False
+        events.append(FenceEvent("file_start", filename))
+
+    def _emit(self, text: str, events: List[FenceEvent]) -> None:
+        # The newline ending a line is only emitted once the next line is
+        # known not to be the closing fence
+        if self._newline_pending:
+            text = "\n" + text
+            self._newline_pending = False
+        if text:
+            self._content.append(text)
+            self._unsent.append(text)
+
+    def _flush(self, events: List[FenceEvent]) -> None:
+        if self._unsent:
+            events.append(FenceEvent("file_chunk", self._filename or "", "".join(self._unsent)))
+            self._unsent = []
+
+    def _close(self, events: List[FenceEvent]) -> None:
+        self._flush(events)
+        filename = self._filename or ""
+        self.files[filename] = "".join(self._content)
+        events.append(FenceEvent("file_closed", filename))
+        self._state = OUTSIDE
+        self._filename = None
+        self._content = []
+        self._nested = []
+        self._newline_pending = False
+
+    def _is_closing(self, line: str, fence: Tuple[str, int]) -> bool:
+        stripped = line.strip()
+        char, length = fence
+        return len(stripped) >= length and stripped == char * len(stripped) and len(line) - len(line.lstrip(" ")) <= 3
+
+    def _is_markdown(self) -> bool:
+        return bool(self._filename) and self._filename.lower().endswith(MARKDOWN_EXTENSIONS)
+
+
+def parse_files(response: str) -> Dict[str, str]:
+    """Parse a fully buffered response into {filename: content}"""
+    parser = FenceParser()
+    parser.feed(response)
+    parser.close()
+    return parser.files
@@ -0,0 +1,124 @@
+"""
+Import Graph Analysis for AI Studio
+
+Builds the import graph of generated TS/JS files so a change can be traced
+to the test files that import it, directly or transitively. Import lists
+are cached by file content hash, so unchanged files are never re-scanned
+across repair attempts.
+"""
+
+import hashlib
+import logging
+import posixpath
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODULE_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs")
+
+# Static imports, re-exports, side-effect imports, dynamic import() and require()
+IMPORT_PATTERN = re.compile(
+    r"""(?:\bfrom\s*|\bimport\s*\(?\s*|\brequire\s*\(\s*)(['"])([^'"\n]+)\1"""
+)
+
+# Vite projects conventionally alias "@/" to "src/"
+ALIASES = {"@/": "src/"}
+
+
+def _module_candidates(path: str) -> List[str]:
+    candidates = [path]
+    stem, extension = posixpath.splitext(path)
+    if extension in (".js", ".jsx", ".mjs", ".cjs"):
+        # TypeScript ESM imports name the compiled .js file
+        candidates += [stem + ".ts", stem + ".tsx"]
+    candidates += [path + extension for extension in MODULE_EXTENSIONS]
+    candidates += [posixpath.join(path, "index" + extension) for extension in MODULE_EXTENSIONS]
+    return candidates
+
+
+class ImportGraph:
+    """Import graph of a set of generated files, with a content-hash parse cache"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._imports: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def imports(self, content: str) -> Tuple[str, ...]:
+        """Module specifiers a file imports, in source order"""
+        key = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        cached = self._imports.get(key)
+        if cached is not None:
+            self._imports.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        specifiers = tuple(dict.fromkeys(match.group(2) for match in IMPORT_PATTERN.finditer(content)))
+        self._imports[key] = specifiers
+        if len(self._imports) > self.max_entries:
+            self._imports.popitem(last=False)
+        return specifiers
+
+    def resolve(self, specifier: str, importer: str, files: Iterable[str]) -> Optional[str]:
+        """Generated file a specifier refers to; None for packages and unknown paths"""
+        for alias, target in ALIASES.items():
+            if specifier.startswith(alias):
+                path = posixpath.normpath(target + specifier[len(alias):])
+                break
+        else:
+            if not specifier.startswith("."):
+                return None  # Package import
+            path = posixpath.normpath(posixpath.join(posixpath.dirname(importer), specifier))
+
+        known = files if isinstance(files, (set, dict)) else set(files)
+        for candidate in _module_candidates(path):
+            if candidate in known:
+                return candidate
+        return None
+
+    def dependencies(self, files: Dict[str, str]) -> Dict[str, Set[str]]:
+        """Direct imports of every module, restricted to the given files"""
+        graph: Dict[str, Set[str]] = {}
+        for filename, content in files.items():
+            if not filename.endswith(MODULE_EXTENSIONS):
+                continue
+            resolved = (self.resolve(specifier, filename, files) for specifier in self.imports(content))
+            graph[filename] = {target for target in resolved if target is not None}
+        return graph
+
+    def affected_tests(self, files: Dict[str, str], test_files: Iterable[str], changed: Iterable[str]) -> Optional[Set[str]]:
+        """Test files that import a changed file, directly or transitively
+
+        None means the change cannot be traced through imports (e.g. a
+        package.json or config edit) and the whole suite has to run.
+        """
+        graph = self.dependencies(files)
+        importers: Dict[str, Set[str]] = {}
+        for filename, targets in graph.items():
+            for target in targets:
+                importers.setdefault(target, set()).add(filename)
+
+        changed = set(changed)
+        for filename in changed:
+            if filename not in graph and filename not in importers:
+                return None
+
+        reached = set(changed)
+        stack = list(changed)
+        while stack:
+            for importer in importers.get(stack.pop(), ()):
+                if importer not in reached:
+                    reached.add(importer)
+                    stack.append(importer)
+        return {filename for filename in test_files if filename in reached}
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"entries": len(self._imports), "hits": self.hits, "misses": self.misses}
+
+
+# Global import graph instance
+import_graph = ImportGraph()
@@ -0,0 +1,359 @@
+"""
+Generation Job Queue for AI Studio
+
+Durable queue of agent runs, so generation no longer lives inside the
+request handler that asked for it. Jobs are rows in Postgres claimed with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers across processes
+can pull from the same table without blocking each other. Running jobs
+heartbeat; a job whose worker died is reclaimed once its heartbeat goes
+stale. An in-process queue with the same interface serves tests and
+single-process development.
+
+Progress messages fan out to subscribers through a broker: Redis pub/sub
+when REDIS_URL is configured (workers and subscribers in different
+processes), otherwise in-process queues.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, or_, update
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import JOB_TERMINAL_STATUSES, GenerationJob, JobStatus
+
+# Redis for cross-process progress delivery (optional)
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def status_message(job: GenerationJob) -> Dict[str, Any]:
+    """Client message announcing a job's status"""
+    return {
+        "type": "job_status",
+        "content": job.status.value,
+        "data": {
+            "job_id": str(job.id),
+            "status": job.status.value,
+            "attempts": job.attempts,
+            "error": job.error_message,
+        },
+    }
+
+
+def is_final(message: Dict[str, Any]) -> bool:
+    return message.get("type") == "job_status" and message["data"]["status"] in {
+        status.value for status in JOB_TERMINAL_STATUSES
+    }
+
+
+class InMemoryJobQueue:
+    """Job queue held in this process; jobs do not survive a restart"""
+
+    def __init__(self, max_attempts: int = 2):
+        self.max_attempts = max_attempts
+        self._jobs: Dict[uuid.UUID, GenerationJob] = {}
+        self._pending: Deque[uuid.UUID] = deque()
+        self._wakeup = asyncio.Event()
+
+    async def submit(self, job: GenerationJob) -> GenerationJob:
+        self._jobs[job.id] = job
+        self._pending.append(job.id)
+        self._wakeup.set()
+        return job
+
+    async def claim(self, worker_id: str) -> Tuple[Optional[GenerationJob], List[GenerationJob]]:
+        """The next job, now leased to worker_id, and any jobs given up on meanwhile"""
+        while self._pending:
+            job = self._jobs[self._pending.popleft()]
+            if job.status != JobStatus.QUEUED:
+                continue  # Cancelled while waiting
+            now = datetime.utcnow()
+            job.status = JobStatus.RUNNING
+            job.worker_id = worker_id
+            job.attempts += 1
+            job.started_at = job.heartbeat_at = now
+            return job, []
+        return None, []
+
+    async def heartbeat(self, job_id: uuid.UUID, worker_id: str) -> Optional[JobStatus]:
+        """Extend worker_id's lease on the job; returns its status so workers
+        notice cancellation, or None once the lease belongs to another worker"""
+        job = self._jobs.get(job_id)
+        if job is None or job.worker_id != worker_id:
+            return None
+        if job.status == JobStatus.RUNNING:
+            job.heartbeat_at = datetime.utcnow()
+        return job.status
+
+    async def finish(self, job_id: uuid.UUID, status: JobStatus, error: Optional[str] = None) -> Optional[GenerationJob]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status not in JOB_TERMINAL_STATUSES:
+            job.status = status
+            job.error_message = error[:2000] if error else None
+            job.finished_at = datetime.utcnow()
+        return job
+
+    async def release(self, job_id: uuid.UUID) -> None:
+        """Put a claimed job back, e.g. when its worker shuts down"""
+        job = self._jobs.get(job_id)
+        if job is not None and job.status == JobStatus.RUNNING:
+            job.status = JobStatus.QUEUED
+            job.worker_id = None
+            job.attempts -= 1  # Not the job's fault
+            self._pending.appendleft(job_id)
+            self._wakeup.set()
+
+    async def cancel(self, job_id: uuid.UUID) -> Optional[GenerationJob]:
+        return await self.finish(job_id, JobStatus.CANCELLED)
+
+    async def get(self, job_id: uuid.UUID) -> Optional[GenerationJob]:
+        return self._jobs.get(job_id)
+
+    async def wait_for_work(self) -> None:
+        await self._wakeup.wait()
+        self._wakeup.clear()
+
+
+class PostgresJobQueue:
+    """Job queue stored in the generationjob table"""
+
+    def __init__(self, engine: Any, poll_interval: float = 1.0, lease_seconds: float = 60.0, max_attempts: int = 2):
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._wakeup = asyncio.Event()
+
+    async def submit(self, job: GenerationJob) -> GenerationJob:
+        job = await asyncio.to_thread(self._submit, job)
+        self._wakeup.set()  # Workers in other processes find it on their next poll
+        return job
+
+    def _submit(self, job: GenerationJob) -> GenerationJob:
+        with Session(self.engine) as session:
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            return job
+
+    async def claim(self, worker_id: str) -> Tuple[Optional[GenerationJob], List[GenerationJob]]:
+        """The next job, now leased to worker_id, and any jobs given up on meanwhile"""
+        return await asyncio.to_thread(self._claim, worker_id)
+
+    def _claim(self, worker_id: str) -> Tuple[Optional[GenerationJob], List[GenerationJob]]:
+        abandoned: List[GenerationJob] = []
+        with Session(self.engine) as session:
+            while True:
+                now = datetime.utcnow()
+                stale = now - timedelta(seconds=self.lease_seconds)
+                statement = (
+                    select(GenerationJob)
+                    .where(or_(
+                        GenerationJob.status == JobStatus.QUEUED,
+                        and_(GenerationJob.status == JobStatus.RUNNING, GenerationJob.heartbeat_at < stale)
+                    ))
+                    .order_by(GenerationJob.created_at)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+                job = session.exec(statement).first()
+                if job is None:
+                    return None, abandoned
+
+                if job.attempts >= self.max_attempts:
+                    # Its workers keep dying; stop retrying it. The caller
+                    # announces it, as no worker of its own is left to
+                    job.status = JobStatus.FAILED
+                    job.error_message = f"Abandoned after {job.attempts} attempts"
+                    job.finished_at = now
+                    session.add(job)
+                    session.commit()
+                    session.refresh(job)
+                    abandoned.append(job)
+                    continue
+
+                job.status = JobStatus.RUNNING
+                job.worker_id = worker_id
+                job.attempts += 1
+                job.started_at = job.heartbeat_at = now
+                session.add(job)
+                session.commit()
+                session.refresh(job)
+                return job, abandoned
+
+    async def heartbeat(self, job_id: uuid.UUID, worker_id: str) -> Optional[JobStatus]:
+        """Extend worker_id's lease on the job; returns its status so workers
+        notice cancellation, or None once the lease belongs to another worker"""
+        return await asyncio.to_thread(self._heartbeat, job_id, worker_id)
+
+    def _heartbeat(self, job_id: uuid.UUID, worker_id: str) -> Optional[JobStatus]:
+        with Session(self.engine) as session:
+            result = session.execute(
+                update(GenerationJob)
+                .where(
+                    GenerationJob.id == job_id,
+                    GenerationJob.worker_id == worker_id,
+                    GenerationJob.status == JobStatus.RUNNING
+                )
+                .values(heartbeat_at=datetime.utcnow())
+            )
+            session.commit()
+            if result.rowcount:
+                return JobStatus.RUNNING
+            # Finished or cancelled, unless the lease was reclaimed
+            job = session.get(GenerationJob, job_id)
+            if job is None or job.worker_id != worker_id:
+                return None
+            return job.status
+
+    async def finish(self, job_id: uuid.UUID, status: JobStatus, error: Optional[str] = None) -> Optional[GenerationJob]:
+        return await asyncio.to_thread(self._finish, job_id, status, error)
+
+    def _finish(self, job_id: uuid.UUID, status: JobStatus, error: Optional[str]) -> Optional[GenerationJob]:
+        with Session(self.engine) as session:
+            job = session.get(GenerationJob, job_id, with_for_update=True)
+            if job is None:
+                return None
+            if job.status not in JOB_TERMINAL_STATUSES:
+                job.status = status
+                job.error_message = error[:2000] if error else None
+                job.finished_at = datetime.utcnow()
+                session.add(job)
+                session.commit()
+                session.refresh(job)
+            return job
+
+    async def release(self, job_id: uuid.UUID) -> None:
+        await asyncio.to_thread(self._release, job_id)
+
+    def _release(self, job_id: uuid.UUID) -> None:
+        with Session(self.engine) as session:
+            job = session.get(GenerationJob, job_id, with_for_update=True)
+            if job is not None and job.status == JobStatus.RUNNING:
+                job.status = JobStatus.QUEUED
+                job.worker_id = None
+                job.attempts -= 1  # Not the job's fault
+                session.add(job)
+                session.commit()
+
+    async def cancel(self, job_id: uuid.UUID) -> Optional[GenerationJob]:
+        return await self.finish(job_id, JobStatus.CANCELLED)
+
+    async def get(self, job_id: uuid.UUID) -> Optional[GenerationJob]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    def _get(self, job_id: uuid.UUID) -> Optional[GenerationJob]:
+        with Session(self.engine) as session:
+            return session.get(GenerationJob, job_id)
+
+    async def wait_for_work(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+
+class ProgressBroker:
+    """Fans job progress out to subscribers in this process"""
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[uuid.UUID, Set[asyncio.Queue]] = {}
+
+    async def publish(self, job_id: uuid.UUID, message: Dict[str, Any]) -> None:
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait(message)
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: uuid.UUID) -> AsyncIterator[AsyncIterator[Dict[str, Any]]]:
+        """Messages published for job_id from now on, ending with its final status"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            yield _drain(queue)
+        finally:
+            subscribers = self._subscribers.get(job_id, set())
+            subscribers.discard(queue)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+
+class RedisProgressBroker:
+    """Fans job progress out through Redis pub/sub, across processes"""
+
+    def __init__(self, url: str):
+        self.client = aioredis.Redis.from_url(url)
+
+    def _channel(self, job_id: uuid.UUID) -> str:
+        return f"job_progress:{job_id}"
+
+    async def publish(self, job_id: uuid.UUID, message: Dict[str, Any]) -> None:
+        try:
+            await self.client.publish(self._channel(job_id), json.dumps(message, default=str))
+        except Exception as e:
+            logger.warning(f"Job progress publish failed: {e}")
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: uuid.UUID) -> AsyncIterator[AsyncIterator[Dict[str, Any]]]:
+        queue: asyncio.Queue = asyncio.Queue()
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self._channel(job_id))
+
+        async def read() -> None:
+            async for item in pubsub.listen():
+                if item.get("type") == "message":
+                    queue.put_nowait(json.loads(item["data"]))
+
+        reader = asyncio.create_task(read())
+        try:
+            yield _drain(queue)
+        finally:
+            reader.cancel()
+            await pubsub.unsubscribe()
+            await pubsub.close()
+
+
+async def _drain(queue: asyncio.Queue) -> AsyncIterator[Dict[str, Any]]:
+    while True:
+        message = await queue.get()
+        yield message
+        if is_final(message):
+            return
+
+
+def build_job_queue() -> Any:
+    if settings.JOB_QUEUE_BACKEND == "memory":
+        return InMemoryJobQueue(max_attempts=settings.JOB_MAX_ATTEMPTS)
+    return PostgresJobQueue(
+        engine,
+        poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+        lease_seconds=settings.JOB_LEASE_SECONDS,
+        max_attempts=settings.JOB_MAX_ATTEMPTS
+    )
+
+
+def build_progress_broker() -> Any:
+    if settings.REDIS_URL and REDIS_AVAILABLE:
+        return RedisProgressBroker(settings.REDIS_URL)
+    return ProgressBroker()
+
+
+# Global queue and broker instances
+job_queue = build_job_queue()
+progress_broker = build_progress_broker()
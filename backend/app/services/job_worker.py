@@ -0,0 +1,186 @@
+"""
+Generation Worker Pool for AI Studio
+
+Runs queued generation jobs, a configured number at a time per process,
+independently of the connections that submitted them. Every message a job
+produces is numbered, appended to its event log and published to its
+subscribers; a heartbeat keeps the job's lease and notices cancellation.
+On shutdown, running jobs are put back on the queue for another worker.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from app.models import GenerationJob, JobStatus, StreamingMessage
+from app.services.job_queue import status_message
+from app.services.run_events import RunEventLog
+
+logger = logging.getLogger(__name__)
+
+# Runs one job, yielding the messages its subscribers should see
+JobRunner = Callable[[GenerationJob], AsyncIterator[StreamingMessage]]
+
+
+class WorkerPool:
+    """Fixed-size pool of workers claiming jobs from a queue"""
+
+    def __init__(
+        self,
+        queue: Any,
+        broker: Any,
+        events: RunEventLog,
+        run: JobRunner,
+        size: int,
+        heartbeat_seconds: float = 10.0
+    ):
+        self.queue = queue
+        self.broker = broker
+        self.events = events
+        self.run = run
+        self.size = size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.name = f"{socket.gethostname()}-{os.getpid()}"
+
+        self._workers: List[asyncio.Task] = []
+        self.running: Dict[uuid.UUID, GenerationJob] = {}
+        self._seqs: Dict[uuid.UUID, int] = {}
+
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    async def start(self) -> None:
+        """Start the workers (idempotent)"""
+        if self._workers:
+            return
+        self._workers = [
+            asyncio.create_task(self._work(f"{self.name}-{index}"))
+            for index in range(self.size)
+        ]
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.events.flush()
+
+    async def _work(self, worker_id: str) -> None:
+        while True:
+            try:
+                job, abandoned = await self.queue.claim(worker_id)
+            except Exception as e:
+                logger.warning(f"Job claim failed: {e}")
+                await asyncio.sleep(self.heartbeat_seconds)
+                continue
+            for failed in abandoned:
+                # Subscribers of a job given up on still need its final status
+                await self._announce(failed)
+            if job is None:
+                await self.queue.wait_for_work()
+                continue
+            await self._run_job(job, worker_id)
+
+    async def _run_job(self, job: GenerationJob, worker_id: str) -> None:
+        self.running[job.id] = job
+        # A reclaimed job carries on numbering from where its last worker stopped
+        self._seqs[job.id] = await self.events.last_seq(job.id)
+        await self._publish(job, status_message(job))
+        runner = asyncio.ensure_future(self._produce(job))
+        lease_lost = False
+
+        try:
+            # Heartbeat until the job finishes; stop it if it was cancelled
+            # or its lease expired and another worker reclaimed it
+            while True:
+                done, _ = await asyncio.wait({runner}, timeout=self.heartbeat_seconds)
+                if done:
+                    break
+                try:
+                    status = await self.queue.heartbeat(job.id, worker_id)
+                except Exception as e:
+                    logger.warning(f"Heartbeat for job {job.id} failed: {e}")
+                    continue
+                if status is None:
+                    lease_lost = True
+                    runner.cancel()
+                    break
+                elif status == JobStatus.CANCELLED:
+                    runner.cancel()
+
+            if lease_lost:
+                # The job and its event numbering belong to the new worker now;
+                # wait for the run to stop so it writes nothing more
+                await asyncio.gather(runner, return_exceptions=True)
+                logger.warning(f"Lost the lease on job {job.id}; stopped it")
+                self.events.discard(job.id)
+                self._seqs.pop(job.id, None)
+                return
+
+            if runner.cancelled():
+                status, error = JobStatus.CANCELLED, None
+            elif runner.exception() is not None:
+                status, error = JobStatus.FAILED, str(runner.exception())
+            else:
+                status, error = runner.result()
+
+        except asyncio.CancelledError:
+            # Shutting down: let another worker pick the job up again
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+            await asyncio.shield(self.queue.release(job.id))
+            self._seqs.pop(job.id, None)
+            raise
+        finally:
+            self.running.pop(job.id, None)
+
+        # A finished job's progress is all in the log; only its status may trail
+        await self.events.flush()
+        finished = await self.queue.finish(job.id, status, error)
+        if status == JobStatus.SUCCEEDED:
+            self.completed += 1
+        elif status == JobStatus.CANCELLED:
+            self.cancelled += 1
+        else:
+            self.failed += 1
+        await self._publish(job, status_message(finished or job))
+        self._seqs.pop(job.id, None)
+
+    async def _announce(self, job: GenerationJob) -> None:
+        """Publish the status of a job this worker is not running"""
+        try:
+            self._seqs[job.id] = await self.events.last_seq(job.id)
+            await self._publish(job, status_message(job))
+            await self.events.flush()
+        except Exception as e:
+            logger.warning(f"Announcing job {job.id} failed: {e}")
+        finally:
+            self._seqs.pop(job.id, None)
+
+    async def _publish(self, job: GenerationJob, message: Dict[str, Any]) -> None:
+        seq = self._seqs[job.id] = self._seqs[job.id] + 1
+        message = {**message, "seq": seq}
+        await self.events.append(job.id, seq, message)
+        await self.broker.publish(job.id, message)
+
+    async def _produce(self, job: GenerationJob) -> Tuple[JobStatus, Optional[str]]:
+        """Run the job, publishing its messages; a build_error fails it"""
+        error = None
+        async for message in self.run(job):
+            if message.type == "build_error":
+                error = message.content or "Generation failed"
+            await self._publish(job, message.model_dump(mode="json", exclude_none=True))
+        return (JobStatus.FAILED, error) if error else (JobStatus.SUCCEEDED, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "running": len(self.running),
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,186 @@
+"""
+LLM Admission Governor for AI Studio
+
+Async admission layer in front of the OpenAI client. Bounds in-flight requests
+globally and per user, charges a tokens-per-minute bucket with the estimated
+prompt plus completion tokens, and queues waiting callers by priority so load
+spikes wait in line instead of turning into 429 storms.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lower values are admitted first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+# User on whose behalf LLM calls are made; set once per connection or job
+llm_caller: ContextVar[Optional[str]] = ContextVar("llm_caller", default=None)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at tokens_per_minute"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def time_until(self, amount: int) -> float:
+        """Seconds until amount tokens are available"""
+        self._refill()
+        # Requests larger than the whole bucket wait for a full bucket
+        needed = min(float(amount), self.capacity) - self.tokens
+        return max(0.0, needed / self.rate)
+
+    def consume(self, amount: int) -> None:
+        self._refill()
+        self.tokens -= min(float(amount), self.capacity)
+
+
+@dataclass
+class AdmissionTicket:
+    """Record of a single admitted call"""
+    user_id: Optional[str]
+    priority: int
+    estimated_tokens: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    queue_wait_ms: float = 0.0
+
+
+class LLMGovernor:
+    """Priority admission queue with global, per-user and token-rate limits"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        per_user_concurrency: int,
+        tokens_per_minute: int
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_user_concurrency = per_user_concurrency
+        self.bucket = TokenBucket(tokens_per_minute)
+
+        self._active = 0
+        self._active_by_user: Dict[Optional[str], int] = {}
+        self._waiters: List[Tuple[int, int, AdmissionTicket, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._retry_handle: Optional[asyncio.TimerHandle] = None
+
+        self.admitted = 0
+        self.total_queue_wait_ms = 0.0
+        self.max_queue_wait_ms = 0.0
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        estimated_tokens: int,
+        user_id: Optional[str] = None,
+        priority: int = PRIORITY_NORMAL
+    ) -> AsyncIterator[AdmissionTicket]:
+        """Wait for admission, hold the slot for the body, then release it"""
+
+        ticket = AdmissionTicket(user_id=user_id, priority=priority, estimated_tokens=estimated_tokens)
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), ticket, future))
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Admitted just as the caller was cancelled: give the slot back
+            if future.done() and not future.cancelled():
+                self._release(user_id)
+            raise
+
+        ticket.queue_wait_ms = (time.monotonic() - ticket.enqueued_at) * 1000
+        self.admitted += 1
+        self.total_queue_wait_ms += ticket.queue_wait_ms
+        self.max_queue_wait_ms = max(self.max_queue_wait_ms, ticket.queue_wait_ms)
+
+        try:
+            yield ticket
+        finally:
+            self._release(user_id)
+
+    def _release(self, user_id: Optional[str]) -> None:
+        self._active -= 1
+        remaining = self._active_by_user.get(user_id, 1) - 1
+        if remaining > 0:
+            self._active_by_user[user_id] = remaining
+        else:
+            self._active_by_user.pop(user_id, None)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit as many queued callers as the limits allow, in priority order"""
+        deferred = []
+
+        while self._waiters and self._active < self.max_concurrency:
+            item = heapq.heappop(self._waiters)
+            _, _, ticket, future = item
+            if future.done():
+                continue  # Caller gave up while queued
+
+            # A user at their cap must not hold up everyone else
+            if self._active_by_user.get(ticket.user_id, 0) >= self.per_user_concurrency:
+                deferred.append(item)
+                continue
+
+            wait = self.bucket.time_until(ticket.estimated_tokens)
+            if wait > 0:
+                deferred.append(item)
+                self._schedule_retry(wait)
+                break
+
+            self.bucket.consume(ticket.estimated_tokens)
+            self._active += 1
+            self._active_by_user[ticket.user_id] = self._active_by_user.get(ticket.user_id, 0) + 1
+            future.set_result(None)
+
+        for item in deferred:
+            heapq.heappush(self._waiters, item)
+
+    def _schedule_retry(self, delay: float) -> None:
+        if self._retry_handle is not None and not self._retry_handle.cancelled():
+            return
+
+        def retry() -> None:
+            self._retry_handle = None
+            self._dispatch()
+
+        self._retry_handle = asyncio.get_running_loop().call_later(delay, retry)
+
+    def queue_depth(self) -> int:
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "active": self._active,
+            "queued": self.queue_depth(),
+            "admitted": self.admitted,
+            "avg_queue_wait_ms": self.total_queue_wait_ms / self.admitted if self.admitted else 0.0,
+            "max_queue_wait_ms": self.max_queue_wait_ms,
+            "tokens_available": self.bucket.tokens,
+        }
@@ -0,0 +1,309 @@
+"""
+Dependency-keyed node_modules Cache for AI Studio
+
+Installs each distinct dependency set once and links the installed
+node_modules tree into sandboxes by symlink, hardlink or reflink. Entries are
+evicted by total disk size, least recently used first.
+
+Safe under concurrent runs across worker processes: installs of a key are
+serialized by an exclusive file lock, and every linked tree holds a shared
+lock on its entry that eviction must be able to upgrade before deleting it.
+Installs can run fully offline from a pre-seeded npm cache (NPM_OFFLINE).
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.process_runner import run_process
+
+logger = logging.getLogger(__name__)
+
+LINK_MODES = ("symlink", "hardlink", "reflink")
+
+# Marker written once an entry is fully installed; its mtime is the last use
+COMPLETE_MARKER = ".complete"
+
+
+class InstallError(RuntimeError):
+    """npm could not install a dependency set"""
+
+
+def normalize_dependencies(package_json: Dict[str, Any]) -> Dict[str, str]:
+    """Merged, sorted dependency set, so equivalent package.json files share a key"""
+    merged: Dict[str, str] = {}
+    for section in ("dependencies", "devDependencies"):
+        entries = package_json.get(section) or {}
+        if not isinstance(entries, dict):
+            continue
+        for name, version in entries.items():
+            merged[str(name).strip().lower()] = str(version).strip()
+    return dict(sorted(merged.items()))
+
+
+def dependency_key(dependencies: Dict[str, str]) -> str:
+    canonical = json.dumps(dependencies, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def tree_size(path: Path) -> int:
+    """Bytes used by the files under path, not following symlinks"""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+    return total
+
+
+class ModulesLease:
+    """Shared lock keeping a cache entry alive while a sandbox links to it"""
+
+    def __init__(self, key: str, fd: int, hit: bool):
+        self.key = key
+        self.hit = hit
+        self._fd: Optional[int] = fd
+
+    def release(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)  # Closing drops the flock
+            self._fd = None
+
+
+class NodeModulesCache:
+    """On-disk cache of installed node_modules trees keyed by dependency set"""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: int = 5 * 1024 ** 3,
+        link_mode: str = "symlink",
+        offline: bool = False,
+        npm_cache_dir: Optional[str] = None,
+        install_timeout: float = 180.0
+    ):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode {link_mode!r}; expected one of {LINK_MODES}")
+
+        self.directory = Path(directory) if directory else Path(tempfile.gettempdir()) / "ai-studio-node-modules"
+        self.max_bytes = max_bytes
+        self.link_mode = link_mode
+        self.offline = offline
+        self.npm_cache_dir = npm_cache_dir
+        self.install_timeout = install_timeout
+
+        self._key_locks: Dict[str, asyncio.Lock] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.install_failures = 0
+        self.evictions = 0
+
+    async def link(self, dependencies: Dict[str, str], target: Path) -> ModulesLease:
+        """Make target/node_modules the installed tree for dependencies"""
+
+        key = dependency_key(dependencies)
+        lease, hit = await self._acquire(key, dependencies)
+        try:
+            await asyncio.to_thread(self._link_tree, self._entry(key) / "node_modules", target / "node_modules")
+        except Exception:
+            lease.release()
+            raise
+
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+            await asyncio.to_thread(self.evict, key)
+        return lease
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / key
+
+    async def _acquire(self, key: str, dependencies: Dict[str, str]) -> Tuple[ModulesLease, bool]:
+        """Take a shared lock on a complete entry, installing it first if needed"""
+
+        await asyncio.to_thread(self.directory.mkdir, parents=True, exist_ok=True)
+        lock = self._key_locks.setdefault(key, asyncio.Lock())
+
+        async with lock:
+            # Shared use lock first, so eviction cannot remove the entry after the check
+            use_fd = await asyncio.to_thread(self._lock, self.directory / f"{key}.use.lock", fcntl.LOCK_SH)
+            try:
+                marker = self._entry(key) / COMPLETE_MARKER
+                if marker.exists():
+                    os.utime(marker)
+                    return ModulesLease(key, use_fd, hit=True), True
+
+                install_fd = await asyncio.to_thread(self._lock, self.directory / f"{key}.install.lock", fcntl.LOCK_EX)
+                try:
+                    # Another process may have installed it while we waited
+                    if marker.exists():
+                        os.utime(marker)
+                        return ModulesLease(key, use_fd, hit=True), True
+                    await self._install(key, dependencies)
+                finally:
+                    os.close(install_fd)
+                return ModulesLease(key, use_fd, hit=False), False
+            except BaseException:
+                os.close(use_fd)
+                raise
+
+    def _lock(self, path: Path, operation: int) -> int:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    def npm_install_command(self) -> List[str]:
+        command = ["npm", "install", "--no-audit", "--no-fund", "--no-package-lock"]
+        if self.npm_cache_dir:
+            command += ["--cache", self.npm_cache_dir]
+        if self.offline:
+            # Resolve everything from the pre-seeded cache; never touch the registry
+            command.append("--offline")
+        return command
+
+    async def _install(self, key: str, dependencies: Dict[str, str]) -> None:
+        """Install into a staging directory and move it into place atomically"""
+
+        staging = self.directory / f".staging-{uuid.uuid4().hex}"
+        await asyncio.to_thread(staging.mkdir)
+        try:
+            package_json = {"name": "ai-studio-deps", "private": True, "dependencies": dependencies}
+            (staging / "package.json").write_text(json.dumps(package_json, indent=2))
+
+            try:
+                result = await run_process(self.npm_install_command(), cwd=staging, timeout=self.install_timeout)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                self.install_failures += 1
+                raise InstallError(f"Package installation failed: {e}") from e
+            if result.returncode != 0:
+                self.install_failures += 1
+                raise InstallError(f"Package installation failed: {result.stderr}")
+
+            size = await asyncio.to_thread(tree_size, staging / "node_modules")
+            marker = {"bytes": size, "dependencies": dependencies, "installed_at": time.time()}
+            (staging / COMPLETE_MARKER).write_text(json.dumps(marker))
+
+            entry = self._entry(key)
+            if entry.exists():
+                # Leftovers of an interrupted install
+                await asyncio.to_thread(shutil.rmtree, entry, True)
+            os.rename(staging, entry)
+        finally:
+            if staging.exists():
+                await asyncio.to_thread(shutil.rmtree, staging, True)
+
+    def _link_tree(self, source: Path, target: Path) -> None:
+        if target.is_symlink() or target.is_file():
+            target.unlink()
+        elif target.exists():
+            shutil.rmtree(target)
+
+        if self.link_mode == "symlink":
+            os.symlink(source, target, target_is_directory=True)
+            return
+
+        if self.link_mode == "reflink":
+            result = subprocess.run(
+                ["cp", "-a", "--reflink=always", str(source), str(target)],
+                capture_output=True
+            )
+            if result.returncode == 0:
+                return
+            # Filesystem without copy-on-write support
+            shutil.rmtree(target, ignore_errors=True)
+
+        try:
+            shutil.copytree(source, target, symlinks=True, copy_function=os.link)
+        except OSError:
+            # Hardlinks cannot cross filesystems
+            shutil.rmtree(target, ignore_errors=True)
+            shutil.copytree(source, target, symlinks=True)
+
+    def _entries(self) -> List[Tuple[str, float, int]]:
+        """(key, last used, bytes) for every complete entry"""
+        entries = []
+        if not self.directory.exists():
+            return entries
+        for marker in self.directory.glob(f"*/{COMPLETE_MARKER}"):
+            try:
+                size = json.loads(marker.read_text()).get("bytes", 0)
+                entries.append((marker.parent.name, marker.stat().st_mtime, size))
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+
+        for key, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+
+            try:
+                fd = self._lock(self.directory / f"{key}.use.lock", fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # Linked into a running sandbox
+            try:
+                trash = self.directory / f".evicted-{uuid.uuid4().hex}"
+                os.rename(self._entry(key), trash)
+                shutil.rmtree(trash, ignore_errors=True)
+                total -= size
+                self.evictions += 1
+            except OSError as e:
+                logger.warning(f"node_modules cache eviction of {key} failed: {e}")
+            finally:
+                os.close(fd)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "install_failures": self.install_failures,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, _, size in entries),
+            "link_mode": self.link_mode,
+            "offline": self.offline,
+        }
+
+
+# Global cache instance
+node_modules_cache = NodeModulesCache(
+    directory=settings.NODE_MODULES_CACHE_DIR,
+    max_bytes=settings.NODE_MODULES_CACHE_MAX_BYTES,
+    link_mode=settings.NODE_MODULES_LINK_MODE,
+    offline=settings.NPM_OFFLINE,
+    npm_cache_dir=settings.NPM_CACHE_DIR,
+    install_timeout=settings.SANDBOX_INSTALL_TIMEOUT_SECONDS
+)
@@ -8,12 +8,19 @@ cost optimization and error handling.
 import os
 import json
 import asyncio
+import time
 from typing import Dict, List, Optional, AsyncGenerator, Any
+import openai
 from openai import AsyncOpenAI
 from pydantic import BaseModel
 import logging
 
 from ..core.config import settings
+from .circuit_breaker import CircuitBreaker
+from .completion_cache import CompletionCache, build_shared_tier, make_cache_key
+from .llm_governor import LLMGovernor, PRIORITY_NORMAL, llm_caller
+from .prompt_builder import count_tokens
+from .retry_policy import LatencyTracker, RetryPolicy, call_with_retries, hedged
 
 logger = logging.getLogger(__name__)
 
@@ -24,12 +31,22 @@ class OpenAIConfig(BaseModel):
     temperature: float = 0.7
     stream: bool = True
 
+def is_provider_failure(exc: BaseException) -> bool:
+    """Errors that indicate the provider itself is unhealthy"""
+    if isinstance(exc, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
 class OpenAIService:
     """Centralized OpenAI API service with cost optimization"""
     
     def __init__(self):
+        # Retries are handled by our own policy, not the client's
         self.client = AsyncOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY")
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0,
+            timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS
         )
         
         # Load configuration from environment with cost-effective defaults
@@ -44,6 +61,46 @@ class OpenAIService:
             self.config.max_tokens = int(os.getenv("TEST_MAX_TOKENS", "500"))
             self.config.model = "gpt-3.5-turbo"  # Force cheapest model in test
         
+        # Content-addressed completion cache
+        self.cache: Optional[CompletionCache] = None
+        if settings.COMPLETION_CACHE_ENABLED:
+            self.cache = CompletionCache(
+                max_bytes=settings.COMPLETION_CACHE_MAX_BYTES,
+                ttl_seconds=settings.COMPLETION_CACHE_TTL_SECONDS,
+                shared=build_shared_tier(
+                    settings.REDIS_URL,
+                    settings.COMPLETION_CACHE_DIR,
+                    settings.COMPLETION_CACHE_TTL_SECONDS
+                )
+            )
+        
+        # Admission control shared by every call made from this worker
+        self.governor = LLMGovernor(
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            per_user_concurrency=settings.LLM_MAX_CONCURRENCY_PER_USER,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE
+        )
+        
+        # Retry transient failures; hedge slow calls in configured stages
+        self.retry_policy = RetryPolicy(
+            max_attempts=settings.LLM_RETRY_MAX_ATTEMPTS,
+            base_delay=settings.LLM_RETRY_BASE_DELAY_SECONDS,
+            max_delay=settings.LLM_RETRY_MAX_DELAY_SECONDS
+        )
+        self.latency = LatencyTracker(min_samples=settings.LLM_HEDGE_MIN_SAMPLES)
+        
+        # Fail fast during provider outages so callers fall back immediately
+        self.breaker = CircuitBreaker(
+            "openai",
+            window_seconds=settings.LLM_BREAKER_WINDOW_SECONDS,
+            min_calls=settings.LLM_BREAKER_MIN_CALLS,
+            error_rate_threshold=settings.LLM_BREAKER_ERROR_RATE,
+            slow_call_seconds=settings.LLM_BREAKER_SLOW_CALL_SECONDS,
+            slow_call_rate_threshold=settings.LLM_BREAKER_SLOW_CALL_RATE,
+            open_seconds=settings.LLM_BREAKER_OPEN_SECONDS,
+            is_failure=is_provider_failure
+        )
+        
         logger.info(f"OpenAI Service initialized with model: {self.config.model}")
 
     async def generate_completion(
@@ -52,9 +109,22 @@ class OpenAIService:
         system_prompt: Optional[str] = None,
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
-        stream: bool = False
+        stream: bool = False,
+        use_cache: bool = True,
+        user_id: Optional[str] = None,
+        priority: int = PRIORITY_NORMAL,
+        stage: Optional[str] = None
     ) -> str:
-        """Generate a single completion response"""
+        """Generate a single completion response
+
+        Identical requests are served from the completion cache unless
+        use_cache is False. Cache misses wait for admission by the governor,
+        charged to user_id (or the current llm_caller) at the given priority.
+        Transient failures are retried, and calls tagged with a stage listed
+        in LLM_HEDGE_STAGES are hedged after that stage's p95 latency. While
+        the circuit breaker is open, cache misses raise CircuitOpenError
+        immediately.
+        """
         
         # Prepare messages
         formatted_messages = []
@@ -71,31 +141,99 @@ class OpenAIService:
             "stream": stream
         }
         
+        user_id = user_id or llm_caller.get()
+        
+        if self.cache is None or not use_cache:
+            return await self._request_completion(request_config, user_id, priority, stage)
+        
+        # Streaming only changes the transport, not the completion itself
+        cache_key = make_cache_key({k: v for k, v in request_config.items() if k != "stream"})
+        return await self.cache.get_or_compute(
+            cache_key, lambda: self._request_completion(request_config, user_id, priority, stage)
+        )
+
+    async def _request_completion(
+        self,
+        request_config: Dict[str, Any],
+        user_id: Optional[str],
+        priority: int,
+        stage: Optional[str]
+    ) -> str:
+        """Send a completion request, retrying and hedging as configured"""
+        
+        self.breaker.check()
+        
+        # Hedging a saturated worker only adds load, so skip it while callers queue
+        hedge_after = None
+        if stage in settings.LLM_HEDGE_STAGES and not self.governor.queue_depth():
+            hedge_after = self.latency.percentile(stage, 0.95)
+        
         try:
-            if stream:
-                # For streaming responses
-                response_chunks = []
-                async for chunk in await self.client.chat.completions.create(**request_config):
-                    if chunk.choices[0].delta.content:
-                        response_chunks.append(chunk.choices[0].delta.content)
-                return "".join(response_chunks)
-            else:
-                # For single responses
-                response = await self.client.chat.completions.create(**request_config)
-                return response.choices[0].message.content
-                
+            return await call_with_retries(
+                self.retry_policy,
+                lambda: hedged(
+                    lambda: self._admitted_completion(request_config, user_id, priority, stage),
+                    hedge_after
+                )
+            )
         except Exception as e:
             logger.error(f"OpenAI API error: {str(e)}")
             raise
 
+    async def _admitted_completion(
+        self,
+        request_config: Dict[str, Any],
+        user_id: Optional[str],
+        priority: int,
+        stage: Optional[str]
+    ) -> str:
+        """Send a completion request to the API once admitted"""
+        
+        async with self.governor.admit(
+            self._estimate_request_tokens(request_config), user_id, priority
+        ) as ticket:
+            if ticket.queue_wait_ms >= 100:
+                logger.info(f"OpenAI request for user {user_id} queued {ticket.queue_wait_ms:.0f}ms")
+            
+            started = time.monotonic()
+            with self.breaker.guard():
+                response = await self._send_completion(request_config)
+            self.latency.record(stage or "default", time.monotonic() - started)
+            return response
+
+    async def _send_completion(self, request_config: Dict[str, Any]) -> str:
+        """Send a completion request to the API"""
+        
+        if request_config["stream"]:
+            # For streaming responses
+            response_chunks = []
+            async for chunk in await self.client.chat.completions.create(**request_config):
+                if chunk.choices[0].delta.content:
+                    response_chunks.append(chunk.choices[0].delta.content)
+            return "".join(response_chunks)
+        else:
+            # For single responses
+            response = await self.client.chat.completions.create(**request_config)
+            return response.choices[0].message.content
+
     async def stream_completion(
         self,
         messages: List[Dict[str, str]],
         system_prompt: Optional[str] = None,
         max_tokens: Optional[int] = None,
-        temperature: Optional[float] = None
+        temperature: Optional[float] = None,
+        user_id: Optional[str] = None,
+        priority: int = PRIORITY_NORMAL,
+        use_cache: bool = True,
+        stage: Optional[str] = None,
+        raise_errors: bool = False
     ) -> AsyncGenerator[str, None]:
-        """Stream completion response chunk by chunk"""
+        """Stream completion response chunk by chunk
+
+        A cached completion is replayed as a single chunk; a completed stream
+        is stored for later requests. Errors are yielded as an "Error: ..."
+        chunk unless raise_errors is set, in which case they propagate.
+        """
         
         # Prepare messages
         formatted_messages = []
@@ -111,16 +249,54 @@ class OpenAIService:
             "stream": True
         }
         
+        cache_key = None
+        if self.cache is not None and use_cache:
+            cache_key = make_cache_key({k: v for k, v in request_config.items() if k != "stream"})
+        
         try:
-            stream = await self.client.chat.completions.create(**request_config)
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            if cache_key:
+                cached = await self.cache.lookup(cache_key)
+                if cached is not None:
+                    yield cached
+                    return
+            
+            self.breaker.check()
+            
+            # The admission slot is held until the stream is drained
+            async with self.governor.admit(
+                self._estimate_request_tokens(request_config),
+                user_id or llm_caller.get(),
+                priority
+            ):
+                started = time.monotonic()
+                # Only opening the stream is retried; a partial stream cannot be replayed
+                stream = await call_with_retries(
+                    self.retry_policy,
+                    lambda: self._open_stream(request_config)
+                )
+                chunks = []
+                async for chunk in stream:
+                    content = chunk.choices[0].delta.content if chunk.choices else None
+                    if content:
+                        if not chunks:
+                            self.latency.record(f"{stage or 'default'}:first_token", time.monotonic() - started)
+                        chunks.append(content)
+                        yield content
+            
+            if cache_key:
+                await self.cache.store(cache_key, "".join(chunks))
                     
         except Exception as e:
             logger.error(f"OpenAI streaming error: {str(e)}")
+            if raise_errors:
+                raise
             yield f"Error: {str(e)}"
 
+    async def _open_stream(self, request_config: Dict[str, Any]) -> Any:
+        """Open a streaming completion, recording the outcome on the breaker"""
+        with self.breaker.guard():
+            return await self.client.chat.completions.create(**request_config)
+
     async def generate_code(
         self,
         prompt: str,
@@ -240,6 +416,32 @@ Code:
         
         return input_cost + output_cost
 
+    def _estimate_request_tokens(self, request_config: Dict[str, Any]) -> int:
+        """Estimate prompt plus completion tokens charged against the TPM budget"""
+        prompt_tokens = sum(
+            count_tokens(message.get("content") or "", request_config["model"])
+            for message in request_config["messages"]
+        )
+        return prompt_tokens + request_config["max_tokens"]
+
+    def get_breaker_stats(self) -> Dict[str, Any]:
+        """Get circuit breaker state for health checks"""
+        return self.breaker.get_stats()
+
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """Get rolling per-stage latency used for hedging, and stream time-to-first-token"""
+        return self.latency.get_stats()
+
+    def get_governor_stats(self) -> Dict[str, Any]:
+        """Get admission queue depth and wait times"""
+        return self.governor.get_stats()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get completion cache hit/miss counters"""
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.get_stats()}
+
     def get_model_info(self) -> Dict[str, Any]:
         """Get current model configuration"""
         return {
@@ -0,0 +1,228 @@
+"""
+Tolerant Patch Applier for AI Studio
+
+Applies model-written edits to generated files, so a repair only has to
+output the lines it changes. Two edit formats are understood, inside a code
+fence named after the file:
+
+    <<<<<<< SEARCH            search/replace blocks; the SEARCH text must
+    old lines                 match lines of the file
+    =======
+    new lines
+    >>>>>>> REPLACE
+
+    @@ -12,3 +12,4 @@         unified diff hunks (with or without ---/+++
+     context                  headers); bare ```diff fences are split per
+    -old                      file using their +++ headers
+    +new
+
+Matching tolerates what models get wrong: trailing whitespace, different
+indentation, and small differences in context lines. Any other fence content
+is taken as the whole new file.
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from app.services.fence_parser import filename_from_info, parse_files
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MARKER = re.compile(r"^<{5,9} SEARCH\s*$", re.MULTILINE)
+SEARCH_BLOCK = re.compile(
+    r"^<{5,9} SEARCH[ \t]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} REPLACE[ \t]*$",
+    re.MULTILINE | re.DOTALL
+)
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+DIFF_FENCE = re.compile(r"^```diff([^\n]*)\n(.*?)^```[ \t]*$", re.MULTILINE | re.DOTALL)
+DIFF_TARGET = re.compile(r"^\+\+\+ (?:b/)?(\S+)", re.MULTILINE)
+
+# Lowest similarity at which a block is matched fuzzily
+FUZZY_THRESHOLD = 0.85
+
+
+class PatchError(ValueError):
+    """An edit whose target lines cannot be found in the file"""
+
+
+@dataclass
+class PatchResult:
+    files: Dict[str, str] = field(default_factory=dict)
+    # filename -> "search_replace", "unified_diff" or "whole_file"
+    modes: Dict[str, str] = field(default_factory=dict)
+    # filename -> why its edit could not be applied
+    failed: Dict[str, str] = field(default_factory=dict)
+
+
+def is_unified_diff(text: str) -> bool:
+    return any(HUNK_HEADER.match(line) for line in text.splitlines())
+
+
+def extract_patches(response: str) -> Dict[str, str]:
+    """Edit text per filename, from named fences and bare ```diff fences"""
+    patches = parse_files(response)
+    for match in DIFF_FENCE.finditer(response):
+        if filename_from_info(match.group(1)):
+            continue  # Already parsed as a named fence
+        for filename, diff in split_unified_diff(match.group(2)).items():
+            patches.setdefault(filename, diff)
+    return patches
+
+
+def split_unified_diff(text: str) -> Dict[str, str]:
+    """Per-file sections of a multi-file unified diff, keyed by the +++ path"""
+    sections: Dict[str, str] = {}
+    targets = list(DIFF_TARGET.finditer(text))
+    for index, target in enumerate(targets):
+        end = targets[index + 1].start() if index + 1 < len(targets) else len(text)
+        sections[target.group(1)] = text[target.end():end]
+    return sections
+
+
+def apply_patches(files: Dict[str, str], patches: Dict[str, str]) -> PatchResult:
+    """Apply every file's edits; files whose edits fail are left out and listed"""
+    result = PatchResult()
+    for filename, patch in patches.items():
+        try:
+            content, mode = apply_patch(files.get(filename), patch)
+        except PatchError as e:
+            logger.info(f"Patch for {filename} did not apply: {e}")
+            result.failed[filename] = str(e)
+            continue
+        result.files[filename] = content
+        result.modes[filename] = mode
+    return result
+
+
+def apply_patch(original: Optional[str], patch: str) -> Tuple[str, str]:
+    """New file content and the edit format that produced it"""
+    if SEARCH_MARKER.search(patch):
+        return apply_search_replace(original or "", patch), "search_replace"
+    if is_unified_diff(patch):
+        if original is None:
+            raise PatchError("Diff against a file that does not exist")
+        return apply_unified_diff(original, patch), "unified_diff"
+    return patch, "whole_file"
+
+
+def apply_search_replace(original: str, patch: str) -> str:
+    blocks = SEARCH_BLOCK.findall(patch)
+    if not blocks or len(blocks) != len(SEARCH_MARKER.findall(patch)):
+        raise PatchError("Malformed SEARCH/REPLACE block")
+
+    lines, trailing_newline = _split(original)
+    for search, replace in blocks:
+        search_lines, _ = _split(search)
+        replace_lines, _ = _split(replace)
+        if not search_lines:
+            if lines:
+                raise PatchError("Empty SEARCH block on a non-empty file")
+            lines = replace_lines  # New file
+            trailing_newline = True
+            continue
+        lines = _replace(lines, search_lines, replace_lines, hint=0)
+    return _join(lines, trailing_newline)
+
+
+def apply_unified_diff(original: str, diff: str) -> str:
+    lines, trailing_newline = _split(original)
+    offset = 0  # Line count change from hunks applied so far
+
+    for start, old, new in _hunks(diff):
+        hint = max(start - 1 + offset, 0)
+        if not old:
+            # Pure insertion: no context to match against
+            lines = lines[:hint] + new + lines[hint:]
+        else:
+            lines = _replace(lines, old, new, hint)
+        offset += len(new) - len(old)
+    return _join(lines, trailing_newline)
+
+
+def _hunks(diff: str) -> List[Tuple[int, List[str], List[str]]]:
+    hunks: List[Tuple[int, List[str], List[str]]] = []
+    current: Optional[Tuple[int, List[str], List[str]]] = None
+    for line in diff.splitlines():
+        header = HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+            continue
+        if current is None or line.startswith(("---", "+++", "\\")):
+            continue
+        tag, text = (line[0], line[1:]) if line else (" ", "")
+        if tag in (" ", "-"):
+            current[1].append(text)
+        if tag in (" ", "+"):
+            current[2].append(text)
+    if not hunks:
+        raise PatchError("Diff has no hunks")
+    return hunks
+
+
+def _replace(lines: List[str], old: List[str], new: List[str], hint: int) -> List[str]:
+    start, indent = _locate(lines, old, hint)
+    return lines[:start] + _reindent(new, indent) + lines[start + len(old):]
+
+
+def _locate(lines: List[str], needle: List[str], hint: int) -> Tuple[int, Tuple[str, str]]:
+    """Start of the window matching needle, nearest hint, plus an indent fix-up
+
+    Tried in order: exact, ignoring trailing whitespace, ignoring all
+    surrounding whitespace, then the most similar window above
+    FUZZY_THRESHOLD.
+    """
+    size = len(needle)
+    starts = sorted(range(len(lines) - size + 1), key=lambda start: abs(start - hint))
+
+    for normalize in (lambda line: line, str.rstrip, str.strip):
+        target = [normalize(line) for line in needle]
+        for start in starts:
+            if [normalize(line) for line in lines[start:start + size]] == target:
+                return start, _indent_change(needle, lines[start:start + size])
+
+    best, best_ratio = None, FUZZY_THRESHOLD
+    target_text = "\n".join(line.strip() for line in needle)
+    for start in starts:
+        window = "\n".join(line.strip() for line in lines[start:start + size])
+        ratio = SequenceMatcher(None, target_text, window, autojunk=False).ratio()
+        if ratio > best_ratio:
+            best, best_ratio = start, ratio
+    if best is None:
+        raise PatchError(f"Could not find the lines to replace: {needle[0].strip()!r}...")
+    return best, _indent_change(needle, lines[best:best + size])
+
+
+def _indent_change(needle: List[str], matched: List[str]) -> Tuple[str, str]:
+    """(indent the model used, indent the file uses) for the first non-blank line"""
+    for written, actual in zip(needle, matched):
+        if written.strip() and actual.strip():
+            return _leading(written), _leading(actual)
+    return "", ""
+
+
+def _reindent(lines: List[str], indent: Tuple[str, str]) -> List[str]:
+    written, actual = indent
+    if written == actual:
+        return lines
+    adjusted = []
+    for line in lines:
+        if line.strip() and line.startswith(written):
+            line = actual + line[len(written):]
+        adjusted.append(line)
+    return adjusted
+
+
+def _leading(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _split(text: str) -> Tuple[List[str], bool]:
+    return text.splitlines(), text.endswith("\n")
+
+
+def _join(lines: List[str], trailing_newline: bool) -> str:
+    return "\n".join(lines) + ("\n" if trailing_newline and lines else "")
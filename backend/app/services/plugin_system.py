@@ -4,15 +4,24 @@ import json
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+import logging
 import tempfile
 import subprocess
 import shutil
 import os
 
+from sqlalchemy import Engine
 from sqlmodel import Session, select
+from app.core import db
 from app.core.config import settings
 from app.models import PluginManifest, PluginExecution, PluginTool
+from app.services.process_runner import run_process
+
+logger = logging.getLogger(__name__)
+
+# (plugin directory, mtime_ns, inode, size) of every manifest
+ManifestSignature = Tuple[Tuple[str, int, int, int], ...]
 
 
 class PluginSystem:
@@ -21,20 +30,120 @@ class PluginSystem:
     Each plugin lives in plugins/<toolname>/plugin.json
     """
     
-    def __init__(self):
-        self.plugins_dir = Path("plugins")
+    def __init__(self, plugins_dir: Optional[Path] = None, engine: Optional[Engine] = None):
+        self.plugins_dir = plugins_dir or Path("plugins")
+        self.engine = engine or db.engine
         self.plugins_dir.mkdir(exist_ok=True)
         self.plugin_registry: Dict[str, PluginManifest] = {}
         self.tool_catalog: List[PluginTool] = []
+        
+        # Catalog responses, serialized once per change of the manifests
+        self.plugins_json: Optional[bytes] = None
+        self.tools_json: Optional[bytes] = None
+        self._signature: Optional[ManifestSignature] = None
+        self._refresh_lock = asyncio.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+        self.rebuilds = 0
     
     async def initialize(self, session: Session):
         """Initialize plugin system and scan for plugins"""
         await self.scan_plugins(session)
         await self.build_tool_catalog(session)
     
+    def manifest_signature(self) -> ManifestSignature:
+        """Stat every manifest; changes when one is edited, replaced, added or removed"""
+        signature = []
+        if self.plugins_dir.exists():
+            for manifest_path in self.plugins_dir.glob("*/plugin.json"):
+                try:
+                    stat = manifest_path.stat()
+                except FileNotFoundError:
+                    continue  # Removed while scanning
+                signature.append((manifest_path.parent.name, stat.st_mtime_ns, stat.st_ino, stat.st_size))
+        return tuple(sorted(signature))
+    
+    async def refresh(self, force: bool = False) -> bool:
+        """Rescan and re-serialize the catalog if the manifests changed; True if rebuilt
+
+        The rebuild stats, parses and queries with the sync driver, so it runs
+        in a thread with its own session.
+        """
+        async with self._refresh_lock:
+            return await asyncio.to_thread(self._rebuild, force)
+    
+    def _rebuild(self, force: bool) -> bool:
+        signature = self.manifest_signature()
+        if not force and signature == self._signature and self.plugins_json is not None:
+            return False
+        with Session(self.engine) as session:
+            self._scan(session)
+            self._build_catalog(session)
+            self._serialize(session)
+        self._signature = signature
+        self.rebuilds += 1
+        return True
+    
+    def invalidate(self) -> None:
+        """Rebuild the catalog on the next refresh"""
+        self._signature = None
+    
+    def _serialize(self, session: Session) -> None:
+        plugins = session.exec(select(PluginManifest)).all()
+        self.plugins_json = json.dumps([
+            {
+                "id": str(plugin.id),
+                "name": plugin.name,
+                "version": plugin.version,
+                "description": plugin.description,
+                "enabled": plugin.enabled,
+                "verified": plugin.verified,
+                "inputs": plugin.inputs,
+                "outputs": plugin.outputs,
+                "estimated_cost_ms": plugin.estimated_cost_ms
+            }
+            for plugin in plugins
+        ]).encode()
+        self.tools_json = json.dumps([
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "inputs": tool.inputs,
+                "outputs": tool.outputs,
+                "cost_estimate": tool.cost_estimate
+            }
+            for tool in self.tool_catalog
+        ]).encode()
+    
+    async def start(self, interval: float) -> None:
+        """Build the catalog, then poll the manifests for changes every interval seconds"""
+        await self.refresh()
+        if interval > 0 and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch(interval))
+    
+    async def _watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Plugin catalog refresh failed: {e}")
+    
+    async def close(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+    
     async def scan_plugins(self, session: Session):
         """Scan plugins directory and register all valid plugins"""
-        
+        self._scan(session)
+    
+    def _scan(self, session: Session) -> None:
+        # Only registers; plugins are deleted by remove_plugin, never because
+        # this process's plugins directory lacks their manifest
         if not self.plugins_dir.exists():
             return
         
@@ -43,13 +152,15 @@ class PluginSystem:
                 manifest_path = plugin_dir / "plugin.json"
                 if manifest_path.exists():
                     try:
-                        await self.register_plugin(plugin_dir, session)
+                        self._register(plugin_dir, session)
                     except Exception as e:
-                        print(f"Failed to register plugin {plugin_dir.name}: {e}")
+                        logger.warning(f"Failed to register plugin {plugin_dir.name}: {e}")
     
     async def register_plugin(self, plugin_dir: Path, session: Session) -> PluginManifest:
         """Register a single plugin from its directory"""
-        
+        return self._register(plugin_dir, session)
+    
+    def _register(self, plugin_dir: Path, session: Session) -> PluginManifest:
         manifest_path = plugin_dir / "plugin.json"
         with open(manifest_path) as f:
             manifest_data = json.load(f)
@@ -96,10 +207,12 @@ class PluginSystem:
     
     async def build_tool_catalog(self, session: Session):
         """Build tool catalog from registered plugins"""
-        
+        self._build_catalog(session)
+    
+    def _build_catalog(self, session: Session) -> None:
         plugins = session.exec(select(PluginManifest).where(PluginManifest.enabled == True)).all()
         
-        self.tool_catalog = []
+        tool_catalog = []
         for plugin in plugins:
             tool = PluginTool(
                 name=plugin.name,
@@ -109,7 +222,9 @@ class PluginSystem:
                 cost_estimate=plugin.estimated_cost_ms,
                 plugin_id=plugin.id
             )
-            self.tool_catalog.append(tool)
+            tool_catalog.append(tool)
+        # Swapped in whole: the catalog is read on the event loop while this runs in a thread
+        self.tool_catalog = tool_catalog
     
     async def find_tool_for_goal(self, goal: str, available_inputs: List[str]) -> Optional[PluginTool]:
         """Find the best tool for a given goal and available inputs"""
@@ -144,29 +259,16 @@ class PluginSystem:
     async def execute_plugin(
         self,
         plugin_name: str,
-        input_files: Dict[str, str],
-        session: Session
+        input_files: Dict[str, str]
     ) -> Dict[str, str]:
-        """Execute a plugin with given input files"""
+        """Execute a plugin with given input files
         
-        plugin = self.plugin_registry.get(plugin_name)
-        if not plugin:
-            # Try to load from database
-            plugin = session.exec(
-                select(PluginManifest).where(PluginManifest.name == plugin_name)
-            ).first()
-            
-            if not plugin:
-                raise ValueError(f"Plugin not found: {plugin_name}")
+        The execution record is written in short sessions before and after
+        the run, in a thread so the sync driver does not block the event
+        loop, and no connection is held while the plugin works.
+        """
         
-        # Create execution record
-        execution = PluginExecution(
-            plugin_id=plugin.id,
-            input_files=input_files
-        )
-        session.add(execution)
-        session.commit()
-        session.refresh(execution)
+        plugin, execution = await asyncio.to_thread(self._start_execution, plugin_name, input_files)
         
         try:
             # Execute plugin in isolated container
@@ -187,9 +289,32 @@ class PluginSystem:
             execution.completed_at = datetime.utcnow()
             verified_files = {}
         
-        session.commit()
+        await asyncio.to_thread(self._save, execution)
         return verified_files
     
+    def _start_execution(self, plugin_name: str, input_files: Dict[str, str]) -> Tuple[PluginManifest, PluginExecution]:
+        """Look up the plugin and create its execution record"""
+        with Session(self.engine, expire_on_commit=False) as session:
+            plugin = session.exec(
+                select(PluginManifest).where(PluginManifest.name == plugin_name)
+            ).first()
+            if not plugin:
+                raise ValueError(f"Plugin not found: {plugin_name}")
+            
+            execution = PluginExecution(
+                plugin_id=plugin.id,
+                input_files=input_files
+            )
+            session.add(execution)
+            session.commit()
+            return plugin, execution
+    
+    def _save(self, record: Any) -> None:
+        """Write a record loaded or created in another, closed session"""
+        with Session(self.engine) as session:
+            session.add(record)
+            session.commit()
+    
     async def _execute_in_container(self, plugin: PluginManifest, input_files: Dict[str, str]) -> Dict[str, str]:
         """Execute plugin in isolated micro-container"""
         
@@ -271,8 +396,11 @@ class PluginSystem:
         
         return verified_files
     
-    async def install_plugin_from_url(self, git_url: str, session: Session) -> PluginManifest:
-        """Install plugin from Git URL"""
+    async def install_plugin_from_url(self, git_url: str) -> PluginManifest:
+        """Install plugin from Git URL
+        
+        Database work runs in a thread, in short sessions of its own.
+        """
         
         # Extract plugin name from URL
         plugin_name = git_url.split('/')[-1].replace('.git', '')
@@ -280,27 +408,36 @@ class PluginSystem:
         
         try:
             # Clone repository
-            subprocess.run(
-                ["git", "clone", git_url, str(plugin_dir)],
-                check=True,
-                capture_output=True
+            result = await run_process(
+                ["git", "clone", "--depth", "1", git_url, str(plugin_dir)],
+                timeout=settings.PLUGIN_INSTALL_TIMEOUT_SECONDS,
+                # Fail instead of waiting on a credential prompt nobody can answer
+                env={"GIT_TERMINAL_PROMPT": "0"}
             )
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip() or f"git clone exited with {result.returncode}")
             
             # Register plugin
-            plugin = await self.register_plugin(plugin_dir, session)
+            plugin = await asyncio.to_thread(self._register_installed, plugin_dir)
             
             # Run compatibility test
-            await self._test_plugin_compatibility(plugin, session)
+            await self._test_plugin_compatibility(plugin)
             
+            await self.refresh(force=True)
             return plugin
             
         except Exception as e:
             # Clean up on failure
             if plugin_dir.exists():
-                shutil.rmtree(plugin_dir)
+                await asyncio.to_thread(shutil.rmtree, plugin_dir)
+            self.invalidate()
             raise RuntimeError(f"Failed to install plugin: {e}")
     
-    async def _test_plugin_compatibility(self, plugin: PluginManifest, session: Session):
+    def _register_installed(self, plugin_dir: Path) -> PluginManifest:
+        with Session(self.engine, expire_on_commit=False) as session:
+            return self._register(plugin_dir, session)
+    
+    async def _test_plugin_compatibility(self, plugin: PluginManifest):
         """Test plugin compatibility"""
         
         # Create test input based on plugin inputs
@@ -318,27 +455,40 @@ class PluginSystem:
         
         # Try to execute plugin
         try:
-            result = await self.execute_plugin(plugin.name, test_files, session)
+            result = await self.execute_plugin(plugin.name, test_files)
             plugin.verified = True
         except Exception as e:
             plugin.verified = False
             plugin.enabled = False
+            await asyncio.to_thread(self._save, plugin)
             raise RuntimeError(f"Plugin compatibility test failed: {e}")
         
-        session.commit()
+        await asyncio.to_thread(self._save, plugin)
     
     def get_available_tools(self) -> List[PluginTool]:
         """Get list of all available tools"""
         return self.tool_catalog.copy()
     
-    async def remove_plugin(self, plugin_name: str, session: Session):
+    async def remove_plugin(self, plugin_name: str):
         """Remove a plugin"""
         
-        plugin = session.exec(
-            select(PluginManifest).where(PluginManifest.name == plugin_name)
-        ).first()
-        
-        if plugin:
+        if await asyncio.to_thread(self._delete_plugin, plugin_name):
+            # Remove from registry
+            if plugin_name in self.plugin_registry:
+                del self.plugin_registry[plugin_name]
+            
+            # Rebuild catalog
+            await self.refresh(force=True)
+    
+    def _delete_plugin(self, plugin_name: str) -> bool:
+        """Delete the plugin's directory and row; False if it is not installed"""
+        with Session(self.engine) as session:
+            plugin = session.exec(
+                select(PluginManifest).where(PluginManifest.name == plugin_name)
+            ).first()
+            if not plugin:
+                return False
+            
             # Remove from filesystem
             plugin_dir = self.plugins_dir / plugin_name
             if plugin_dir.exists():
@@ -347,13 +497,7 @@ class PluginSystem:
             # Remove from database
             session.delete(plugin)
             session.commit()
-            
-            # Remove from registry
-            if plugin_name in self.plugin_registry:
-                del self.plugin_registry[plugin_name]
-            
-            # Rebuild catalog
-            await self.build_tool_catalog(session)
+            return True
 
 
 # Default plugins to install
@@ -0,0 +1,131 @@
+"""
+Non-blocking Process Runner for AI Studio
+
+Runs external commands (npm, vitest, git) as asyncio subprocesses so they
+never block the event loop. Output is read line by line as it is produced and
+can be forwarded live; on timeout or cancellation the whole process group is
+terminated, including grandchildren such as the workers vitest spawns.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+# Called with ("stdout" | "stderr", line) for every line of output
+LineCallback = Callable[[str, str], None]
+
+# Seconds between SIGTERM and SIGKILL
+KILL_GRACE_SECONDS = 2.0
+
+# Longest line read in one piece; longer lines are split
+STREAM_LIMIT = 1024 * 1024
+
+
+@dataclass
+class ProcessResult:
+    args: List[str]
+    returncode: int
+    stdout: str
+    stderr: str
+    duration: float
+
+
+async def run_process(
+    args: Sequence[str],
+    cwd: Optional[Union[str, Path]] = None,
+    timeout: Optional[float] = None,
+    env: Optional[Dict[str, str]] = None,
+    on_line: Optional[LineCallback] = None
+) -> ProcessResult:
+    """Run a command to completion without blocking the event loop
+
+    Like subprocess.run, raises subprocess.TimeoutExpired when timeout
+    elapses. Cancelling the caller kills the process group.
+    """
+
+    args = [str(arg) for arg in args]
+    started = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        cwd=str(cwd) if cwd else None,
+        env={**os.environ, **env} if env else None,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        # Own process group, so the whole tree can be signalled at once
+        start_new_session=True,
+        limit=STREAM_LIMIT
+    )
+
+    stdout: List[str] = []
+    stderr: List[str] = []
+
+    async def pump(stream: asyncio.StreamReader, name: str, lines: List[str]) -> None:
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # Line longer than the limit: take what is buffered
+                line = await stream.read(STREAM_LIMIT)
+            if not line:
+                return
+            text = line.decode("utf-8", errors="replace")
+            lines.append(text)
+            if on_line is not None:
+                on_line(name, text.rstrip("\r\n"))
+
+    async def communicate() -> int:
+        assert process.stdout is not None and process.stderr is not None
+        await asyncio.gather(
+            pump(process.stdout, "stdout", stdout),
+            pump(process.stderr, "stderr", stderr)
+        )
+        return await process.wait()
+
+    try:
+        returncode = await asyncio.wait_for(communicate(), timeout)
+    except asyncio.TimeoutError:
+        await terminate_process_group(process)
+        raise subprocess.TimeoutExpired(args, timeout, "".join(stdout), "".join(stderr))
+    except asyncio.CancelledError:
+        await asyncio.shield(terminate_process_group(process))
+        raise
+
+    return ProcessResult(
+        args=args,
+        returncode=returncode,
+        stdout="".join(stdout),
+        stderr="".join(stderr),
+        duration=time.monotonic() - started
+    )
+
+
+async def terminate_process_group(process: asyncio.subprocess.Process) -> None:
+    """SIGTERM the process group, then SIGKILL whatever is left after a grace period"""
+
+    if process.returncode is not None:
+        _kill_group(process.pid, signal.SIGKILL)  # Reap stragglers the leader left behind
+        return
+
+    _kill_group(process.pid, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), KILL_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"Process group {process.pid} ignored SIGTERM; killing")
+    _kill_group(process.pid, signal.SIGKILL)
+    await process.wait()
+
+
+def _kill_group(pgid: int, sig: int) -> None:
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
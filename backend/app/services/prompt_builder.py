@@ -0,0 +1,163 @@
+"""
+Token-Budgeted Prompt Builder for AI Studio
+
+Counts tokens locally and fills a per-stage token budget by priority, so the
+most useful context (failing tests, the files they reference) always makes it
+into the prompt and the rest is trimmed at line boundaries, never mid-line.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.services.llm_governor import estimate_tokens
+
+# tiktoken for exact token counts (optional)
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+TRUNCATION_MARKER = "... ({count} more lines)"
+
+FAILURE_MARKERS = re.compile(r"(FAIL|✗|×|AssertionError|Error:|Expected|Received|expected)")
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Optional[Any]:
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Encoding files could not be loaded (e.g. no network on first use)
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Count tokens with tiktoken when available, otherwise estimate"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def compact_json(data: Any) -> str:
+    """Serialize without indentation or padding, which only costs tokens"""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def truncate_lines(text: str, budget: int, model: str = "gpt-3.5-turbo") -> str:
+    """Keep whole lines from the start of text while they fit in budget tokens"""
+    if count_tokens(text, model) <= budget:
+        return text
+
+    lines = text.split("\n")
+    kept: List[str] = []
+    used = 0
+    for index, line in enumerate(lines):
+        marker = TRUNCATION_MARKER.format(count=len(lines) - index)
+        line_tokens = count_tokens(line + "\n", model)
+        if used + line_tokens + count_tokens(marker, model) > budget:
+            if kept:
+                kept.append(marker)
+            break
+        kept.append(line)
+        used += line_tokens
+    return "\n".join(kept)
+
+
+def extract_failure_excerpts(output: str, context_lines: int = 3) -> str:
+    """Pull the lines around failure markers out of raw test runner output"""
+    lines = output.split("\n")
+    keep = set()
+    for index, line in enumerate(lines):
+        if FAILURE_MARKERS.search(line):
+            keep.update(range(max(0, index - context_lines), min(len(lines), index + context_lines + 1)))
+
+    excerpt: List[str] = []
+    previous = -1
+    for index in sorted(keep):
+        if previous >= 0 and index != previous + 1:
+            excerpt.append("...")
+        excerpt.append(lines[index])
+        previous = index
+    return "\n".join(excerpt)
+
+
+def files_referenced_by(text: str, filenames: List[str]) -> List[str]:
+    """Files whose path or basename appears in text, in the given order"""
+    referenced = []
+    for filename in filenames:
+        basename = filename.rsplit("/", 1)[-1]
+        stem = basename.split(".", 1)[0]
+        if filename in text or basename in text or (stem and re.search(rf"\b{re.escape(stem)}\b", text)):
+            referenced.append(filename)
+    return referenced
+
+
+@dataclass
+class PromptSection:
+    text: str
+    priority: int
+    # Sections that cannot be trimmed are included whole or not at all
+    truncatable: bool = True
+
+
+class PromptBuilder:
+    """Assembles a prompt from prioritized sections within a token budget"""
+
+    def __init__(self, budget: int, model: str = "gpt-3.5-turbo"):
+        self.budget = budget
+        self.model = model
+        self.sections: List[PromptSection] = []
+        self.tokens_used = 0
+        self.sections_dropped = 0
+
+    def add(self, text: str, priority: int, truncatable: bool = True) -> "PromptBuilder":
+        """Add a section; lower priority values are filled first"""
+        if text:
+            self.sections.append(PromptSection(text=text, priority=priority, truncatable=truncatable))
+        return self
+
+    def add_file(self, filename: str, content: str, priority: int) -> "PromptBuilder":
+        return self.add(f"// {filename}\n{content}", priority)
+
+    def build(self, separator: str = "\n\n") -> str:
+        """Fill the budget in priority order, emitting sections in insertion order"""
+        remaining = self.budget
+        separator_tokens = count_tokens(separator, self.model)
+        chosen: Dict[int, str] = {}
+
+        order = sorted(range(len(self.sections)), key=lambda i: self.sections[i].priority)
+        for index in order:
+            section = self.sections[index]
+            available = remaining - (separator_tokens if chosen else 0)
+            tokens = count_tokens(section.text, self.model)
+
+            if tokens <= available:
+                text = section.text
+            elif section.truncatable and available > 0:
+                text = truncate_lines(section.text, available, self.model)
+                tokens = count_tokens(text, self.model)
+            else:
+                text = ""
+
+            if not text:
+                self.sections_dropped += 1
+                continue
+
+            chosen[index] = text
+            remaining = available - tokens
+
+        self.tokens_used = self.budget - remaining
+        return separator.join(chosen[i] for i in sorted(chosen))
+
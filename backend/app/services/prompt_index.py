@@ -0,0 +1,199 @@
+"""
+Prompt Similarity Index for AI Studio
+
+In-process MinHash/LSH index over normalized prompts. Lets the agent find a
+previously interpreted prompt that is a near-duplicate of a new one ("todo app
+with dark mode" versus "dark mode todo app") and reuse its contract.
+
+Entries are scoped, by owner where known and otherwise by project, so one
+user's contract is never served for another user's prompt. Prompts with
+nothing left after normalization have no shingles and are never indexed:
+their signatures would all be identical.
+"""
+
+import hashlib
+import logging
+import random
+import re
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import async_crud
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime used for the universal hash family
+_PRIME = (1 << 61) - 1
+# Fixed seed so signatures stay comparable across processes and restarts
+_SEED = 1_000_003
+
+STOPWORDS = {
+    "a", "an", "and", "app", "application", "build", "create", "for", "i",
+    "in", "is", "it", "make", "me", "of", "on", "please", "that", "the",
+    "to", "want", "with", "write",
+}
+
+
+def normalize_prompt(prompt: str) -> List[str]:
+    """Lowercase, strip punctuation and stopwords, and lightly stem a prompt"""
+    tokens = re.sub(r"[^a-z0-9]+", " ", prompt.lower()).split()
+    normalized = []
+    for token in tokens:
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        normalized.append(token)
+    return normalized
+
+
+def prompt_shingles(prompt: str) -> Set[str]:
+    """Order-independent shingles: whole words plus character trigrams"""
+    shingles: Set[str] = set()
+    for token in normalize_prompt(prompt):
+        shingles.add(token)
+        padded = f"^{token}$"
+        for i in range(len(padded) - 2):
+            shingles.add(padded[i:i + 3])
+    return shingles
+
+
+def prompt_key(prompt: str) -> str:
+    """Exact-match key, matching StudioObservation.prompt_hash"""
+    return hashlib.sha256(prompt.encode()).hexdigest()[:16]
+
+
+def index_scope(owner_id: Optional[uuid.UUID], project_id: Optional[uuid.UUID]) -> Optional[str]:
+    """Scope a prompt's contract may be reused within; None if unscoped"""
+    scope = owner_id or project_id
+    return str(scope) if scope else None
+
+
+class MinHasher:
+    """MinHash signatures using a seeded universal hash family"""
+
+    def __init__(self, num_perm: int = 64):
+        self.num_perm = num_perm
+        rng = random.Random(_SEED)
+        self._params = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingles: Set[str]) -> List[int]:
+        if not shingles:
+            return [_PRIME] * self.num_perm
+
+        hashed = [
+            int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big")
+            for s in shingles
+        ]
+        return [
+            min((a * h + b) % _PRIME for h in hashed)
+            for a, b in self._params
+        ]
+
+
+def estimate_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Estimate Jaccard similarity from two MinHash signatures"""
+    if not sig_a or len(sig_a) != len(sig_b):
+        return 0.0
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class PromptIndex:
+    """LSH index mapping prompt signatures to interpreted contracts"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, max_entries: int = 10000):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.loaded = False
+
+        # (scope, prompt key) -> (signature, contract)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[List[int], Dict[str, Any]]]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[Tuple[str, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def contains(self, prompt: str, scope: str) -> bool:
+        return (scope, prompt_key(prompt)) in self._entries
+
+    def signature(self, prompt: str) -> List[int]:
+        """MinHash signature of the prompt; empty if it has no shingles"""
+        shingles = prompt_shingles(prompt)
+        return self.hasher.signature(shingles) if shingles else []
+
+    def add(self, prompt: str, contract: Dict[str, Any], scope: str, signature: Optional[List[int]] = None) -> None:
+        signature = signature or self.signature(prompt)
+        if signature:
+            self._insert((scope, prompt_key(prompt)), signature, contract)
+
+    def query(self, prompt: str, threshold: float, scope: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return the most similar contract in scope at or above threshold"""
+        signature = self.signature(prompt)
+        if not signature:
+            return None
+
+        candidates: Set[Tuple[str, str]] = set()
+        for band in self._bands(scope, signature):
+            candidates |= self._buckets.get(band, set())
+
+        best: Optional[Tuple[Dict[str, Any], float]] = None
+        for key in candidates:
+            candidate_sig, contract = self._entries[key]
+            similarity = estimate_similarity(signature, candidate_sig)
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (contract, similarity)
+        return best
+
+    async def load(self, session: AsyncSession) -> None:
+        """Warm the index from persisted observations, newest first"""
+        observations = await async_crud.get_recent_studio_observations(session=session, limit=self.max_entries)
+
+        for observation in reversed(observations):
+            scope = index_scope(observation.user_id, observation.project_id)
+            if scope and observation.prompt_signature and observation.contract:
+                self._insert((scope, observation.prompt_hash), observation.prompt_signature, observation.contract)
+
+        self.loaded = True
+        logger.info(f"Prompt index loaded with {len(self._entries)} entries")
+
+    def _bands(self, scope: str, signature: List[int]) -> List[Tuple[str, int, Tuple[int, ...]]]:
+        return [
+            (scope, band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def _insert(self, key: Tuple[str, str], signature: List[int], contract: Dict[str, Any]) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (signature, contract)
+        for band in self._bands(key[0], signature):
+            self._buckets.setdefault(band, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        signature, _ = self._entries.pop(key)
+        for band in self._bands(key[0], signature):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+
+# Global index instance
+prompt_index = PromptIndex(max_entries=settings.PROMPT_INDEX_MAX_ENTRIES)
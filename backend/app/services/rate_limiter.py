@@ -0,0 +1,178 @@
+"""
+Token-Weighted Rate Limiter for AI Studio
+
+Limits how many LLM tokens each user can spend per period, charging every
+request its estimated token cost. Uses the generic cell rate algorithm
+(GCRA): each key stores one number, the theoretical arrival time (TAT) at
+which its allowance is fully used up, and a request is allowed if charging
+it keeps the TAT within the burst allowance of now.
+
+With Redis, the check-and-charge is a single Lua script, so it is atomic
+across workers and concurrent requests. When Redis is not configured or is
+unreachable, the same algorithm runs in process; limits then apply per
+worker until Redis is back.
+"""
+
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+# Redis for limits shared by all workers (optional)
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] = limit key
+# ARGV = emission interval (seconds per token), burst offset (seconds), cost (tokens)
+# Returns {allowed, retry_after, remaining} (numbers as strings, Lua would truncate them)
+GCRA_SCRIPT = """
+local emission = tonumber(ARGV[1])
+local burst_offset = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+local new_tat = tat + emission * cost
+local retry_after = new_tat - burst_offset - now
+if retry_after > 0.001 then
+    return {0, tostring(retry_after), tostring((burst_offset - (tat - now)) / emission)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0', tostring((burst_offset - (new_tat - now)) / emission)}
+"""
+
+# Rounding slack on clock arithmetic (seconds), also in GCRA_SCRIPT
+CLOCK_TOLERANCE = 0.001
+
+# After a Redis error, the in-process limiter is used for this long
+REDIS_RETRY_SECONDS = 30.0
+# The in-process limiter drops expired keys once it tracks this many
+LOCAL_MAX_KEYS = 10000
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    # Seconds until the request would be allowed (0 when allowed)
+    retry_after: float
+    # Tokens still available right now
+    remaining: float
+
+
+def gcra(tat: float, now: float, emission: float, burst_offset: float, cost: float) -> Tuple[RateLimitResult, float]:
+    """Result and the key's new TAT (unchanged when denied); mirrors GCRA_SCRIPT"""
+    tat = max(tat, now)
+    new_tat = tat + emission * cost
+    retry_after = new_tat - burst_offset - now
+    if retry_after > CLOCK_TOLERANCE:
+        return RateLimitResult(False, retry_after, (burst_offset - (tat - now)) / emission), tat
+    return RateLimitResult(True, 0.0, (burst_offset - (new_tat - now)) / emission), new_tat
+
+
+class RateLimiter:
+    """Allows `limit` tokens per `period` seconds per key, in bursts of up to `burst`"""
+
+    def __init__(
+        self,
+        limit: int,
+        period: float,
+        burst: int,
+        redis_url: Optional[str] = None,
+        prefix: str = "rate_limit",
+        client: Any = None
+    ):
+        self.emission = period / limit
+        self.burst = burst
+        self.burst_offset = self.emission * burst
+        self.prefix = prefix
+
+        self.redis = client
+        if self.redis is None and redis_url and REDIS_AVAILABLE:
+            self.redis = aioredis.Redis.from_url(redis_url)
+        self._script = self.redis.register_script(GCRA_SCRIPT) if self.redis is not None else None
+        self._redis_down_until = 0.0
+
+        # In-process fallback: key -> TAT on the monotonic clock
+        self._local: Dict[str, float] = {}
+
+        self.allowed = 0
+        self.denied = 0
+        self.fallbacks = 0
+
+    async def acquire(self, key: str, cost: int = 1) -> RateLimitResult:
+        """Charge cost tokens to key if its allowance has room"""
+        # A request bigger than the burst could never pass; charge a full burst instead
+        cost = max(1, min(cost, self.burst))
+
+        result = None
+        if self._script is not None and time.monotonic() >= self._redis_down_until:
+            result = await self._acquire_redis(key, cost)
+        if result is None:
+            result = self._acquire_local(key, cost)
+
+        if result.allowed:
+            self.allowed += 1
+        else:
+            self.denied += 1
+        return result
+
+    async def _acquire_redis(self, key: str, cost: int) -> Optional[RateLimitResult]:
+        try:
+            allowed, retry_after, remaining = await self._script(
+                keys=[f"{self.prefix}:{key}"],
+                args=[repr(self.emission), repr(self.burst_offset), cost]
+            )
+        except Exception as e:
+            logger.warning(f"Rate limiter falling back to in-process limits: {e}")
+            self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+            self.fallbacks += 1
+            return None
+        return RateLimitResult(bool(int(allowed)), float(retry_after), max(float(remaining), 0.0))
+
+    def _acquire_local(self, key: str, cost: int) -> RateLimitResult:
+        now = time.monotonic()
+        if len(self._local) >= LOCAL_MAX_KEYS:
+            # Keys whose TAT has passed hold no state
+            self._local = {k: tat for k, tat in self._local.items() if tat > now}
+        result, tat = gcra(self._local.get(key, now), now, self.emission, self.burst_offset, cost)
+        if tat > now:
+            self._local[key] = tat
+        else:
+            self._local.pop(key, None)
+        result.remaining = max(result.remaining, 0.0)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis" if self._script is not None and time.monotonic() >= self._redis_down_until else "local",
+            "allowed": self.allowed,
+            "denied": self.denied,
+            "fallbacks": self.fallbacks,
+            "local_keys": len(self._local),
+        }
+
+
+def format_retry_after(seconds: float) -> str:
+    minutes = math.ceil(seconds / 60)
+    return f"{minutes} minute{'s' if minutes != 1 else ''}"
+
+
+# Global limiter for LLM work, per user
+rate_limiter = RateLimiter(
+    limit=settings.RATE_LIMIT_TOKENS_PER_HOUR,
+    period=3600.0,
+    burst=settings.RATE_LIMIT_BURST_TOKENS,
+    redis_url=settings.REDIS_URL
+)
@@ -0,0 +1,153 @@
+"""
+Retry and Hedging Policies for AI Studio
+
+Retries transient OpenAI failures (timeouts, 429 and 5xx) with exponential
+backoff and full jitter, honoring Retry-After. Optionally hedges slow calls by
+sending a duplicate request once the stage's p95 latency has elapsed and
+taking whichever response arrives first.
+"""
+
+import asyncio
+import logging
+import random
+from collections import deque
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    # Upper bound on how long a server-provided Retry-After may stall a call
+    max_retry_after: float = 30.0
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        if isinstance(exc, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError)):
+            return True
+        if isinstance(exc, openai.APIStatusError):
+            return exc.status_code in RETRYABLE_STATUS_CODES or exc.status_code >= 500
+        return False
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number attempt (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def delay_for(self, exc: BaseException, attempt: int) -> float:
+        retry_after = parse_retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return self.backoff(attempt)
+
+
+def parse_retry_after(exc: BaseException) -> Optional[float]:
+    """Read Retry-After (seconds or HTTP date) or retry-after-ms from an API error"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+async def call_with_retries(policy: RetryPolicy, call: Callable[[], Awaitable[T]]) -> T:
+    """Run call, retrying retryable failures according to policy"""
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            attempt += 1
+            if attempt >= policy.max_attempts or not policy.is_retryable(e):
+                raise
+
+            delay = policy.delay_for(e, attempt)
+            logger.warning(f"OpenAI request failed ({type(e).__name__}: {e}); retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+class LatencyTracker:
+    """Rolling latency window per key, used to pick hedging delays"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key: str, pct: float) -> Optional[float]:
+        """Latency at pct (0-1), or None until enough samples exist"""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            key: {"samples": len(samples), "p95_ms": (self.percentile(key, 0.95) or 0.0) * 1000}
+            for key, samples in self._samples.items()
+        }
+
+
+async def hedged(call: Callable[[], Awaitable[T]], hedge_after: Optional[float]) -> T:
+    """Run call; if it has not finished after hedge_after seconds, race a duplicate"""
+    primary = asyncio.ensure_future(call())
+    if hedge_after is None:
+        return await primary
+
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+    except asyncio.CancelledError:
+        primary.cancel()
+        raise
+    if done:
+        return primary.result()
+
+    logger.info(f"Hedging OpenAI request after {hedge_after * 1000:.0f}ms")
+    pending = {primary, asyncio.ensure_future(call())}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        assert error is not None
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,232 @@
+"""
+Run Event Log for AI Studio
+
+Every message a generation job sends is appended to a per-run log with a
+sequence number, so a client that reconnects (or reloads the page) can be
+replayed what it missed instead of starting a new generation. Appends are
+buffered and written in batches; reads include this process's unwritten
+events, and a reader that finds a gap waits briefly for another process's
+batch to land.
+
+Replay joins the log to live progress: subscribe first, replay the log past
+the client's last sequence number, then forward live messages not already
+sent.
+"""
+
+import asyncio
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import RunEvent
+from app.services.job_queue import is_final
+
+logger = logging.getLogger(__name__)
+
+# Pending event: (job_id, seq, message)
+Event = Tuple[uuid.UUID, int, Dict[str, Any]]
+
+
+class RunEventLog(ABC):
+    """Batched append-only event log; subclasses store the batches"""
+
+    def __init__(self, batch_size: int = 50, flush_interval: float = 0.25):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[Event] = []
+        self._writing: List[Event] = []  # Batch being written, still readable
+        self._flusher: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+        self.appended = 0
+        self.batches = 0
+        self.dropped = 0
+
+    async def append(self, job_id: uuid.UUID, seq: int, message: Dict[str, Any]) -> None:
+        self._pending.append((job_id, seq, message))
+        self.appended += 1
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write everything buffered so far"""
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            self._writing = batch
+            try:
+                await self._write(batch)
+                self.batches += 1
+            except Exception as e:
+                # Live delivery is unaffected; only replay loses these events
+                self.dropped += len(batch)
+                logger.warning(f"Run event batch of {len(batch)} not written: {e}")
+            finally:
+                self._writing = []
+
+    def discard(self, job_id: uuid.UUID) -> None:
+        """Drop the job's unwritten events, e.g. once another worker owns it"""
+        kept = [event for event in self._pending if event[0] != job_id]
+        self.dropped += len(self._pending) - len(kept)
+        self._pending = kept
+
+    async def read(self, job_id: uuid.UUID, after: int = 0, before: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Messages with after < seq < before, in order, each carrying its seq"""
+        # Taken before reading the store, so an event written meanwhile is in one of them
+        unwritten = self._unwritten(job_id)
+        events = {seq: message for seq, message in await self._read(job_id, after, before)}
+        for seq, message in unwritten:
+            if seq > after and (before is None or seq < before):
+                events[seq] = message
+        return [{**events[seq], "seq": seq} for seq in sorted(events)]
+
+    async def last_seq(self, job_id: uuid.UUID) -> int:
+        unwritten = [seq for seq, _ in self._unwritten(job_id)]
+        return max([await self._last_seq(job_id), *unwritten])
+
+    def _unwritten(self, job_id: uuid.UUID) -> List[Tuple[int, Dict[str, Any]]]:
+        return [(seq, message) for event_job, seq, message in self._writing + self._pending if event_job == job_id]
+
+    async def replay(
+        self,
+        job_id: uuid.UUID,
+        after: int,
+        live: Optional[AsyncIterator[Dict[str, Any]]],
+        gap_timeout: float = 2.0
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Logged messages past `after`, then live ones, each exactly once
+
+        `live` must have been subscribed before calling, so nothing falls
+        between the two; None replays the log only. Ends at the job's final
+        status.
+        """
+        seq = after
+        for message in await self.read(job_id, after=seq):
+            yield message
+            seq = message["seq"]
+            if is_final(message):
+                return
+        if live is None:
+            return
+
+        async for message in live:
+            if "seq" in message:
+                if message["seq"] <= seq:
+                    continue  # Already replayed from the log
+                if message["seq"] > seq + 1:
+                    for missed in await self._wait_for(job_id, seq, message["seq"], gap_timeout):
+                        yield missed
+                seq = message["seq"]
+            yield message
+            if is_final(message):
+                return
+
+    async def _wait_for(self, job_id: uuid.UUID, after: int, before: int, timeout: float) -> List[Dict[str, Any]]:
+        """Events published before we subscribed, once their batch is written"""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            events = await self.read(job_id, after=after, before=before)
+            if len(events) >= before - after - 1 or asyncio.get_running_loop().time() >= deadline:
+                return events
+            await asyncio.sleep(self.flush_interval / 2)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "appended": self.appended,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "pending": len(self._pending),
+        }
+
+    @abstractmethod
+    async def _write(self, batch: List[Event]) -> None:
+        """Store a batch of events"""
+
+    @abstractmethod
+    async def _read(self, job_id: uuid.UUID, after: int, before: Optional[int]) -> List[Tuple[int, Dict[str, Any]]]:
+        """Stored (seq, message) pairs for job_id with after < seq < before, in order"""
+
+    @abstractmethod
+    async def _last_seq(self, job_id: uuid.UUID) -> int:
+        """Highest stored seq for job_id, 0 if none"""
+
+
+class InMemoryRunEventLog(RunEventLog):
+    """Event log held in this process"""
+
+    def __init__(self, batch_size: int = 50, flush_interval: float = 0.25):
+        super().__init__(batch_size, flush_interval)
+        self._events: Dict[uuid.UUID, Dict[int, Dict[str, Any]]] = {}
+
+    async def _write(self, batch: List[Event]) -> None:
+        for job_id, seq, message in batch:
+            self._events.setdefault(job_id, {})[seq] = message
+
+    async def _read(self, job_id: uuid.UUID, after: int, before: Optional[int]) -> List[Tuple[int, Dict[str, Any]]]:
+        return [
+            (seq, message) for seq, message in self._events.get(job_id, {}).items()
+            if seq > after and (before is None or seq < before)
+        ]
+
+    async def _last_seq(self, job_id: uuid.UUID) -> int:
+        return max(self._events.get(job_id, {}), default=0)
+
+
+class PostgresRunEventLog(RunEventLog):
+    """Event log stored in the runevent table, one INSERT per batch"""
+
+    def __init__(self, engine: Any, batch_size: int = 50, flush_interval: float = 0.25):
+        super().__init__(batch_size, flush_interval)
+        self.engine = engine
+
+    async def _write(self, batch: List[Event]) -> None:
+        await asyncio.to_thread(self._write_sync, batch)
+
+    def _write_sync(self, batch: List[Event]) -> None:
+        rows = [RunEvent(job_id=job_id, seq=seq, message=message).model_dump() for job_id, seq, message in batch]
+        with Session(self.engine) as session:
+            # A (job_id, seq) already written by a worker that lost the job's
+            # lease must not cost the other events in the batch
+            session.execute(insert(RunEvent).values(rows).on_conflict_do_nothing(index_elements=["job_id", "seq"]))
+            session.commit()
+
+    async def _read(self, job_id: uuid.UUID, after: int, before: Optional[int]) -> List[Tuple[int, Dict[str, Any]]]:
+        return await asyncio.to_thread(self._read_sync, job_id, after, before)
+
+    def _read_sync(self, job_id: uuid.UUID, after: int, before: Optional[int]) -> List[Tuple[int, Dict[str, Any]]]:
+        statement = select(RunEvent.seq, RunEvent.message).where(RunEvent.job_id == job_id, RunEvent.seq > after)
+        if before is not None:
+            statement = statement.where(RunEvent.seq < before)
+        with Session(self.engine) as session:
+            return list(session.exec(statement.order_by(RunEvent.seq)).all())
+
+    async def _last_seq(self, job_id: uuid.UUID) -> int:
+        return await asyncio.to_thread(self._last_seq_sync, job_id)
+
+    def _last_seq_sync(self, job_id: uuid.UUID) -> int:
+        with Session(self.engine) as session:
+            return session.exec(select(func.max(RunEvent.seq)).where(RunEvent.job_id == job_id)).one() or 0
+
+
+def build_run_event_log() -> RunEventLog:
+    if settings.JOB_QUEUE_BACKEND == "memory":
+        return InMemoryRunEventLog(settings.RUN_EVENT_BATCH_SIZE, settings.RUN_EVENT_FLUSH_INTERVAL_SECONDS)
+    return PostgresRunEventLog(engine, settings.RUN_EVENT_BATCH_SIZE, settings.RUN_EVENT_FLUSH_INTERVAL_SECONDS)
+
+
+# Global event log instance
+run_event_log = build_run_event_log()
@@ -0,0 +1,100 @@
+"""
+Write-behind Run State for AI Studio
+
+Holds a TestRun in memory while the agent works on it and writes changes
+behind it. Setting a field only marks it dirty; dirty fields are coalesced
+and written as one UPDATE of just those columns, either at a stage boundary
+(a change of current_stage) or at most flush_interval seconds after the
+first unwritten change. Writes run in a worker thread on their own session,
+so the generation never waits on a commit to report progress, and large
+JSON columns are only rewritten when they actually changed.
+"""
+
+import asyncio
+import copy
+import logging
+import uuid
+from typing import Any, Dict, Optional
+
+from sqlalchemy import update
+from sqlmodel import Session
+
+from app.models import TestRun
+
+logger = logging.getLogger(__name__)
+
+
+class RunState:
+    """In-memory TestRun whose changes are flushed in the background"""
+
+    def __init__(self, record: TestRun, engine: Any, flush_interval: float = 0.5):
+        # The record must be detached, so nothing reloads it from the database
+        object.__setattr__(self, "_record", record)
+        object.__setattr__(self, "_engine", engine)
+        object.__setattr__(self, "_flush_interval", flush_interval)
+        object.__setattr__(self, "_dirty", {})
+        object.__setattr__(self, "_timer", None)
+        object.__setattr__(self, "_flushing", None)
+        object.__setattr__(self, "_lock", asyncio.Lock())
+        object.__setattr__(self, "flushes", 0)
+
+    @property
+    def id(self) -> uuid.UUID:
+        return self._record.id
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._record, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name not in TestRun.model_fields or name == "id":
+            raise AttributeError(f"TestRun has no writable field {name!r}")
+        setattr(self._record, name, value)
+        self._dirty[name] = value
+        if name == "current_stage":
+            self.checkpoint()
+        elif self._timer is None:
+            timer = asyncio.get_running_loop().call_later(self._flush_interval, self.checkpoint)
+            object.__setattr__(self, "_timer", timer)
+
+    @property
+    def dirty(self) -> Dict[str, Any]:
+        return dict(self._dirty)
+
+    def checkpoint(self) -> None:
+        """Start writing the dirty fields now, without waiting for it"""
+        if self._timer is not None:
+            self._timer.cancel()
+            object.__setattr__(self, "_timer", None)
+        if self._dirty:
+            object.__setattr__(self, "_flushing", asyncio.ensure_future(self.flush()))
+
+    async def flush(self) -> None:
+        """Write the dirty fields (one UPDATE); failed writes are retried with the next flush"""
+        async with self._lock:
+            if not self._dirty:
+                return
+            # Copied on the event loop, so the agent can keep mutating its dicts
+            changes = {name: copy.copy(value) for name, value in self._dirty.items()}
+            self._dirty.clear()
+            try:
+                await asyncio.to_thread(self._write, changes)
+                object.__setattr__(self, "flushes", self.flushes + 1)
+            except Exception as e:
+                logger.warning(f"Test run {self.id} state not written: {e}")
+                for name, value in changes.items():
+                    self._dirty.setdefault(name, value)
+
+    def _write(self, changes: Dict[str, Any]) -> None:
+        with Session(self._engine) as session:
+            session.execute(update(TestRun).where(TestRun.id == self.id).values(**changes))
+            session.commit()
+
+    async def close(self) -> None:
+        """Write everything outstanding; call when the run ends"""
+        if self._timer is not None:
+            self._timer.cancel()
+            object.__setattr__(self, "_timer", None)
+        flushing: Optional[asyncio.Future] = self._flushing
+        if flushing is not None:
+            await asyncio.gather(flushing, return_exceptions=True)
+        await self.flush()
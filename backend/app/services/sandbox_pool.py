@@ -0,0 +1,299 @@
+"""
+Pre-warmed Sandbox Pool for AI Studio
+
+Keeps a pool of sandbox directories that already have the base test
+toolchain (vitest, Testing Library, jsdom) linked in from the node_modules
+cache, so test execution only has to write the generated files and run vitest. Leased
+sandboxes are reset and returned to the pool; a background task keeps the
+pool topped up.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.services.node_modules_cache import ModulesLease, node_modules_cache, normalize_dependencies
+
+logger = logging.getLogger(__name__)
+
+BASE_PACKAGE_JSON: Dict[str, Any] = {
+    "name": "test-project",
+    "version": "1.0.0",
+    "type": "module",
+    "scripts": {
+        "test": "vitest run"
+    },
+    "dependencies": {
+        "react": "^18.0.0",
+        "react-dom": "^18.0.0"
+    },
+    "devDependencies": {
+        "vitest": "^1.0.0",
+        "@testing-library/react": "^14.0.0",
+        "@testing-library/jest-dom": "^6.0.0",
+        "@types/react": "^18.0.0",
+        "jsdom": "^23.0.0"
+    }
+}
+
+VITEST_CONFIG = """
+import { defineConfig } from 'vitest/config'
+
+export default defineConfig({
+  // node_modules may be shared with other sandboxes, so keep caches local
+  cacheDir: '.vite-cache',
+  test: {
+    environment: 'jsdom',
+    setupFiles: ['./test-setup.ts'],
+  },
+})
+"""
+
+TEST_SETUP = "import '@testing-library/jest-dom'"
+
+# Entries that survive a reset; everything else is generated per run
+PRESERVED = {"node_modules", "package.json", "package-lock.json", "vitest.config.ts", "test-setup.ts"}
+
+
+def write_base_files(path: Path) -> None:
+    (path / "package.json").write_text(json.dumps(BASE_PACKAGE_JSON, indent=2))
+    (path / "vitest.config.ts").write_text(VITEST_CONFIG)
+    (path / "test-setup.ts").write_text(TEST_SETUP)
+
+
+BASE_DEPENDENCIES = normalize_dependencies(BASE_PACKAGE_JSON)
+
+
+def sandbox_dependencies(package_json: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Base toolchain plus whatever else a generated package.json needs
+
+    Base versions win, so generated files that only restate the toolchain
+    share the pool's node_modules.
+    """
+    if not package_json:
+        return BASE_DEPENDENCIES
+    extra = {
+        name: version for name, version in normalize_dependencies(package_json).items()
+        if name not in BASE_DEPENDENCIES
+    }
+    return dict(sorted({**BASE_DEPENDENCIES, **extra}.items()))
+
+
+class Sandbox:
+    """A sandbox directory with a node_modules tree linked from the cache"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.uses = 0
+        self.dependencies: Dict[str, str] = {}
+        self.modules: Optional[ModulesLease] = None
+
+    @property
+    def dirty(self) -> bool:
+        """node_modules is not the base toolchain, so the sandbox is not reused"""
+        return self.dependencies != BASE_DEPENDENCIES
+
+    def write_files(self, files: Dict[str, str]) -> None:
+        for filename, content in files.items():
+            file_path = (self.path / filename).resolve()
+            if not file_path.is_relative_to(self.path.resolve()):
+                raise ValueError(f"File path escapes sandbox: {filename}")
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_text(content)
+
+    def reset(self) -> None:
+        """Remove generated files and restore the base configuration"""
+        for entry in self.path.iterdir():
+            if entry.name in PRESERVED:
+                continue
+            if entry.is_dir() and not entry.is_symlink():
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
+        write_base_files(self.path)
+
+
+class SandboxPool:
+    """Pool of pre-installed sandboxes, refilled and recycled in the background"""
+
+    def __init__(
+        self,
+        size: int,
+        root: Optional[str] = None,
+        max_uses: int = 20
+    ):
+        self.size = size
+        self.root = Path(root) if root else Path(tempfile.gettempdir()) / "ai-studio-sandboxes"
+        self._directory: Optional[Path] = None
+        self.max_uses = max_uses
+
+        self._idle: List[Sandbox] = []
+        self._preparing = 0
+        self._refill_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._recycling: Set[asyncio.Task] = set()
+
+        self.leases = 0
+        self.warm_leases = 0
+        self.recycled = 0
+        self.discarded = 0
+        self.failed_installs = 0
+
+    async def start(self) -> None:
+        """Start the background refill loop (idempotent)"""
+        if self._refill_task is not None and not self._refill_task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._refill_task = asyncio.create_task(self._refill_loop())
+
+    async def close(self) -> None:
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+            self._refill_task = None
+        for sandbox in self._idle:
+            if sandbox.modules is not None:
+                sandbox.modules.release()
+        self._idle = []
+        if self._directory is not None:
+            await asyncio.to_thread(shutil.rmtree, self._directory, True)
+            self._directory = None
+
+    @property
+    def directory(self) -> Path:
+        """This process's own directory under the shared root"""
+        if self._directory is None:
+            self._directory = self.root / f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            self._directory.mkdir(parents=True, exist_ok=True)
+        return self._directory
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[Sandbox]:
+        """Borrow a sandbox for one run; it is reset and returned afterwards"""
+        if self.size > 0:
+            await self.start()
+
+        self.leases += 1
+        if self._idle:
+            sandbox = self._idle.pop()
+            self.warm_leases += 1
+        else:
+            # Pool exhausted (or disabled): build one now, which costs an
+            # install only if the toolchain is not in the node_modules cache
+            sandbox = await self._prepare()
+        self._signal_refill()
+
+        try:
+            yield sandbox
+        finally:
+            sandbox.uses += 1
+            task = asyncio.get_running_loop().create_task(self._recycle(sandbox))
+            self._recycling.add(task)
+            task.add_done_callback(self._recycling.discard)
+
+    async def _prepare(self) -> Sandbox:
+        """Create a sandbox directory with the base toolchain linked in"""
+        path = self.directory / uuid.uuid4().hex
+        await asyncio.to_thread(path.mkdir, parents=True)
+        await asyncio.to_thread(write_base_files, path)
+        sandbox = Sandbox(path)
+        try:
+            await self.use_dependencies(sandbox, BASE_DEPENDENCIES)
+        except Exception:
+            self.failed_installs += 1
+            await self._discard(sandbox)
+            raise
+        return sandbox
+
+    async def use_dependencies(self, sandbox: Sandbox, dependencies: Dict[str, str]) -> None:
+        """Link the node_modules tree for dependencies into the sandbox"""
+        if sandbox.dependencies == dependencies:
+            return
+        lease = await node_modules_cache.link(dependencies, sandbox.path)
+        if sandbox.modules is not None:
+            sandbox.modules.release()
+        sandbox.modules = lease
+        sandbox.dependencies = dependencies
+
+    async def _discard(self, sandbox: Sandbox) -> None:
+        await asyncio.to_thread(shutil.rmtree, sandbox.path, True)
+        if sandbox.modules is not None:
+            sandbox.modules.release()
+            sandbox.modules = None
+
+    async def _recycle(self, sandbox: Sandbox) -> None:
+        keep = (
+            self.size > 0
+            and not sandbox.dirty
+            and sandbox.uses < self.max_uses
+            # A warm sandbox is cheaper than one still being installed, so
+            # in-flight refills are not counted here
+            and len(self._idle) < self.size
+        )
+        if keep:
+            try:
+                await asyncio.to_thread(sandbox.reset)
+                self._idle.append(sandbox)
+                self.recycled += 1
+                return
+            except OSError as e:
+                logger.warning(f"Sandbox reset failed, discarding: {e}")
+
+        self.discarded += 1
+        await self._discard(sandbox)
+        self._signal_refill()
+
+    def _signal_refill(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _refill_loop(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            while len(self._idle) + self._preparing < self.size:
+                self._preparing += 1
+                try:
+                    sandbox = await self._prepare()
+                except Exception as e:
+                    # Toolchain could not be installed (e.g. missing from the offline cache)
+                    logger.warning(f"Sandbox toolchain install failed: {e}")
+                    await asyncio.sleep(30)
+                    continue
+                finally:
+                    self._preparing -= 1
+                self._idle.append(sandbox)
+
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "preparing": self._preparing,
+            "leases": self.leases,
+            "warm_hit_rate": self.warm_leases / self.leases if self.leases else 0.0,
+            "recycled": self.recycled,
+            "discarded": self.discarded,
+            "failed_installs": self.failed_installs,
+            "node_modules_cache": node_modules_cache.get_stats(),
+        }
+
+
+# Global pool instance
+sandbox_pool = SandboxPool(
+    size=settings.SANDBOX_POOL_SIZE,
+    root=settings.SANDBOX_ROOT,
+    max_uses=settings.SANDBOX_MAX_USES
+)
@@ -0,0 +1,100 @@
+"""
+Stage Dependency Graph for AI Studio
+
+Runs pipeline stages as async tasks that start as soon as the stages they
+depend on have finished, so independent work overlaps. Messages emitted by
+each stage are released in the order the stages were added: the earliest
+unfinished stage streams live while later ones are buffered, so clients see
+the same ordering as a sequential run.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Callback a stage uses to send messages to the client while it runs
+Emit = Callable[[Any], None]
+
+_DONE = object()
+
+
+@dataclass
+class StageNode:
+    name: str
+    run: Callable[[Emit], Awaitable[Any]]
+    after: Tuple[str, ...] = ()
+
+
+class StageGraph:
+    """Dependency graph of async stages with ordered message release"""
+
+    def __init__(self) -> None:
+        self.nodes: Dict[str, StageNode] = {}
+        self.results: Dict[str, Any] = {}
+        # (stage, seconds from graph start to stage finish)
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, run: Callable[[Emit], Awaitable[Any]], after: Sequence[str] = ()) -> None:
+        """Add a stage; dependencies must already be in the graph"""
+        if name in self.nodes:
+            raise ValueError(f"Duplicate stage: {name}")
+        missing = [dependency for dependency in after if dependency not in self.nodes]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+        self.nodes[name] = StageNode(name=name, run=run, after=tuple(after))
+
+    async def run(self) -> AsyncGenerator[Any, None]:
+        """Run every stage, yielding their messages in stage order"""
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        queue: asyncio.Queue = asyncio.Queue()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_node(node: StageNode) -> None:
+            if node.after:
+                await asyncio.gather(*(tasks[dependency] for dependency in node.after))
+            self.results[node.name] = await node.run(lambda message: queue.put_nowait((node.name, message)))
+            self.timings[node.name] = loop.time() - started
+
+        for name, node in self.nodes.items():
+            task = asyncio.ensure_future(run_node(node))
+            task.add_done_callback(lambda _, name=name: queue.put_nowait((name, _DONE)))
+            tasks[name] = task
+
+        order = list(self.nodes)
+        buffered: Dict[str, List[Any]] = {name: [] for name in order}
+        finished = set()
+        current = 0
+
+        try:
+            while current < len(order):
+                name, message = await queue.get()
+                if message is _DONE:
+                    finished.add(name)
+                elif name == order[current]:
+                    yield message
+                    continue
+                else:
+                    buffered[name].append(message)
+                    continue
+
+                # Release every stage that is now at the front of the order
+                while current < len(order) and order[current] in finished:
+                    error = tasks[order[current]].exception()
+                    if error is not None:
+                        raise error
+                    current += 1
+                    if current < len(order):
+                        for pending in buffered[order[current]]:
+                            yield pending
+                        buffered[order[current]] = []
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # Mark failures of unreleased stages as retrieved
@@ -1,22 +1,49 @@
 import asyncio
 import hashlib
 import json
+import logging
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Any, AsyncGenerator, Dict, List
-import tempfile
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Set, Tuple
 import subprocess
 import shutil
 import os
 
-from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app import async_crud
 from app.core.config import settings
+from app.core.db import async_engine, engine
 from app.models import (
-    TestRun, AgentStage, StreamingMessage, StudioObservation,
+    AgentStage, StreamingMessage,
     CodeGeneration, Project
 )
+from app.services.completion_cache import CompletionCache, build_shared_tier, make_cache_key
+from app.services.fence_parser import FenceEvent, FenceParser, parse_files
+from app.services.import_graph import import_graph
+from app.services.llm_governor import PRIORITY_INTERACTIVE, estimate_tokens
 from app.services.openai_service import openai_service
+from app.services.plugin_system import PluginSystem
+from app.services.patch_applier import apply_patches, extract_patches
+from app.services.prompt_builder import (
+    PromptBuilder, compact_json, count_tokens, extract_failure_excerpts, files_referenced_by
+)
+from app.services.process_runner import run_process
+from app.services.prompt_index import index_scope, prompt_index
+from app.services.run_state import RunState
+from app.services.node_modules_cache import InstallError
+from app.services.sandbox_pool import (
+    BASE_PACKAGE_JSON, TEST_SETUP, VITEST_CONFIG, sandbox_dependencies, sandbox_pool
+)
+from app.services.stage_graph import StageGraph
+from app.services.vitest_results import (
+    REPORT_FILE, REPORTER_ARGS, format_failures, load_report, merge_results, parse_report, summarize
+)
+
+logger = logging.getLogger(__name__)
+
+# Callback a stage uses to send messages to the client while it runs
+Emit = Callable[[StreamingMessage], None]
 
 
 class TestDrivenAgent:
@@ -33,18 +60,55 @@ class TestDrivenAgent:
     6. Reports final results with metrics and insights
     """
     
-    def __init__(self):
+    def __init__(self, plugin_system: Optional[PluginSystem] = None):
         self.max_repair_attempts = 2
         self.current_cost = 0.0
+        self.plugin_system = plugin_system
+        
+        # Results of identical workspaces are reused without running node
+        self.test_cache: Optional[CompletionCache] = None
+        if settings.TEST_RESULT_CACHE_ENABLED:
+            self.test_cache = CompletionCache(
+                max_bytes=settings.TEST_RESULT_CACHE_MAX_BYTES,
+                ttl_seconds=settings.TEST_RESULT_CACHE_TTL_SECONDS,
+                shared=build_shared_tier(
+                    settings.REDIS_URL,
+                    settings.COMPLETION_CACHE_DIR,
+                    settings.TEST_RESULT_CACHE_TTL_SECONDS
+                )
+            )
+    
+    @staticmethod
+    def estimate_run_tokens(prompt: str, skip_tests: bool = False) -> int:
+        """Expected LLM tokens for a run (prompt plus completion per stage), for rate limiting"""
+        prompt_tokens = estimate_tokens(prompt)
+        # Interpret and scaffold
+        total = 2 * prompt_tokens + 800 + 1500
+        if not skip_tests:
+            # Unit tests, and one repair attempt
+            total += prompt_tokens + 1200
+            total += settings.REPAIR_CANDIDATES * (settings.PROMPT_TOKEN_BUDGET_REPAIR + 1500)
+        return total
         
     async def run_test_driven_generation(
         self,
         prompt: str,
         project_id: uuid.UUID,
-        session: Session,
-        skip_tests: bool = False
+        skip_tests: bool = False,
+        use_plugins: Optional[List[str]] = None,
+        owner_id: Optional[uuid.UUID] = None
     ) -> AsyncGenerator[StreamingMessage, None]:
-        """Main entry point for test-driven code generation"""
+        """
+        Main entry point for test-driven code generation
+        
+        After Interpret, the remaining stages run as a dependency graph:
+        tests are generated from the contract's planned file structure while
+        the scaffold streams in, and plugins run on the scaffold while tests
+        are generated. Messages still arrive in stage order.
+        
+        Contracts are only reused between prompts of the same owner (or, if
+        the owner is not given, the same project).
+        """
         
         # Check if OpenAI API key is configured
         if not os.getenv("OPENAI_API_KEY"):
@@ -55,14 +119,17 @@ class TestDrivenAgent:
             )
             return
         
-        # Create test run record
-        test_run = TestRun(
-            project_id=project_id,
-            current_stage=AgentStage.INTERPRET
-        )
-        session.add(test_run)
-        session.commit()
-        session.refresh(test_run)
+        # Create test run record, in a session of its own so no connection
+        # stays checked out while the run works
+        async with AsyncSession(async_engine, expire_on_commit=False) as record_session:
+            test_run = await async_crud.create_test_run(
+                session=record_session,
+                project_id=project_id,
+                current_stage=AgentStage.INTERPRET
+            )
+        # From here on the run lives in memory; changes are written behind
+        test_run = RunState(test_run, engine, settings.RUN_STATE_FLUSH_INTERVAL_SECONDS)
+        scope = index_scope(owner_id, project_id)
         
         try:
             # Stage 1: Interpret - Convert prompt to formal contract
@@ -72,9 +139,8 @@ class TestDrivenAgent:
                 stage=AgentStage.INTERPRET
             )
             
-            contract = await self._interpret_prompt(prompt, test_run, session)
+            contract = await self._interpret_prompt(prompt, test_run, scope)
             test_run.contract = contract
-            session.commit()
             
             yield StreamingMessage(
                 type="reasoning_step",
@@ -83,116 +149,183 @@ class TestDrivenAgent:
                 data={"contract": contract}
             )
             
-            # Stage 2: Scaffold - Generate minimal file structure
-            test_run.current_stage = AgentStage.SCAFFOLD
-            session.commit()
-            
-            yield StreamingMessage(
-                type="stage_complete",
-                content="Generating project scaffold...",
-                stage=AgentStage.SCAFFOLD
-            )
-            
-            scaffold_files = await self._scaffold_files(contract, test_run, session)
-            test_run.scaffold_files = scaffold_files
-            session.commit()
+            graph = StageGraph()
             
-            yield StreamingMessage(
-                type="file_closed",
-                content=f"Generated {len(scaffold_files)} scaffold files",
-                stage=AgentStage.SCAFFOLD,
-                data={"files": list(scaffold_files.keys())}
-            )
-            
-            # Stage 3: Unit-Test - Generate test specifications
-            if not skip_tests:
-                test_run.current_stage = AgentStage.UNIT_TEST
-                session.commit()
+            # Stage 2: Scaffold - Generate minimal file structure
+            async def scaffold(emit: Emit) -> Dict[str, str]:
+                test_run.current_stage = AgentStage.SCAFFOLD
                 
-                yield StreamingMessage(
+                emit(StreamingMessage(
                     type="stage_complete",
-                    content="Creating test specifications...",
-                    stage=AgentStage.UNIT_TEST
-                )
+                    content="Generating project scaffold...",
+                    stage=AgentStage.SCAFFOLD
+                ))
                 
-                test_files = await self._generate_tests(contract, scaffold_files, test_run, session)
-                test_run.test_files = test_files
-                session.commit()
+                scaffold_files = await self._scaffold_files(contract, test_run, emit)
+                test_run.scaffold_files = scaffold_files
                 
-                yield StreamingMessage(
+                emit(StreamingMessage(
                     type="file_closed",
-                    content=f"Generated {len(test_files)} test files",
-                    stage=AgentStage.UNIT_TEST,
-                    data={"test_files": list(test_files.keys())}
-                )
+                    content=f"Generated {len(scaffold_files)} scaffold files",
+                    stage=AgentStage.SCAFFOLD,
+                    data={"files": list(scaffold_files.keys())}
+                ))
+                return scaffold_files
+            
+            graph.add("scaffold", scaffold)
+            
+            # Plugins transform the scaffold while tests are being written
+            if use_plugins:
+                async def plugins(emit: Emit) -> Dict[str, str]:
+                    return await self._apply_plugins(use_plugins, graph.results["scaffold"], test_run, emit)
                 
-                # Stage 4: Execute - Run tests
-                test_run.current_stage = AgentStage.EXECUTE
-                session.commit()
+                graph.add("plugins", plugins, after=["scaffold"])
+            
+            if not skip_tests:
+                # Tests need the file list, not the finished scaffold; without
+                # a planned structure they wait for the scaffold instead
+                planned_files = self._planned_files(contract)
                 
-                yield StreamingMessage(
-                    type="stage_complete",
-                    content="Executing test suite...",
-                    stage=AgentStage.EXECUTE
-                )
+                # Stage 3: Unit-Test - Generate test specifications
+                async def unit_test(emit: Emit) -> Dict[str, str]:
+                    test_run.current_stage = AgentStage.UNIT_TEST
+                    
+                    emit(StreamingMessage(
+                        type="stage_complete",
+                        content="Creating test specifications...",
+                        stage=AgentStage.UNIT_TEST
+                    ))
+                    
+                    test_files = await self._generate_tests(
+                        contract, planned_files or graph.results["scaffold"], test_run, emit
+                    )
+                    test_run.test_files = test_files
+                    
+                    emit(StreamingMessage(
+                        type="file_closed",
+                        content=f"Generated {len(test_files)} test files",
+                        stage=AgentStage.UNIT_TEST,
+                        data={"test_files": list(test_files.keys())}
+                    ))
+                    return test_files
                 
-                test_results = await self._execute_tests(scaffold_files, test_files, test_run, session)
-                test_run.test_results = test_results
-                session.commit()
+                graph.add("unit_test", unit_test, after=[] if planned_files else ["scaffold"])
                 
-                yield StreamingMessage(
-                    type="test_result",
-                    content=f"Tests completed: {test_results.get('summary', 'Results available')}",
-                    stage=AgentStage.EXECUTE,
-                    data=test_results
-                )
-                
-                # Stage 5: Repair - Fix failing tests (if needed)
-                if not test_results.get("all_passed", False) and test_run.repair_attempts < self.max_repair_attempts:
-                    test_run.current_stage = AgentStage.REPAIR
-                    session.commit()
+                # Stage 4: Execute - Run tests
+                async def execute(emit: Emit) -> Dict[str, Any]:
+                    test_run.current_stage = AgentStage.EXECUTE
                     
-                    yield StreamingMessage(
+                    emit(StreamingMessage(
                         type="stage_complete",
-                        content="Analyzing failures and attempting repairs...",
-                        stage=AgentStage.REPAIR
-                    )
+                        content="Executing test suite...",
+                        stage=AgentStage.EXECUTE
+                    ))
                     
-                    repaired_files = await self._repair_code(
-                        scaffold_files, test_files, test_results, contract, test_run, session
-                    )
+                    files = graph.results.get("plugins") or graph.results["scaffold"]
+                    test_results = await self._execute_tests(files, graph.results["unit_test"], test_run, emit)
+                    test_run.test_results = test_results
+                    
+                    emit(StreamingMessage(
+                        type="test_result",
+                        content=f"Tests completed: {test_results.get('summary', 'Results available')}",
+                        stage=AgentStage.EXECUTE,
+                        test_results=test_results,
+                        data=test_results
+                    ))
+                    return test_results
+                
+                graph.add("execute", execute, after=["scaffold", "unit_test"] + (["plugins"] if use_plugins else []))
+                
+                # Stage 5: Repair - Fix failing tests (if needed), one round of
+                # concurrent candidates per attempt, within a wall-clock budget
+                async def repair(emit: Emit) -> Dict[str, Any]:
+                    test_results = graph.results["execute"]
+                    files = graph.results.get("plugins") or graph.results["scaffold"]
+                    test_files = graph.results["unit_test"]
+                    loop = asyncio.get_running_loop()
+                    deadline = loop.time() + settings.REPAIR_BUDGET_SECONDS
+                    # Output token counts of every attempt's chosen candidate
+                    repairs: List[Dict[str, Any]] = []
                     
-                    if repaired_files:
-                        # Re-run tests with repaired code
-                        test_results = await self._execute_tests(repaired_files, test_files, test_run, session)
+                    while (
+                        not test_results.get("all_passed", False)
+                        and test_run.repair_attempts < self.max_repair_attempts
+                        and loop.time() < deadline
+                    ):
+                        test_run.repair_attempts += 1
+                        test_run.current_stage = AgentStage.REPAIR
+                        
+                        emit(StreamingMessage(
+                            type="stage_complete",
+                            content=f"Analyzing failures and attempting repairs (attempt {test_run.repair_attempts})...",
+                            stage=AgentStage.REPAIR
+                        ))
+                        
+                        # Later attempts see the same prompt if nothing improved, so sample afresh
+                        outcome = await self._repair_round(
+                            files, test_files, test_results, contract, test_run, deadline,
+                            emit, use_cache=test_run.repair_attempts == 1
+                        )
+                        if outcome is None:
+                            break  # No candidate changed anything, or the budget ran out
+                        
+                        candidate_files, candidate_results = outcome
+                        repairs.append(candidate_results.get("repair", {}))
+                        if self._repair_score(candidate_results) <= self._repair_score(test_results):
+                            # The client was shown the candidate's files; put the current ones back
+                            self._announce_files(
+                                {name: files[name] for name, content in candidate_files.items() if files.get(name, content) != content},
+                                AgentStage.REPAIR,
+                                emit
+                            )
+                            emit(StreamingMessage(
+                                type="test_result",
+                                content="No repair candidate improved the test results",
+                                stage=AgentStage.REPAIR,
+                                test_results=candidate_results,
+                                data=candidate_results
+                            ))
+                            continue
+                        
+                        files.update(candidate_files)
+                        test_results = {**candidate_results, "repairs": list(repairs)}
                         test_run.test_results = test_results
-                        scaffold_files.update(repaired_files)
-                        test_run.scaffold_files = scaffold_files
-                        session.commit()
+                        test_run.scaffold_files = files
                         
-                        yield StreamingMessage(
+                        emit(StreamingMessage(
                             type="test_result",
                             content="Repair attempt completed",
                             stage=AgentStage.REPAIR,
+                            test_results=test_results,
                             data=test_results
-                        )
+                        ))
+                    return test_results
+                
+                graph.add("repair", repair, after=["execute"])
+            
+            async for message in graph.run():
+                yield message
+            
+            scaffold_files = graph.results.get("plugins") or graph.results["scaffold"]
+            test_results = graph.results.get("repair", {})
             
             # Stage 6: Report - Final results
             test_run.current_stage = AgentStage.REPORT
             test_run.success = test_results.get("all_passed", True) if not skip_tests else True
-            session.commit()
             
-            # Stream final files
+            # Send final files; these replace whatever was streamed earlier
             for filename, content in scaffold_files.items():
                 yield StreamingMessage(
                     type="token",
                     content=content,
+                    filename=filename,
                     stage=AgentStage.REPORT,
-                    data={"filename": filename, "language": self._detect_language(filename)}
+                    data={"filename": filename, "language": self._detect_language(filename)},
+                    stream_metadata={"file_start": True}
                 )
             
             # Record analytics
-            await self._record_observation(prompt, scaffold_files, test_results if not skip_tests else {}, project_id, session)
+            await self._record_observation(prompt, contract, scaffold_files, test_results if not skip_tests else {}, project_id, owner_id)
             
             # Final success message
             final_message = "Generation completed successfully!"
@@ -208,7 +341,8 @@ class TestDrivenAgent:
                 data={
                     "files_generated": len(scaffold_files),
                     "tests_passed": test_results.get("passed", 0) if not skip_tests else 0,
-                    "cost_estimate": self.current_cost
+                    "cost_estimate": self.current_cost,
+                    "stage_timings": graph.timings
                 }
             )
             
@@ -222,9 +356,54 @@ class TestDrivenAgent:
             )
             
             test_run.success = False
-            session.commit()
+        
+        finally:
+            await test_run.close()
+
+    def _planned_files(self, contract: Dict[str, Any]) -> Dict[str, str]:
+        """Files the contract plans to create, as placeholders describing each"""
+        structure = contract.get("file_structure")
+        if isinstance(structure, list):
+            structure = {path: "" for path in structure if isinstance(path, str)}
+        if not isinstance(structure, dict):
+            return {}
+        
+        planned = {}
+        for path, description in structure.items():
+            # Nested directory trees are too loose to write tests against
+            if not isinstance(description, str) or not Path(path).suffix:
+                return {}
+            planned[path] = f"// Planned: {description}" if description else "// Planned"
+        return planned
+
+    async def _apply_plugins(self, plugin_names: List[str], files: Dict[str, str], test_run: RunState, emit: Optional[Emit] = None) -> Dict[str, str]:
+        """Run the requested plugins over the scaffold, in order"""
+        
+        files = dict(files)
+        if self.plugin_system is None:
+            return files
+        
+        for plugin_name in plugin_names:
+            try:
+                output_files = await self.plugin_system.execute_plugin(plugin_name, files)
+            except Exception as e:
+                # A missing or broken plugin should not fail the generation
+                if emit:
+                    emit(StreamingMessage(
+                        type="reasoning_step",
+                        content=f"Plugin {plugin_name} failed: {str(e)}",
+                        stage=AgentStage.SCAFFOLD
+                    ))
+                continue
+            
+            changed = {name: content for name, content in output_files.items() if files.get(name) != content}
+            files.update(changed)
+            self._announce_files(changed, AgentStage.SCAFFOLD, emit)
+        
+        test_run.scaffold_files = files
+        return files
 
-    async def _interpret_prompt(self, prompt: str, test_run: TestRun, session: Session) -> Dict[str, Any]:
+    async def _interpret_prompt(self, prompt: str, test_run: RunState, scope: Optional[str] = None) -> Dict[str, Any]:
         """
         Stage 1: Convert natural language prompt into formal contract
         
@@ -234,8 +413,26 @@ class TestDrivenAgent:
         - Component specifications
         - UI/UX requirements
         - Edge cases and constraints
+        
+        Near-duplicate prompts within scope reuse a previously interpreted
+        contract and skip the LLM round trip entirely.
         """
         
+        if settings.PROMPT_REUSE_ENABLED and scope:
+            if not prompt_index.loaded:
+                try:
+                    async with AsyncSession(async_engine) as session:
+                        await prompt_index.load(session)
+                except Exception as e:
+                    # Reuse is optional; carry on without it and retry on the next run
+                    logger.warning(f"Prompt index warm-up failed: {e}")
+            
+            match = prompt_index.query(prompt, settings.PROMPT_REUSE_SIMILARITY_THRESHOLD, scope)
+            if match:
+                contract = match[0]
+                prompt_index.add(prompt, contract, scope)
+                return dict(contract)
+        
         system_prompt = """You are a senior technical architect. Convert the user's request into a formal development contract.
 
 Return a JSON object with these fields:
@@ -257,12 +454,17 @@ Be specific and actionable. Focus on what can be implemented."""
                 messages=messages,
                 system_prompt=system_prompt,
                 max_tokens=800,
-                temperature=0.3  # Lower temperature for more structured output
+                temperature=0.3,  # Lower temperature for more structured output
+                priority=PRIORITY_INTERACTIVE,  # First feedback the user waits on
+                stage=AgentStage.INTERPRET.value
             )
             
             # Try to parse JSON response
             try:
                 contract = json.loads(response)
+                # Only contracts the model actually produced are reusable
+                if scope:
+                    prompt_index.add(prompt, contract, scope)
             except json.JSONDecodeError:
                 # Fallback if response isn't valid JSON
                 contract = {
@@ -294,7 +496,7 @@ Be specific and actionable. Focus on what can be implemented."""
                 }
             }
 
-    async def _scaffold_files(self, contract: Dict[str, Any], test_run: TestRun, session: Session) -> Dict[str, str]:
+    async def _scaffold_files(self, contract: Dict[str, Any], test_run: RunState, emit: Optional[Emit] = None) -> Dict[str, str]:
         """
         Stage 2: Generate minimal compilable file structure with TODO comments
         """
@@ -321,37 +523,35 @@ Focus on structure over implementation details."""
 
         user_message = f"""Create scaffold files for this project:
 
-{json.dumps(contract, indent=2)}
+{compact_json(contract)}
 
-Generate the main files needed to get started. Include package.json if needed."""
+Generate the main files needed to get started. Include package.json if needed.
+Use the paths from file_structure exactly; tests are written against them."""
 
         messages = [{"role": "user", "content": user_message}]
         
         try:
-            response = await openai_service.generate_completion(
-                messages=messages,
-                system_prompt=system_prompt,
-                max_tokens=1500
-            )
-            
-            files = self._parse_files_from_response(response)
+            files = await self._stream_files(messages, system_prompt, 1500, AgentStage.SCAFFOLD, emit)
             
             # Ensure we have at least one file
             if not files:
                 files = {
                     "src/App.tsx": self._generate_fallback_file(contract)
                 }
+                self._announce_files(files, AgentStage.SCAFFOLD, emit)
             
             return files
             
         except Exception as e:
             # Fallback files when OpenAI is unavailable
-            return {
+            files = {
                 "src/App.tsx": self._generate_fallback_file(contract),
                 "package.json": self._generate_fallback_package_json(contract)
             }
+            self._announce_files(files, AgentStage.SCAFFOLD, emit)
+            return files
 
-    async def _generate_tests(self, contract: Dict[str, Any], scaffold_files: Dict[str, str], test_run: TestRun, session: Session) -> Dict[str, str]:
+    async def _generate_tests(self, contract: Dict[str, Any], scaffold_files: Dict[str, str], test_run: RunState, emit: Optional[Emit] = None) -> Dict[str, str]:
         """
         Stage 3: Generate comprehensive test specifications
         """
@@ -370,164 +570,327 @@ Return test files in this format:
 test content here
 ```"""
 
-        # Create context from scaffold files
-        files_context = "\n\n".join([
-            f"// {filename}\n{content[:500]}..." 
-            for filename, content in scaffold_files.items()
-        ])
-
-        user_message = f"""Create test files for this project:
-
-Contract: {json.dumps(contract, indent=2)}
-
-Files to test:
-{files_context}
-
-Generate comprehensive tests that verify the requirements are met."""
+        # Contract first, then as much of the scaffold as the budget allows
+        builder = PromptBuilder(settings.PROMPT_TOKEN_BUDGET_UNIT_TEST, openai_service.config.model)
+        builder.add("Create test files for this project:", priority=0, truncatable=False)
+        builder.add(f"Contract: {compact_json(contract)}", priority=0, truncatable=False)
+        builder.add("Files to test:", priority=0, truncatable=False)
+        for filename, content in scaffold_files.items():
+            builder.add_file(filename, content, priority=1)
+        builder.add("Generate comprehensive tests that verify the requirements are met.", priority=0, truncatable=False)
+        
+        user_message = builder.build()
 
         messages = [{"role": "user", "content": user_message}]
         
         try:
-            response = await openai_service.generate_completion(
-                messages=messages,
-                system_prompt=system_prompt,
-                max_tokens=1200
-            )
-            
-            test_files = self._parse_files_from_response(response)
+            test_files = await self._stream_files(messages, system_prompt, 1200, AgentStage.UNIT_TEST, emit)
             
             # Ensure we have at least one test file
             if not test_files:
                 test_files = {
                     "src/App.test.tsx": self._generate_fallback_test()
                 }
+                self._announce_files(test_files, AgentStage.UNIT_TEST, emit)
             
             return test_files
             
         except Exception as e:
             # Fallback test when OpenAI is unavailable
-            return {
+            test_files = {
                 "src/App.test.tsx": self._generate_fallback_test()
             }
+            self._announce_files(test_files, AgentStage.UNIT_TEST, emit)
+            return test_files
 
-    async def _execute_tests(self, files: Dict[str, str], test_files: Dict[str, str], test_run: TestRun, session: Session) -> Dict[str, Any]:
+    async def _execute_tests(self, files: Dict[str, str], test_files: Dict[str, str], test_run: RunState, emit: Optional[Emit] = None, only: Optional[Set[str]] = None) -> Dict[str, Any]:
         """
-        Stage 4: Execute tests in isolated Node.js environment
+        Stage 4: Execute tests, reusing the results of an identical workspace
+
+        With only set, vitest runs just those test files.
         """
         
-        # Create temporary directory for test execution
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-            
-            try:
-                # Write all files to temp directory
-                for filename, content in {**files, **test_files}.items():
-                    file_path = temp_path / filename
-                    file_path.parent.mkdir(parents=True, exist_ok=True)
-                    file_path.write_text(content)
-                
-                # Create basic package.json if not exists
-                package_json_path = temp_path / "package.json"
-                if not package_json_path.exists():
-                    package_json_path.write_text(json.dumps({
-                        "name": "test-project",
-                        "version": "1.0.0",
-                        "type": "module",
-                        "scripts": {
-                            "test": "vitest run"
-                        },
-                        "devDependencies": {
-                            "vitest": "^1.0.0",
-                            "@testing-library/react": "^14.0.0",
-                            "@testing-library/jest-dom": "^6.0.0",
-                            "@types/react": "^18.0.0",
-                            "jsdom": "^23.0.0"
-                        }
-                    }, indent=2))
+        if self.test_cache is None:
+            return await self._run_tests(files, test_files, emit, only)
+        
+        cache_key = self._test_cache_key(files, test_files, only)
+        cached = await self.test_cache.lookup(cache_key)
+        if cached is not None:
+            if emit:
+                emit(StreamingMessage(
+                    type="build_progress",
+                    content="Workspace unchanged since an earlier run; reusing its test results",
+                    stage=AgentStage.EXECUTE,
+                    progress_pct=100
+                ))
+            return {**json.loads(cached), "cached": True}
+        
+        results = await self._run_tests(files, test_files, emit, only)
+        # Failed installs, timeouts and missing reports may not recur
+        if "error" not in results:
+            await self.test_cache.store(cache_key, json.dumps(results))
+        return results
+
+    def _test_cache_key(self, files: Dict[str, str], test_files: Dict[str, str], only: Optional[Set[str]]) -> str:
+        """Hash of every file the run sees plus the runner configuration"""
+        return make_cache_key({
+            "files": files,
+            "test_files": test_files,
+            "only": sorted(only) if only is not None else None,
+            "runner": {
+                "package_json": BASE_PACKAGE_JSON,
+                "vitest_config": VITEST_CONFIG,
+                "test_setup": TEST_SETUP,
+                "reporter_args": REPORTER_ARGS,
+            },
+        }, namespace="test_results")
+
+    async def _run_tests(self, files: Dict[str, str], test_files: Dict[str, str], emit: Optional[Emit] = None, only: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """
+        Run vitest in a pre-warmed sandbox from the pool
+        """
+        
+        try:
+            async with sandbox_pool.lease() as sandbox:
+                all_files = {**files, **test_files}
                 
-                # Create vitest config
-                vitest_config = temp_path / "vitest.config.ts"
-                vitest_config.write_text("""
-import { defineConfig } from 'vitest/config'
-
-export default defineConfig({
-  test: {
-    environment: 'jsdom',
-    setupFiles: ['./test-setup.ts'],
-  },
-})
-""")
+                # The sandbox's package.json carries the test toolchain; a
+                # generated one only contributes the dependencies it lacks,
+                # which are linked in from the node_modules cache
+                package_json = None
+                generated_package_json = all_files.pop("package.json", None)
+                if generated_package_json:
+                    try:
+                        package_json = json.loads(generated_package_json)
+                    except ValueError:
+                        pass
+                if not isinstance(package_json, dict):
+                    package_json = None
                 
-                # Create test setup
-                test_setup = temp_path / "test-setup.ts"
-                test_setup.write_text("import '@testing-library/jest-dom'")
+                await sandbox_pool.use_dependencies(sandbox, sandbox_dependencies(package_json))
+                await asyncio.to_thread(sandbox.write_files, all_files)
                 
-                # Run npm install (with timeout)
-                install_result = subprocess.run(
-                    ["npm", "install"],
-                    cwd=temp_path,
-                    capture_output=True,
-                    text=True,
-                    timeout=60
-                )
+                # Run tests (with timeout), forwarding output as it is printed
+                selected = sorted(only) if only is not None else list(test_files)
+                reported = set()
                 
-                if install_result.returncode != 0:
-                    return {
-                        "success": False,
-                        "error": f"Package installation failed: {install_result.stderr}",
-                        "passed": 0,
-                        "total": len(test_files),
-                        "all_passed": False
-                    }
+                def on_line(stream: str, line: str) -> None:
+                    if emit is None or not line.strip():
+                        return
+                    reported.update(name for name in selected if name in line)
+                    emit(StreamingMessage(
+                        type="build_progress",
+                        content=line,
+                        stage=AgentStage.EXECUTE,
+                        progress_pct=min(99, 100 * len(reported) // max(len(selected), 1))
+                    ))
                 
-                # Run tests (with timeout)
-                test_result = subprocess.run(
-                    ["npm", "test"],
-                    cwd=temp_path,
-                    capture_output=True,
-                    text=True,
-                    timeout=30
+                test_result = await run_process(
+                    ["npm", "test", "--", *REPORTER_ARGS, *(selected if only is not None else [])],
+                    cwd=sandbox.path,
+                    timeout=settings.SANDBOX_TEST_TIMEOUT_SECONDS,
+                    env={"NO_COLOR": "1"},
+                    on_line=on_line
                 )
                 
-                # Parse test results
+                # Per-test records from the JSON reporter
                 output = test_result.stdout + test_result.stderr
-                passed_tests = output.count("✓") + output.count("PASS")
-                failed_tests = output.count("✗") + output.count("FAIL")
-                total_tests = passed_tests + failed_tests
+                report = await asyncio.to_thread(load_report, sandbox.path / REPORT_FILE)
+                tests = parse_report(report, sandbox.path) if report else []
+                summary = summarize(tests)
                 
-                return {
+                results = {
                     "success": test_result.returncode == 0,
                     "output": output,
-                    "passed": passed_tests,
-                    "failed": failed_tests,
-                    "total": total_tests,
-                    "all_passed": test_result.returncode == 0 and failed_tests == 0,
-                    "summary": f"{passed_tests}/{total_tests} tests passed"
-                }
-                
-            except subprocess.TimeoutExpired:
-                return {
-                    "success": False,
-                    "error": "Test execution timed out",
-                    "passed": 0,
-                    "total": len(test_files),
-                    "all_passed": False
-                }
-            except Exception as e:
-                return {
-                    "success": False,
-                    "error": f"Test execution failed: {str(e)}",
-                    "passed": 0,
-                    "total": len(test_files),
-                    "all_passed": False
+                    **summary,
+                    "tests": tests,
+                    "all_passed": report is not None and test_result.returncode == 0 and summary["failed"] == 0
                 }
+                if report is None:
+                    results["error"] = "Test runner did not produce a report"
+                return results
+            
+        except InstallError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "passed": 0,
+                "total": len(test_files),
+                "tests": [],
+                "all_passed": False
+            }
+        except subprocess.TimeoutExpired:
+            return {
+                "success": False,
+                "error": "Test execution timed out",
+                "passed": 0,
+                "total": len(test_files),
+                "tests": [],
+                "all_passed": False
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Test execution failed: {str(e)}",
+                "passed": 0,
+                "total": len(test_files),
+                "tests": [],
+                "all_passed": False
+            }
 
-    async def _repair_code(self, files: Dict[str, str], test_files: Dict[str, str], test_results: Dict[str, Any], contract: Dict[str, Any], test_run: TestRun, session: Session) -> Dict[str, str]:
+    async def _rerun_tests(self, files: Dict[str, str], test_files: Dict[str, str], changed: Set[str], previous: Dict[str, Any], test_run: RunState, emit: Optional[Emit] = None) -> Dict[str, Any]:
         """
-        Stage 5: Analyze test failures and repair code
+        Re-run only the test files that import a changed file, merged with the earlier results
         """
         
-        test_run.repair_attempts += 1
+        affected = None
+        if previous.get("tests"):
+            affected = import_graph.affected_tests({**files, **test_files}, test_files, changed)
+        if affected is None:
+            # No per-test baseline, or a change imports cannot account for
+            return await self._execute_tests(files, test_files, test_run, emit)
+        if not affected:
+            return {**previous, "rerun_files": []}
+        
+        rerun = await self._execute_tests(files, test_files, test_run, emit, only=affected)
+        if rerun.get("error"):
+            return rerun
+        
+        tests = merge_results(previous["tests"], rerun["tests"], affected)
+        summary = summarize(tests)
+        return {
+            **rerun,
+            **summary,
+            "tests": tests,
+            "rerun_files": sorted(affected),
+            "all_passed": rerun["all_passed"] and summary["failed"] == 0
+        }
+
+    async def _repair_round(
+        self,
+        files: Dict[str, str],
+        test_files: Dict[str, str],
+        test_results: Dict[str, Any],
+        contract: Dict[str, Any],
+        test_run: RunState,
+        deadline: float,
+        emit: Optional[Emit] = None,
+        use_cache: bool = True
+    ) -> Optional[Tuple[Dict[str, str], Dict[str, Any]]]:
+        """
+        Generate repair candidates concurrently, one per temperature, and test
+        each in its own pooled sandbox. The first candidate to pass every test
+        wins and the rest are cancelled; otherwise the best candidate is
+        returned as (files, test results). The first candidate streams its
+        files to emit; when another is returned, or none is, the client is
+        sent the files it should show instead.
+
+        The generated tests are the specification: a candidate's edits to
+        them are discarded, so it cannot pass by weakening an assertion.
+        """
+        
+        temperatures = [
+            settings.REPAIR_TEMPERATURES[index % len(settings.REPAIR_TEMPERATURES)]
+            for index in range(max(settings.REPAIR_CANDIDATES, 1))
+        ]
+        # Files the first candidate has shown the client
+        streamed: Set[str] = set()
+        
+        def leader_emit(message: StreamingMessage) -> None:
+            if message.filename:
+                streamed.add(message.filename)
+            emit(message)
+        
+        async def candidate(temperature: float, candidate_emit: Optional[Emit]) -> Optional[Tuple[Dict[str, str], Dict[str, Any]]]:
+            repaired_files, repair_stats = await self._repair_code(
+                files, test_files, test_results, contract, test_run, candidate_emit,
+                temperature=temperature, use_cache=use_cache
+            )
+            changed = {
+                filename for filename, content in repaired_files.items()
+                if filename not in test_files and files.get(filename) != content
+            }
+            if not changed:
+                return None
+            
+            # Re-run the affected tests against the scaffold with the repairs applied
+            candidate_files = {**files, **{name: repaired_files[name] for name in changed}}
+            # Test output is only streamed when there is no race to confuse it with
+            rerun_emit = candidate_emit if len(temperatures) == 1 else None
+            results = await self._rerun_tests(candidate_files, test_files, changed, test_results, test_run, rerun_emit)
+            return candidate_files, {**results, "repair": repair_stats}
+        
+        tasks = [
+            asyncio.ensure_future(candidate(temperature, leader_emit if index == 0 and emit else None))
+            for index, temperature in enumerate(temperatures)
+        ]
+        best = None
+        try:
+            remaining = max(deadline - asyncio.get_running_loop().time(), 0)
+            for next_done in asyncio.as_completed(tasks, timeout=remaining):
+                try:
+                    outcome = await next_done
+                except asyncio.TimeoutError:
+                    raise
+                except Exception:
+                    continue  # A broken candidate does not sink the round
+                if outcome is None:
+                    continue
+                if outcome[1].get("all_passed", False):
+                    best = outcome
+                    break
+                if best is None or self._repair_score(outcome[1]) > self._repair_score(best[1]):
+                    best = outcome
+        except asyncio.TimeoutError:
+            pass  # Budget spent; settle for the best finished candidate
+        finally:
+            # Losing candidates' test processes are killed on cancellation
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        leader = tasks[0]
+        leader_outcome = leader.result() if leader.done() and not leader.cancelled() and leader.exception() is None else None
+        if emit and best is not leader_outcome:
+            # Replace what the first candidate streamed with the returned files
+            shown = best[0] if best is not None else files
+            self._announce_files(
+                {
+                    name: content for name, content in shown.items()
+                    if name in streamed or files.get(name) != content
+                },
+                AgentStage.REPAIR,
+                emit
+            )
+        return best
+
+    def _repair_score(self, test_results: Dict[str, Any]) -> Tuple[bool, bool, int]:
+        """Orders test results from worst to best"""
+        return (
+            test_results.get("all_passed", False),
+            "error" not in test_results,
+            test_results.get("passed", 0)
+        )
+
+    async def _repair_code(
+        self,
+        files: Dict[str, str],
+        test_files: Dict[str, str],
+        test_results: Dict[str, Any],
+        contract: Dict[str, Any],
+        test_run: RunState,
+        emit: Optional[Emit] = None,
+        temperature: Optional[float] = None,
+        use_cache: bool = True
+    ) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """
+        Stage 5: Analyze test failures and generate one repair candidate
+
+        The model returns SEARCH/REPLACE edits rather than whole files, so
+        output grows with the size of the fix. Files whose edits do not apply
+        are requested again as whole files. Returns the repaired files and
+        the repair's output token counts.
+        """
         
         system_prompt = """You are an expert debugger. Analyze the test failures and fix the code to make tests pass.
 
@@ -537,68 +900,178 @@ Focus on:
 3. Maintaining code quality and structure
 4. Not breaking existing functionality
 
-Return only the fixed files in this format:
-```filename
-fixed content here
-```"""
-
-        error_context = test_results.get("output", "No test output available")[:1000]
-        
-        user_message = f"""Fix the failing tests:
+The tests define the required behavior. Never edit a test file; fix the code
+under test instead.
 
-Test Results:
-{error_context}
+Return only your edits, one fence per changed file, named with the file's path.
+Inside it, use SEARCH/REPLACE blocks that copy the current lines exactly:
+```src/App.tsx
+<<<<<<< SEARCH
+lines to change, copied from the current file
+=======
+replacement lines
+>>>>>>> REPLACE
+```
+Keep each SEARCH block short but unique within the file. For a new file,
+leave SEARCH empty and put the whole file in REPLACE."""
 
-Current Files:
-"""
+        # Budget priority: failing-test excerpts, then the files they
+        # reference, then everything else
+        output = test_results.get("output", "")
+        failures = (
+            format_failures(test_results.get("tests", []))
+            or extract_failure_excerpts(output)
+            or output
+            or test_results.get("error")
+            or "No test output available"
+        )
+        referenced = files_referenced_by(failures, list(files) + list(test_files))
         
+        builder = PromptBuilder(settings.PROMPT_TOKEN_BUDGET_REPAIR, openai_service.config.model)
+        builder.add("Fix the failing tests:", priority=0, truncatable=False)
+        builder.add(f"Test Results:\n{failures}", priority=1)
+        builder.add("Current Files:", priority=0, truncatable=False)
+        for filename in referenced:
+            builder.add_file(filename, files[filename] if filename in files else test_files[filename], priority=2)
         for filename, content in files.items():
-            user_message += f"\n// {filename}\n{content[:800]}...\n"
+            if filename not in referenced:
+                builder.add_file(filename, content, priority=3)
+        
+        user_message = builder.build()
 
         messages = [{"role": "user", "content": user_message}]
+        stats: Dict[str, Any] = {"temperature": temperature, "output_tokens": 0, "fallback_files": []}
+        model = openai_service.config.model
         
         try:
             response = await openai_service.generate_completion(
                 messages=messages,
                 system_prompt=system_prompt,
-                max_tokens=1500
+                max_tokens=1500,
+                temperature=temperature,
+                use_cache=use_cache,
+                stage=AgentStage.REPAIR.value
             )
+            stats["output_tokens"] = count_tokens(response, model)
             
-            repaired_files = self._parse_files_from_response(response)
-            return repaired_files
+            patches = extract_patches(response)
+            # Edits to the tests are dropped rather than retried as whole files
+            stats["rejected_test_edits"] = sorted(filename for filename in patches if filename in test_files)
+            patched = apply_patches(files, {
+                filename: patch for filename, patch in patches.items() if filename not in test_files
+            })
+            repaired_files = patched.files
+            stats["modes"] = patched.modes
+            
+            if patched.failed:
+                # Whole-file fallback for the edits that did not apply
+                retry_messages = messages + [
+                    {"role": "assistant", "content": response},
+                    {"role": "user", "content": (
+                        "These edits could not be applied:\n"
+                        + "\n".join(f"- {filename}: {reason}" for filename, reason in patched.failed.items())
+                        + "\n\nReturn the complete fixed contents of only these files, each in a ```filename fence."
+                    )}
+                ]
+                rewritten = await self._stream_files(
+                    retry_messages, "You are an expert debugger.", 1500, AgentStage.REPAIR,
+                    temperature=temperature, use_cache=use_cache
+                )
+                rewritten = {filename: content for filename, content in rewritten.items() if filename in patched.failed}
+                repaired_files.update(rewritten)
+                stats["fallback_files"] = sorted(rewritten)
+                stats["output_tokens"] += sum(
+                    count_tokens(f"```{filename}\n{content}\n```\n", model) for filename, content in rewritten.items()
+                )
+            
+            # What the same repair would have cost as whole-file rewrites
+            stats["whole_file_tokens"] = sum(
+                count_tokens(f"```{filename}\n{content}\n```\n", model) for filename, content in repaired_files.items()
+            )
+            if emit:
+                self._announce_files(repaired_files, AgentStage.REPAIR, emit)
+            return repaired_files, stats
             
         except Exception as e:
-            # Return empty dict if repair fails
-            return {}
+            # Return no files if repair fails
+            return {}, stats
+
+    async def _stream_files(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: str,
+        max_tokens: int,
+        stage: AgentStage,
+        emit: Optional[Emit] = None,
+        temperature: Optional[float] = None,
+        use_cache: bool = True
+    ) -> Dict[str, str]:
+        """
+        Request files from the model, streaming each one to emit as it arrives.
+        Without emit the buffered (cacheable, hedgeable) completion is used.
+        """
+        
+        if emit is None:
+            response = await openai_service.generate_completion(
+                messages=messages,
+                system_prompt=system_prompt,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                use_cache=use_cache,
+                stage=stage.value
+            )
+            return self._parse_files_from_response(response)
+        
+        parser = FenceParser()
+        async for chunk in openai_service.stream_completion(
+            messages=messages,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            use_cache=use_cache,
+            stage=stage.value,
+            raise_errors=True
+        ):
+            for event in parser.feed(chunk):
+                emit(self._fence_message(event, stage))
+        for event in parser.close():
+            emit(self._fence_message(event, stage))
+        return parser.files
+
+    def _fence_message(self, event: FenceEvent, stage: AgentStage) -> StreamingMessage:
+        """Translate a fence parser event into a client message"""
+        if event.type == "file_closed":
+            return StreamingMessage(
+                type="file_closed",
+                filename=event.filename,
+                stage=stage,
+                stream_metadata={"truncated": True} if event.truncated else {}
+            )
+        
+        # file_start resets the file on the client (e.g. when repair rewrites it)
+        metadata = {}
+        if event.type == "file_start":
+            metadata = {"file_start": True, "language": self._detect_language(event.filename)}
+        return StreamingMessage(
+            type="token",
+            content=event.text,
+            filename=event.filename,
+            stage=stage,
+            stream_metadata=metadata
+        )
+
+    def _announce_files(self, files: Dict[str, str], stage: AgentStage, emit: Optional[Emit]) -> None:
+        """Send whole files (e.g. fallbacks) in the same shape as streamed ones"""
+        if emit is None:
+            return
+        for filename, content in files.items():
+            emit(self._fence_message(FenceEvent("file_start", filename), stage))
+            emit(self._fence_message(FenceEvent("file_chunk", filename, content), stage))
+            emit(self._fence_message(FenceEvent("file_closed", filename), stage))
 
     def _parse_files_from_response(self, response: str) -> Dict[str, str]:
         """Parse files from AI response with code blocks"""
-        files = {}
-        current_file = None
-        current_content = []
-        
-        lines = response.split('\n')
-        in_code_block = False
-        
-        for line in lines:
-            if line.startswith('```') and not in_code_block:
-                # Start of code block
-                filename = line[3:].strip()
-                if filename:
-                    current_file = filename
-                    current_content = []
-                    in_code_block = True
-            elif line.startswith('```') and in_code_block:
-                # End of code block
-                if current_file:
-                    files[current_file] = '\n'.join(current_content)
-                current_file = None
-                current_content = []
-                in_code_block = False
-            elif in_code_block:
-                current_content.append(line)
-        
-        return files
+        return parse_files(response)
 
     def _detect_language(self, filename: str) -> str:
         """Detect programming language from filename"""
@@ -673,22 +1146,31 @@ describe('App', () => {
   });
 });'''
 
-    async def _record_observation(self, prompt: str, files: Dict[str, str], test_results: Dict[str, Any], project_id: uuid.UUID, session: Session):
+    async def _record_observation(self, prompt: str, contract: Dict[str, Any], files: Dict[str, str], test_results: Dict[str, Any], project_id: uuid.UUID, owner_id: Optional[uuid.UUID] = None):
         """Record analytics data for continuous improvement"""
         
         prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()[:16]
         
-        observation = StudioObservation(
-            project_id=project_id,
-            prompt_hash=prompt_hash,
-            diff_patch=json.dumps(files),
-            test_metrics=test_results,
-            latency_ms=1000,  # TODO: Track actual latency
-            created_at=datetime.utcnow()
-        )
+        # Persist the signature beside the observation so the prompt index
+        # can be rebuilt after a restart; fallback contracts are never indexed
+        scope = index_scope(owner_id, project_id)
+        reusable = scope is not None and prompt_index.contains(prompt, scope)
         
-        session.add(observation)
-        session.commit()
+        async with AsyncSession(async_engine) as session:
+            await async_crud.create_studio_observation(
+                session=session,
+                project_id=project_id,
+                user_id=owner_id,
+                prompt_hash=prompt_hash,
+                prompt_text=prompt[:5000],
+                prompt_signature=prompt_index.signature(prompt) if reusable else [],
+                contract=contract if reusable else {},
+                diff_patch=json.dumps(files),
+                tests_passed=test_results.get("passed", 0),
+                tests_failed=test_results.get("failed", 0),
+                latency_ms=1000,  # TODO: Track actual latency
+                created_at=datetime.utcnow()
+            )
 
 # Global agent instance
 test_driven_agent = TestDrivenAgent() 
\ No newline at end of file
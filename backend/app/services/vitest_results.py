@@ -0,0 +1,112 @@
+"""
+Vitest Result Ingestion for AI Studio
+
+Runs vitest with its JSON reporter alongside the default one and turns the
+report into one record per test (name, file, status, duration, failure
+message). The records are stored on the TestRun, so later stages can work
+with individual tests instead of raw runner output.
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Written into the sandbox by the JSON reporter; removed with the sandbox reset
+REPORT_FILE = ".vitest-results.json"
+
+# Keep the default reporter for the live build_progress lines
+REPORTER_ARGS = ["--reporter=default", "--reporter=json", f"--outputFile={REPORT_FILE}"]
+
+# vitest (Jest-compatible) assertion statuses -> record status
+STATUSES = {
+    "passed": "passed",
+    "failed": "failed",
+    "skipped": "skipped",
+    "pending": "skipped",
+    "todo": "skipped",
+}
+
+# Lines of each failure message kept in repair prompts
+FAILURE_MESSAGE_LINES = 20
+
+
+def load_report(path: Path) -> Optional[Dict[str, Any]]:
+    """The JSON report vitest wrote, or None if it is missing or unreadable"""
+    try:
+        report = json.loads(path.read_text())
+    except (OSError, ValueError) as e:
+        logger.info(f"No usable vitest report at {path}: {e}")
+        return None
+    return report if isinstance(report, dict) else None
+
+
+def _relative(filename: str, root: Optional[Path]) -> str:
+    if root is not None:
+        try:
+            return Path(filename).relative_to(root).as_posix()
+        except ValueError:
+            pass
+    return filename
+
+
+def parse_report(report: Dict[str, Any], root: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """One record per test; a file that fails to load becomes a single failed record"""
+
+    records: List[Dict[str, Any]] = []
+    for suite in report.get("testResults") or []:
+        filename = _relative(suite.get("name", ""), root)
+        assertions = suite.get("assertionResults") or []
+
+        for assertion in assertions:
+            title_path = [*(assertion.get("ancestorTitles") or []), assertion.get("title", "")]
+            failures = assertion.get("failureMessages") or []
+            records.append({
+                "name": " > ".join(title for title in title_path if title),
+                "file": filename,
+                "status": STATUSES.get(assertion.get("status"), "skipped"),
+                "duration": round(assertion.get("duration") or 0.0, 2),  # milliseconds
+                "failure_message": "\n".join(failures) or None,
+            })
+
+        if not assertions and suite.get("status") == "failed":
+            # Syntax or import error: vitest reports the file but runs no tests
+            started, ended = suite.get("startTime") or 0, suite.get("endTime") or 0
+            records.append({
+                "name": filename,
+                "file": filename,
+                "status": "failed",
+                "duration": round(max(ended - started, 0), 2),
+                "failure_message": suite.get("message") or "Test file failed to run",
+            })
+    return records
+
+
+def summarize(tests: List[Dict[str, Any]]) -> Dict[str, Any]:
+    passed = sum(1 for test in tests if test["status"] == "passed")
+    failed = sum(1 for test in tests if test["status"] == "failed")
+    return {
+        "passed": passed,
+        "failed": failed,
+        "skipped": len(tests) - passed - failed,
+        "total": len(tests),
+        "summary": f"{passed}/{len(tests)} tests passed",
+    }
+
+
+def format_failures(tests: List[Dict[str, Any]]) -> str:
+    """Failing tests and their messages, for the repair prompt"""
+    blocks = []
+    for test in tests:
+        if test["status"] != "failed":
+            continue
+        message = "\n".join((test.get("failure_message") or "").splitlines()[:FAILURE_MESSAGE_LINES])
+        blocks.append(f"FAIL {test['file']} > {test['name']}\n{message}".rstrip())
+    return "\n\n".join(blocks)
+
+
+def merge_results(previous: List[Dict[str, Any]], rerun: List[Dict[str, Any]], rerun_files: Set[str]) -> List[Dict[str, Any]]:
+    """Earlier records with those of the re-run test files replaced"""
+    return [test for test in previous if test["file"] not in rerun_files] + rerun
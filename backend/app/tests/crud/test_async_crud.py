@@ -0,0 +1,87 @@
+import asyncio
+import uuid
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import async_crud, crud
+from app.core.config import settings
+from app.models import AgentStage, Project, ProjectCreate, UserCreate
+from app.tests.utils.utils import random_email, random_lower_string
+
+
+def create_project(db: Session) -> Project:
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=random_email(), password=random_lower_string())
+    )
+    return crud.create_project(
+        session=db, project_create=ProjectCreate(name=random_lower_string()), owner_id=user.id
+    )
+
+
+def run_async(scenario) -> None:  # type: ignore[no-untyped-def]
+    # Pooled connections belong to the event loop that opened them; each test
+    # runs its own loop, so it gets an unpooled engine
+    async_engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI), poolclass=NullPool)
+
+    async def run() -> None:
+        try:
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                await scenario(session)
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_create_and_list_test_runs(db: Session) -> None:
+    project = create_project(db)
+
+    async def scenario(session: AsyncSession) -> None:
+        first = await async_crud.create_test_run(
+            session=session, project_id=project.id, current_stage=AgentStage.INTERPRET
+        )
+        second = await async_crud.create_test_run(session=session, project_id=project.id)
+
+        stored = await async_crud.get_test_run(session=session, test_run_id=first.id)
+        assert stored and stored.current_stage == AgentStage.INTERPRET
+        runs = await async_crud.get_test_runs_by_project(session=session, project_id=project.id)
+        assert {run.id for run in runs} == {first.id, second.id}
+        assert await async_crud.get_test_runs_by_project(session=session, project_id=uuid.uuid4()) == []
+
+    run_async(scenario)
+
+    # Visible to the sync engine as well
+    assert len(crud.get_test_runs_by_project(session=db, project_id=project.id)) == 2
+
+
+def test_get_project(db: Session) -> None:
+    project = create_project(db)
+
+    async def scenario(session: AsyncSession) -> None:
+        stored = await async_crud.get_project(session=session, project_id=project.id)
+        assert stored and stored.name == project.name
+        assert await async_crud.get_project(session=session, project_id=uuid.uuid4()) is None
+
+    run_async(scenario)
+
+
+def test_create_and_load_studio_observations(db: Session) -> None:
+    prompt_text = random_lower_string()
+
+    async def scenario(session: AsyncSession) -> None:
+        observation = await async_crud.create_studio_observation(
+            session=session,
+            prompt_hash=prompt_text[:64],
+            prompt_text=prompt_text,
+            prompt_signature=[1, 2, 3],
+            contract={"summary": prompt_text}
+        )
+        recent = await async_crud.get_recent_studio_observations(session=session, limit=1)
+        assert [o.id for o in recent] == [observation.id]
+        assert recent[0].contract == {"summary": prompt_text}
+        assert recent[0].prompt_signature == [1, 2, 3]
+
+    run_async(scenario)
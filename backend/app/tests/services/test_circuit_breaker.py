@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState
+
+
+def _fail(breaker: CircuitBreaker) -> None:
+    with pytest.raises(RuntimeError):
+        with breaker.guard():
+            raise RuntimeError("upstream 503")
+
+
+def _succeed(breaker: CircuitBreaker) -> None:
+    with breaker.guard():
+        pass
+
+
+def test_opens_on_error_rate_and_fails_fast() -> None:
+    breaker = CircuitBreaker("test", min_calls=4, error_rate_threshold=0.5, open_seconds=60)
+    _succeed(breaker)
+    _succeed(breaker)
+    _fail(breaker)
+    assert breaker.state == CircuitState.CLOSED
+    _fail(breaker)
+    assert breaker.state == CircuitState.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    assert breaker.get_stats()["rejected"] == 1
+
+
+def test_half_open_probe_closes_circuit() -> None:
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=0.01)
+    _fail(breaker)
+    assert breaker.state == CircuitState.OPEN
+    time.sleep(0.02)
+    assert breaker.state == CircuitState.HALF_OPEN
+
+    with breaker.guard():
+        # Only one probe at a time
+        assert breaker.is_open()
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_half_open_failure_reopens() -> None:
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=0.01)
+    _fail(breaker)
+    time.sleep(0.02)
+    _fail(breaker)
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.times_opened == 2
+
+
+def test_slow_calls_open_circuit() -> None:
+    breaker = CircuitBreaker("test", min_calls=2, slow_call_seconds=0.0, slow_call_rate_threshold=1.0)
+    _succeed(breaker)
+    _succeed(breaker)
+    assert breaker.state == CircuitState.OPEN
+
+
+def test_non_failures_are_ignored() -> None:
+    breaker = CircuitBreaker("test", min_calls=1, is_failure=lambda e: not isinstance(e, ValueError))
+    with pytest.raises(ValueError):
+        with breaker.guard():
+            raise ValueError("bad request")
+    assert breaker.state == CircuitState.CLOSED
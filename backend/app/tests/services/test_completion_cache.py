@@ -0,0 +1,141 @@
+import asyncio
+from pathlib import Path
+
+from app.services.completion_cache import (
+    CompletionCache,
+    DiskCacheTier,
+    LRUCacheTier,
+    make_cache_key,
+)
+
+
+def test_cache_key_is_order_independent() -> None:
+    a = make_cache_key({"model": "m", "temperature": 0.3, "messages": [{"role": "user", "content": "hi"}]})
+    b = make_cache_key({"messages": [{"role": "user", "content": "hi"}], "temperature": 0.3, "model": "m"})
+    c = make_cache_key({"model": "m", "temperature": 0.7, "messages": [{"role": "user", "content": "hi"}]})
+    assert a == b
+    assert a != c
+
+
+def test_lru_tier_evicts_by_size() -> None:
+    tier = LRUCacheTier(max_bytes=30)
+    tier.set("a", "x" * 10)
+    tier.set("b", "y" * 10)
+    assert tier.get("a") == "x" * 10  # "a" is now most recently used
+    tier.set("c", "z" * 10)
+    assert tier.get("b") is None
+    assert tier.get("a") is not None
+    assert tier.get("c") is not None
+    assert tier.current_bytes <= 30
+    assert tier.evictions == 1
+
+
+def test_cache_hit_skips_compute() -> None:
+    cache = CompletionCache(max_bytes=1024, ttl_seconds=60)
+    calls = 0
+
+    async def compute() -> str:
+        nonlocal calls
+        calls += 1
+        return "result"
+
+    async def run() -> None:
+        assert await cache.get_or_compute("k", compute) == "result"
+        assert await cache.get_or_compute("k", compute) == "result"
+
+    asyncio.run(run())
+    assert calls == 1
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_concurrent_identical_requests_are_coalesced() -> None:
+    cache = CompletionCache(max_bytes=1024, ttl_seconds=60)
+    calls = 0
+
+    async def compute() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run() -> list[str]:
+        return await asyncio.gather(*[cache.get_or_compute("k", compute) for _ in range(5)])
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert calls == 1
+    assert cache.get_stats()["coalesced"] == 4
+
+
+def test_failed_compute_is_not_cached() -> None:
+    cache = CompletionCache(max_bytes=1024, ttl_seconds=60)
+
+    async def fail() -> str:
+        raise RuntimeError("upstream error")
+
+    async def succeed() -> str:
+        return "ok"
+
+    async def run() -> str:
+        try:
+            await cache.get_or_compute("k", fail)
+        except RuntimeError:
+            pass
+        return await cache.get_or_compute("k", succeed)
+
+    assert asyncio.run(run()) == "ok"
+
+
+def test_follower_survives_a_cancelled_leader() -> None:
+    cache = CompletionCache(max_bytes=1024, ttl_seconds=60)
+    calls = 0
+
+    async def compute() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run() -> list[str]:
+        leader = asyncio.ensure_future(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(cache.get_or_compute("k", compute)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(run()) == ["result"] * 3
+    # The leader's call, then one call by the follower that took over
+    assert calls == 2
+
+
+def test_disk_tier_round_trip(tmp_path: Path) -> None:
+    tier = DiskCacheTier(str(tmp_path), ttl_seconds=60)
+    shared_cache = CompletionCache(max_bytes=1024, ttl_seconds=60, shared=tier)
+
+    async def compute() -> str:
+        return "from api"
+
+    async def run() -> str | None:
+        await shared_cache.get_or_compute("completion:abc", compute)
+        return await tier.get("completion:abc")
+
+    assert asyncio.run(run()) == "from api"
+
+
+def test_streamed_completion_is_stored_and_looked_up(tmp_path: Path) -> None:
+    tier = DiskCacheTier(str(tmp_path), ttl_seconds=60)
+    cache = CompletionCache(max_bytes=1024, ttl_seconds=60, shared=tier)
+    other_worker = CompletionCache(max_bytes=1024, ttl_seconds=60, shared=tier)
+
+    async def run() -> None:
+        assert await cache.lookup("k") is None
+        await cache.store("k", "streamed text")
+        assert await cache.lookup("k") == "streamed text"
+        assert await other_worker.lookup("k") == "streamed text"
+
+    asyncio.run(run())
+    assert cache.get_stats()["misses"] == 1
+    assert cache.get_stats()["hits"] == 1
+    assert other_worker.get_stats()["shared_hits"] == 1
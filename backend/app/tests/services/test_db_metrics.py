@@ -0,0 +1,65 @@
+import logging
+import threading
+import time
+
+import pytest
+from sqlalchemy import Engine, exc, text
+from sqlmodel import Session, create_engine
+
+from app.services.db_metrics import ConnectionMetrics, TimedQueuePool
+
+
+def make_engine(**options: object) -> Engine:
+    return create_engine(
+        "sqlite:///file:metrics?mode=memory&cache=shared&uri=true",
+        poolclass=TimedQueuePool,
+        connect_args={"check_same_thread": False},
+        **options,
+    )
+
+
+def test_checkouts_and_hold_times_are_measured(caplog: pytest.LogCaptureFixture) -> None:
+    engine = make_engine(pool_size=2, max_overflow=0)
+    metrics = ConnectionMetrics(hold_warning_seconds=0.05)
+    metrics.instrument(engine, "sync")
+    metrics.instrument(engine, "sync")  # Idempotent
+
+    with Session(engine) as session:
+        session.exec(text("SELECT 1"))
+        assert metrics.get_stats()["sync"]["in_use"] == 1
+        session.commit()  # Ends the transaction: connection goes back
+        assert metrics.get_stats()["sync"]["in_use"] == 0
+
+    with caplog.at_level(logging.WARNING, logger="app.services.db_metrics"):
+        with Session(engine) as session:
+            session.exec(text("SELECT 1"))
+            time.sleep(0.06)  # Transaction left open across slow work
+
+    stats = metrics.get_stats()["sync"]
+    assert stats["checkouts"] == 2
+    assert stats["connects"] == 1  # The pooled connection was reused
+    assert stats["in_use"] == 0
+    assert stats["size"] == 2
+    assert stats["long_holds"] == 1
+    assert stats["max_held_ms"] >= 60
+    assert "Database connection (sync) held for" in caplog.text
+
+
+def test_checkout_waits_and_timeouts_are_counted() -> None:
+    engine = make_engine(pool_size=1, max_overflow=0, pool_timeout=0.2)
+    metrics = ConnectionMetrics()
+    metrics.instrument(engine, "sync")
+
+    held = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()  # Pool exhausted
+
+    # A checkout that waits for the held connection to come back
+    threading.Timer(0.03, held.close).start()
+    with engine.connect():
+        pass
+
+    stats = metrics.get_stats()["sync"]
+    assert stats["timeouts"] == 1
+    assert stats["max_wait_ms"] >= 20
+    assert stats["checkouts"] == 2
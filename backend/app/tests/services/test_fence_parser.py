@@ -0,0 +1,95 @@
+from app.services.fence_parser import FenceParser, filename_from_info, parse_files
+
+RESPONSE = """Here is the app:
+
+```src/App.tsx
+import React from 'react';
+
+export default function App() {
+  return <div>Hello</div>;
+}
+```
+
+And the styles:
+
+```src/index.css
+body {
+  margin: 0;
+}
+```
+"""
+
+
+def feed_in_chunks(response: str, size: int) -> FenceParser:
+    parser = FenceParser()
+    for start in range(0, len(response), size):
+        parser.feed(response[start:start + size])
+    parser.close()
+    return parser
+
+
+def test_parses_filename_fences_like_the_buffered_parser() -> None:
+    files = parse_files(RESPONSE)
+    assert list(files) == ["src/App.tsx", "src/index.css"]
+    assert files["src/App.tsx"] == (
+        "import React from 'react';\n\nexport default function App() {\n  return <div>Hello</div>;\n}"
+    )
+    assert files["src/index.css"] == "body {\n  margin: 0;\n}"
+
+
+def test_chunk_boundaries_do_not_change_the_result() -> None:
+    expected = parse_files(RESPONSE)
+    for size in (1, 2, 3, 7, 64):
+        assert feed_in_chunks(RESPONSE, size).files == expected
+
+
+def test_crlf_line_endings() -> None:
+    assert parse_files("```src/x.ts\r\na\r\n```\r\n") == {"src/x.ts": "a"}
+
+    expected = parse_files(RESPONSE)
+    crlf = RESPONSE.replace("\n", "\r\n")
+    for size in (1, 2, 3, 7, 64):
+        # Some chunk boundaries fall between the \r and the \n
+        assert feed_in_chunks(crlf, size).files == expected
+
+
+def test_language_tagged_fences() -> None:
+    assert filename_from_info("tsx src/App.tsx") == "src/App.tsx"
+    assert filename_from_info("tsx:src/App.tsx") == "src/App.tsx"
+    assert filename_from_info('tsx title="src/App.tsx"') == "src/App.tsx"
+    assert filename_from_info("tsx") is None
+
+    response = (
+        "```tsx\n// src/main.tsx\nrender();\n```\n"
+        "```bash\nnpm install\n```\n"
+        "```json package.json\n{}\n```\n"
+    )
+    files = parse_files(response)
+    assert files == {"src/main.tsx": "// src/main.tsx\nrender();", "package.json": "{}"}
+
+
+def test_nested_fences_inside_markdown_files() -> None:
+    response = "```README.md\n# Demo\n\n```bash\nnpm test\n```\n\nDone.\n```\n"
+    assert parse_files(response) == {"README.md": "# Demo\n\n```bash\nnpm test\n```\n\nDone."}
+
+
+def test_streams_events_before_the_fence_closes() -> None:
+    parser = FenceParser()
+    events = parser.feed("```src/a.ts\nconst a")
+    assert [(e.type, e.text) for e in events] == [("file_start", ""), ("file_chunk", "const a")]
+
+    events = parser.feed(" = 1;\n``")
+    assert [e.text for e in events] == [" = 1;"]
+
+    events = parser.feed("`\n")
+    assert [(e.type, e.filename) for e in events] == [("file_closed", "src/a.ts")]
+    assert parser.files == {"src/a.ts": "const a = 1;"}
+
+
+def test_unterminated_file_is_reported_as_truncated() -> None:
+    parser = FenceParser()
+    parser.feed("```src/a.ts\nconst a = 1;\n")
+    events = parser.close()
+    assert events[-1].type == "file_closed"
+    assert events[-1].truncated
+    assert parser.files == {}
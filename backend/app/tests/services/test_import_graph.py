@@ -0,0 +1,51 @@
+from app.services.import_graph import ImportGraph
+
+FILES = {
+    "src/App.tsx": "import React from 'react'\nimport { Button } from './components/Button'\nimport './App.css'\n",
+    "src/App.css": ".app {}",
+    "src/components/Button.tsx": "import { cn } from '@/utils'\nexport const Button = () => null\n",
+    "src/components/Card.tsx": "export { Title } from './Title.js'\n",
+    "src/components/Title.tsx": "export const Title = () => null\n",
+    "src/utils/index.ts": "export const cn = (...c: string[]) => c.join(' ')\n",
+    "src/App.test.tsx": "import { render } from '@testing-library/react'\nimport App from './App'\n",
+    "src/Card.test.tsx": "const { Card } = require('./components/Card')\n",
+    "src/lazy.test.ts": "it('loads', async () => { await import('./utils') })\n",
+}
+TESTS = ["src/App.test.tsx", "src/Card.test.tsx", "src/lazy.test.ts"]
+
+
+def test_dependencies_resolve_relative_alias_and_index_imports() -> None:
+    graph = ImportGraph().dependencies(FILES)
+
+    assert graph["src/App.tsx"] == {"src/components/Button.tsx", "src/App.css"}
+    assert graph["src/components/Button.tsx"] == {"src/utils/index.ts"}
+    assert graph["src/components/Card.tsx"] == {"src/components/Title.tsx"}  # .js names the .tsx source
+    assert graph["src/App.test.tsx"] == {"src/App.tsx"}  # Packages are not part of the graph
+
+
+def test_affected_tests_follow_transitive_importers() -> None:
+    graph = ImportGraph()
+
+    assert graph.affected_tests(FILES, TESTS, {"src/utils/index.ts"}) == {"src/App.test.tsx", "src/lazy.test.ts"}
+    assert graph.affected_tests(FILES, TESTS, {"src/components/Title.tsx"}) == {"src/Card.test.tsx"}
+    assert graph.affected_tests(FILES, TESTS, {"src/App.css"}) == {"src/App.test.tsx"}
+    assert graph.affected_tests(FILES, TESTS, {"src/Card.test.tsx"}) == {"src/Card.test.tsx"}
+
+
+def test_untraceable_changes_need_the_whole_suite() -> None:
+    files = {**FILES, "package.json": "{}"}
+    assert ImportGraph().affected_tests(files, TESTS, {"package.json"}) is None
+
+
+def test_imports_are_cached_by_content() -> None:
+    modules = len([name for name in FILES if not name.endswith(".css")])
+    graph = ImportGraph()
+    graph.dependencies(FILES)
+    graph.dependencies({**FILES, "src/App.tsx": FILES["src/App.tsx"] + "import './extra'\n"})
+
+    # Only the edited file is parsed again
+    assert graph.get_stats() == {"entries": modules + 1, "hits": modules - 1, "misses": modules + 1}
+
+    bounded = ImportGraph(max_entries=2)
+    bounded.dependencies(FILES)
+    assert bounded.get_stats()["entries"] == 2
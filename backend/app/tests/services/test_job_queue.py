@@ -0,0 +1,176 @@
+import asyncio
+import uuid
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app.models import GenerationJob, JobStatus, StreamingMessage
+from app.services.job_queue import InMemoryJobQueue, ProgressBroker
+from app.services.job_worker import WorkerPool
+from app.services.run_events import InMemoryRunEventLog
+
+
+def make_job(**params: object) -> GenerationJob:
+    return GenerationJob(project_id=uuid.uuid4(), owner_id=uuid.uuid4(), params={"prompt": "a button", **params})
+
+
+async def fake_run(job: GenerationJob) -> AsyncIterator[StreamingMessage]:
+    yield StreamingMessage(type="stage_complete", content="Interpret done")
+    if job.params.get("hang"):
+        await asyncio.sleep(60)
+    if job.params.get("fail"):
+        yield StreamingMessage(type="build_error", content="Tests never passed")
+        return
+    yield StreamingMessage(type="build_ok", content="Done")
+
+
+async def follow(job: GenerationJob, pool: WorkerPool, cancel: bool = False) -> List[dict]:
+    async with pool.broker.subscribe(job.id) as progress:
+        await pool.queue.submit(job)
+        messages = []
+        async for message in progress:
+            messages.append(message)
+            if cancel and message["type"] == "stage_complete":
+                await pool.queue.cancel(job.id)
+        return messages
+
+
+def test_workers_run_jobs_and_publish_progress() -> None:
+    async def scenario() -> None:
+        pool = WorkerPool(InMemoryJobQueue(), ProgressBroker(), InMemoryRunEventLog(), fake_run, size=2, heartbeat_seconds=0.05)
+        await pool.start()
+        try:
+            ok, failed = make_job(), make_job(fail=True)
+            ok_messages, failed_messages = await asyncio.gather(follow(ok, pool), follow(failed, pool))
+        finally:
+            await pool.close()
+
+        assert [m["type"] for m in ok_messages] == ["job_status", "stage_complete", "build_ok", "job_status"]
+        assert ok_messages[-1]["data"]["status"] == "succeeded"
+        assert [m["seq"] for m in ok_messages] == [1, 2, 3, 4]
+        assert failed_messages[-1]["data"] == {
+            "job_id": str(failed.id), "status": "failed", "attempts": 1, "error": "Tests never passed"
+        }
+        assert pool.get_stats()["completed"] == 1
+        assert pool.get_stats()["failed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_job_stops_at_its_next_heartbeat() -> None:
+    async def scenario() -> None:
+        pool = WorkerPool(InMemoryJobQueue(), ProgressBroker(), InMemoryRunEventLog(), fake_run, size=1, heartbeat_seconds=0.05)
+        await pool.start()
+        try:
+            job = make_job(hang=True)
+            messages = await asyncio.wait_for(follow(job, pool, cancel=True), timeout=5)
+        finally:
+            await pool.close()
+
+        assert messages[-1]["data"]["status"] == "cancelled"
+        assert "build_ok" not in [m["type"] for m in messages]
+        assert job.status == JobStatus.CANCELLED
+        assert pool.get_stats()["cancelled"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_shutdown_puts_running_jobs_back_on_the_queue() -> None:
+    async def scenario() -> None:
+        queue = InMemoryJobQueue()
+        pool = WorkerPool(queue, ProgressBroker(), InMemoryRunEventLog(), fake_run, size=1, heartbeat_seconds=0.05)
+        job = await queue.submit(make_job(hang=True))
+        await pool.start()
+        while job.status != JobStatus.RUNNING:
+            await asyncio.sleep(0.01)
+        await pool.close()
+
+        assert job.status == JobStatus.QUEUED
+        assert job.attempts == 0
+        assert await queue.claim("another-worker") == (job, [])
+
+    asyncio.run(scenario())
+
+
+def test_worker_stops_a_job_whose_lease_was_reclaimed() -> None:
+    async def scenario() -> None:
+        queue = InMemoryJobQueue()
+        events = InMemoryRunEventLog(flush_interval=60)
+        pool = WorkerPool(queue, ProgressBroker(), events, fake_run, size=1, heartbeat_seconds=0.05)
+        job = await queue.submit(make_job(hang=True))
+        await pool.start()
+        try:
+            while job.status != JobStatus.RUNNING:
+                await asyncio.sleep(0.01)
+            # Its lease expired and another worker claimed it
+            job.worker_id = "another-worker"
+            while pool.running:
+                await asyncio.sleep(0.01)
+        finally:
+            await pool.close()
+
+        # Left running for the new worker, with no events of ours to clash with its own
+        assert job.status == JobStatus.RUNNING
+        assert await events.read(job.id) == []
+        assert pool.get_stats()["cancelled"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_jobs_are_announced() -> None:
+    class AbandoningQueue(InMemoryJobQueue):
+        def __init__(self, abandoned: GenerationJob) -> None:
+            super().__init__()
+            self.abandoned = [abandoned]
+
+        async def claim(self, worker_id: str) -> Tuple[Optional[GenerationJob], List[GenerationJob]]:
+            job, _ = await super().claim(worker_id)
+            abandoned, self.abandoned = self.abandoned, []
+            return job, abandoned
+
+    async def scenario() -> None:
+        job = make_job()
+        job.status = JobStatus.FAILED
+        job.attempts = 2
+        pool = WorkerPool(AbandoningQueue(job), ProgressBroker(), InMemoryRunEventLog(), fake_run, size=1, heartbeat_seconds=0.05)
+        async with pool.broker.subscribe(job.id) as progress:
+            await pool.start()
+            try:
+                message = await asyncio.wait_for(progress.__anext__(), timeout=5)
+            finally:
+                await pool.close()
+
+        assert message["data"]["status"] == "failed"
+        assert message["seq"] == 1
+        assert await pool.events.read(job.id) == [message]
+
+    asyncio.run(scenario())
+
+
+def test_worker_waits_for_a_job_whose_lease_was_reclaimed_to_stop() -> None:
+    stopped: List[str] = []
+
+    async def slow_to_stop(job: GenerationJob) -> AsyncIterator[StreamingMessage]:
+        yield StreamingMessage(type="stage_complete", content="Interpret done")
+        try:
+            await asyncio.sleep(60)
+        finally:
+            # E.g. a final write of the run's state
+            await asyncio.sleep(0.2)
+            stopped.append(str(job.id))
+
+    async def scenario() -> None:
+        queue = InMemoryJobQueue()
+        pool = WorkerPool(queue, ProgressBroker(), InMemoryRunEventLog(), slow_to_stop, size=1, heartbeat_seconds=0.05)
+        job = await queue.submit(make_job())
+        await pool.start()
+        try:
+            while job.status != JobStatus.RUNNING:
+                await asyncio.sleep(0.01)
+            job.worker_id = "another-worker"
+            while pool.running:
+                await asyncio.sleep(0.01)
+            # Nothing of the old run is still going once the worker moves on
+            assert stopped == [str(job.id)]
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+import asyncio
+
+from app.services.llm_governor import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    LLMGovernor,
+    TokenBucket,
+)
+
+
+def test_global_concurrency_is_bounded() -> None:
+    governor = LLMGovernor(max_concurrency=2, per_user_concurrency=10, tokens_per_minute=10**6)
+    active = 0
+    peak = 0
+
+    async def call(user: str) -> None:
+        nonlocal active, peak
+        async with governor.admit(10, user_id=user):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def run() -> None:
+        await asyncio.gather(*[call(f"user-{i}") for i in range(6)])
+
+    asyncio.run(run())
+    assert peak == 2
+    assert governor.get_stats()["admitted"] == 6
+
+
+def test_per_user_cap_does_not_block_other_users() -> None:
+    governor = LLMGovernor(max_concurrency=4, per_user_concurrency=1, tokens_per_minute=10**6)
+    order: list[str] = []
+
+    async def call(user: str, delay: float) -> None:
+        async with governor.admit(10, user_id=user):
+            order.append(user)
+            await asyncio.sleep(delay)
+
+    async def run() -> None:
+        await asyncio.gather(call("alice", 0.05), call("alice", 0.0), call("bob", 0.0))
+
+    asyncio.run(run())
+    assert order == ["alice", "bob", "alice"]
+
+
+def test_higher_priority_is_admitted_first() -> None:
+    governor = LLMGovernor(max_concurrency=1, per_user_concurrency=10, tokens_per_minute=10**6)
+    order: list[str] = []
+
+    async def call(name: str, priority: int) -> None:
+        async with governor.admit(10, priority=priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run() -> None:
+        first = asyncio.create_task(call("first", PRIORITY_BACKGROUND))
+        await asyncio.sleep(0)
+        await asyncio.gather(
+            call("background", PRIORITY_BACKGROUND),
+            call("interactive", PRIORITY_INTERACTIVE),
+        )
+        await first
+
+    asyncio.run(run())
+    assert order == ["first", "interactive", "background"]
+
+
+def test_token_bucket_reports_wait() -> None:
+    bucket = TokenBucket(tokens_per_minute=600)  # 10 tokens per second
+    assert bucket.time_until(600) == 0
+    bucket.consume(600)
+    assert 0.9 < bucket.time_until(10) <= 1.0
+
+
+def test_cancelled_waiter_releases_nothing() -> None:
+    governor = LLMGovernor(max_concurrency=1, per_user_concurrency=1, tokens_per_minute=10**6)
+
+    async def hold() -> None:
+        async with governor.admit(10):
+            await asyncio.sleep(0.05)
+
+    async def waiter() -> None:
+        async with governor.admit(10):
+            pass
+
+    async def run() -> None:
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await holder
+        async with governor.admit(10):
+            assert governor.get_stats()["active"] == 1
+
+    asyncio.run(run())
+    assert governor.get_stats()["active"] == 0
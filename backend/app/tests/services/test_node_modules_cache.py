@@ -0,0 +1,106 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from app.services import node_modules_cache as cache_module
+from app.services.node_modules_cache import (
+    InstallError,
+    NodeModulesCache,
+    dependency_key,
+    normalize_dependencies,
+)
+from app.services.process_runner import ProcessResult
+
+installs: List[Path] = []
+
+
+async def fake_npm_install(args: Any, cwd: Path, **kwargs: Any) -> ProcessResult:
+    installs.append(Path(cwd))
+    dependencies = json.loads((Path(cwd) / "package.json").read_text())["dependencies"]
+    for name in dependencies:
+        package = Path(cwd) / "node_modules" / name
+        package.mkdir(parents=True)
+        (package / "index.js").write_text("x" * 100)
+    return ProcessResult(args, 0, "", "", 0.0)
+
+
+@pytest.fixture(autouse=True)
+def fake_npm(monkeypatch: pytest.MonkeyPatch) -> None:
+    installs.clear()
+    monkeypatch.setattr(cache_module, "run_process", fake_npm_install)
+
+
+def test_equivalent_dependency_sets_share_a_key() -> None:
+    a = normalize_dependencies({"dependencies": {"React": "^18.0.0"}, "devDependencies": {"vitest": " ^1.0.0"}})
+    b = normalize_dependencies({"devDependencies": {"vitest": "^1.0.0", "react": "^18.0.0"}})
+    assert a == b
+    assert dependency_key(a) == dependency_key(b)
+    assert dependency_key(a) != dependency_key({"react": "^17.0.0", "vitest": "^1.0.0"})
+
+
+@pytest.mark.parametrize("link_mode", ["symlink", "hardlink"])
+def test_second_link_reuses_the_installed_tree(tmp_path: Path, link_mode: str) -> None:
+    cache = NodeModulesCache(directory=str(tmp_path / "cache"), link_mode=link_mode)
+    first, second = tmp_path / "a", tmp_path / "b"
+    first.mkdir()
+    second.mkdir()
+
+    async def run() -> None:
+        await cache.link({"react": "^18.0.0"}, first)
+        await cache.link({"react": "^18.0.0"}, second)
+
+    asyncio.run(run())
+    assert len(installs) == 1
+    assert (second / "node_modules" / "react" / "index.js").exists()
+    assert (second / "node_modules").is_symlink() == (link_mode == "symlink")
+    assert cache.get_stats()["hit_rate"] == 0.5
+
+
+def test_concurrent_links_install_once(tmp_path: Path) -> None:
+    cache = NodeModulesCache(directory=str(tmp_path / "cache"))
+    targets = [tmp_path / f"t{i}" for i in range(5)]
+    for target in targets:
+        target.mkdir()
+
+    async def run() -> None:
+        await asyncio.gather(*(cache.link({"zustand": "^4.0.0"}, target) for target in targets))
+
+    asyncio.run(run())
+    assert len(installs) == 1
+    assert all((target / "node_modules" / "zustand").exists() for target in targets)
+
+
+def test_eviction_by_size_skips_entries_in_use(tmp_path: Path) -> None:
+    # Each fake install is 100 bytes; room for two entries
+    cache = NodeModulesCache(directory=str(tmp_path / "cache"), max_bytes=250)
+    target = tmp_path / "sandbox"
+    target.mkdir()
+
+    async def run() -> None:
+        in_use = await cache.link({"a": "1"}, target)
+        (await cache.link({"b": "1"}, target)).release()
+        (await cache.link({"c": "1"}, target)).release()
+        # "a" is oldest but still leased, so "b" goes instead
+        assert (cache.directory / dependency_key({"a": "1"})).exists()
+        assert not (cache.directory / dependency_key({"b": "1"})).exists()
+        in_use.release()
+
+    asyncio.run(run())
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_failed_install_is_not_cached(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def failing_install(args: Any, cwd: Path, **kwargs: Any) -> ProcessResult:
+        return ProcessResult(args, 1, "", "ENOTCACHED", 0.0)
+
+    monkeypatch.setattr(cache_module, "run_process", failing_install)
+    cache = NodeModulesCache(directory=str(tmp_path / "cache"), offline=True, npm_cache_dir="/seed")
+    assert cache.npm_install_command()[-3:] == ["--cache", "/seed", "--offline"]
+
+    with pytest.raises(InstallError, match="ENOTCACHED"):
+        asyncio.run(cache.link({"a": "1"}, tmp_path))
+    assert cache.get_stats()["entries"] == 0
+    assert cache.get_stats()["install_failures"] == 1
@@ -0,0 +1,123 @@
+import pytest
+
+from app.services.patch_applier import (
+    PatchError,
+    apply_patch,
+    apply_patches,
+    apply_search_replace,
+    apply_unified_diff,
+    extract_patches,
+)
+
+BUTTON = """import React from 'react'
+
+export function Button({ label }: { label: string }) {
+  const handleClick = () => {
+    console.log('clicked')
+  }
+  return <button onClick={handleClick}>{label}</button>
+}
+"""
+
+
+def test_search_replace_edits_only_the_matched_lines() -> None:
+    patch = """<<<<<<< SEARCH
+  return <button onClick={handleClick}>{label}</button>
+=======
+  return <button type="button" onClick={handleClick}>{label}</button>
+>>>>>>> REPLACE
+"""
+    result = apply_search_replace(BUTTON, patch)
+    assert 'type="button"' in result
+    assert result.replace(' type="button"', "") == BUTTON
+
+
+def test_search_replace_tolerates_wrong_indentation_and_whitespace() -> None:
+    # Written without the function's indentation and with trailing spaces
+    patch = """<<<<<<< SEARCH
+const handleClick = () => {
+  console.log('clicked')
+}
+=======
+const handleClick = () => {
+  onClick?.()
+}
+>>>>>>> REPLACE
+"""
+    result = apply_search_replace(BUTTON, patch)
+    assert "  const handleClick = () => {\n    onClick?.()\n  }\n" in result
+
+
+def test_search_replace_matches_slightly_wrong_context_fuzzily() -> None:
+    patch = """<<<<<<< SEARCH
+  const handleClick = () => {
+    console.log("clicked")
+  }
+=======
+  const handleClick = () => onClick()
+>>>>>>> REPLACE
+"""
+    result = apply_search_replace(BUTTON, patch)
+    assert "console.log" not in result
+    assert "  const handleClick = () => onClick()\n  return" in result
+
+
+def test_unmatched_search_block_fails() -> None:
+    patch = "<<<<<<< SEARCH\nsomething else entirely\n=======\nx\n>>>>>>> REPLACE\n"
+    with pytest.raises(PatchError):
+        apply_search_replace(BUTTON, patch)
+
+
+def test_unified_diff_applies_hunks_with_drifted_line_numbers() -> None:
+    diff = """--- a/src/Button.tsx
++++ b/src/Button.tsx
+@@ -20,3 +20,3 @@
+   const handleClick = () => {
+-    console.log('clicked')
++    console.info('clicked')
+   }
+"""
+    result = apply_unified_diff(BUTTON, diff)
+    assert result == BUTTON.replace("console.log", "console.info")
+
+
+def test_plain_fence_content_is_a_whole_file() -> None:
+    assert apply_patch(BUTTON, "export const x = 1\n") == ("export const x = 1\n", "whole_file")
+    assert apply_patch(None, "<<<<<<< SEARCH\n=======\nnew file\n>>>>>>> REPLACE\n") == ("new file\n", "search_replace")
+
+
+def test_response_patches_are_applied_per_file() -> None:
+    response = """Fixing the click handler.
+
+```src/Button.tsx
+<<<<<<< SEARCH
+    console.log('clicked')
+=======
+    console.info('clicked')
+>>>>>>> REPLACE
+```
+
+```diff
+--- a/src/App.tsx
++++ b/src/App.tsx
+@@ -1,1 +1,1 @@
+-export default function App() { return null }
++export default function App() { return <Button label="Go" /> }
+```
+
+```src/missing.ts
+<<<<<<< SEARCH
+nothing like this
+=======
+x
+>>>>>>> REPLACE
+```
+"""
+    files = {"src/Button.tsx": BUTTON, "src/App.tsx": "export default function App() { return null }\n", "src/missing.ts": "y\n"}
+
+    result = apply_patches(files, extract_patches(response))
+
+    assert result.files["src/Button.tsx"] == BUTTON.replace("console.log", "console.info")
+    assert "<Button" in result.files["src/App.tsx"]
+    assert result.modes == {"src/Button.tsx": "search_replace", "src/App.tsx": "unified_diff"}
+    assert list(result.failed) == ["src/missing.ts"]
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import Engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models import PluginExecution, PluginManifest
+from app.services.plugin_system import PluginSystem
+
+
+def make_engine(*names: str) -> Engine:
+    """Database with a registered row per plugin name (scans then update them)"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine, tables=[PluginManifest.__table__, PluginExecution.__table__])
+    with Session(engine) as session:
+        for name in names:
+            session.add(PluginManifest(
+                name=name, version="0.0.1", description="", command=name,
+                installed_at=datetime.now(timezone.utc)
+            ))
+        session.commit()
+    return engine
+
+
+def bump_mtime(manifest_path: Path) -> None:
+    # Rewrites within the filesystem's timestamp granularity would look unchanged
+    stat = manifest_path.stat()
+    os.utime(manifest_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def write_manifest(plugins_dir: Path, name: str, description: str) -> Path:
+    plugin_dir = plugins_dir / name
+    plugin_dir.mkdir(exist_ok=True)
+    manifest_path = plugin_dir / "plugin.json"
+    manifest_path.write_text(json.dumps({
+        "name": name,
+        "version": "1.0.0",
+        "description": description,
+        "inputs": ["typescript"],
+        "outputs": ["typescript"],
+        "command": f"{name} --write",
+    }))
+    return manifest_path
+
+
+def test_catalog_is_serialized_once_until_a_manifest_changes(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        engine = make_engine("prettier", "eslint")
+        plugins = PluginSystem(tmp_path, engine=engine)
+        manifest_path = write_manifest(tmp_path, "prettier", "Code formatter")
+        write_manifest(tmp_path, "eslint", "Linter")
+
+        assert await plugins.refresh()
+        assert not await plugins.refresh()
+        assert plugins.rebuilds == 1
+        catalog = {p["name"]: p["description"] for p in json.loads(plugins.plugins_json)}
+        assert catalog == {"prettier": "Code formatter", "eslint": "Linter"}
+
+        write_manifest(tmp_path, "prettier", "Opinionated code formatter")
+        bump_mtime(manifest_path)
+
+        assert await plugins.refresh()
+        assert plugins.rebuilds == 2
+        catalog = {p["name"]: p["description"] for p in json.loads(plugins.plugins_json)}
+        assert catalog == {"prettier": "Opinionated code formatter", "eslint": "Linter"}
+
+    asyncio.run(scenario())
+
+
+def test_remove_rebuilds_the_catalog(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        engine = make_engine("prettier", "eslint")
+        plugins = PluginSystem(tmp_path, engine=engine)
+        write_manifest(tmp_path, "prettier", "Code formatter")
+        write_manifest(tmp_path, "eslint", "Linter")
+
+        await plugins.refresh()
+        await plugins.remove_plugin("eslint")
+
+        assert [t["name"] for t in json.loads(plugins.tools_json)] == ["prettier"]
+        assert not (tmp_path / "eslint").exists()
+
+    asyncio.run(scenario())
+
+
+def test_refresh_keeps_plugins_whose_manifest_is_missing(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        engine = make_engine("prettier", "eslint")
+        with Session(engine) as session:
+            eslint = session.exec(select(PluginManifest).where(PluginManifest.name == "eslint")).one()
+            session.add(PluginExecution(plugin_id=eslint.id, started_at=datetime.now(timezone.utc)))
+            session.commit()
+        plugins = PluginSystem(tmp_path, engine=engine)
+        write_manifest(tmp_path, "prettier", "Code formatter")
+        write_manifest(tmp_path, "eslint", "Linter")
+        await plugins.refresh()
+
+        # E.g. another instance, or a fresh checkout without the plugin
+        shutil.rmtree(tmp_path / "eslint")
+        assert await plugins.refresh()
+
+        assert sorted(p["name"] for p in json.loads(plugins.plugins_json)) == ["eslint", "prettier"]
+        with Session(engine) as session:
+            assert len(session.exec(select(PluginExecution)).all()) == 1
+
+    asyncio.run(scenario())
+
+
+def test_watcher_picks_up_new_manifests(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        engine = make_engine("prettier")
+        plugins = PluginSystem(tmp_path, engine=engine)
+        manifest_path = write_manifest(tmp_path, "prettier", "Code formatter")
+
+        await plugins.start(interval=0.01)
+        assert [t["description"] for t in json.loads(plugins.tools_json)] == ["Code formatter"]
+
+        write_manifest(tmp_path, "prettier", "Opinionated code formatter")
+        bump_mtime(manifest_path)
+        for _ in range(100):
+            if plugins.rebuilds > 1:
+                break
+            await asyncio.sleep(0.01)
+        await plugins.close()
+
+        assert [t["description"] for t in json.loads(plugins.tools_json)] == ["Opinionated code formatter"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+
+from app.services.process_runner import run_process
+
+
+def python(code: str) -> List[str]:
+    return [sys.executable, "-c", code]
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def wait_for_exit(pid: int) -> bool:
+    deadline = time.monotonic() + 3
+    while time.monotonic() < deadline:
+        if not pid_alive(pid):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+# Starts a grandchild that would outlive its parent, then hangs
+SPAWNS_GRANDCHILD = """
+import subprocess, sys, time
+child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+open(sys.argv[1], "w").write(str(child.pid))
+print("ready", flush=True)
+time.sleep(60)
+"""
+
+
+def test_lines_are_streamed_while_the_process_runs() -> None:
+    seen: List[Tuple[str, str, float]] = []
+    code = "import sys, time\nprint('one', flush=True)\nprint('oops', file=sys.stderr, flush=True)\ntime.sleep(0.3)\nprint('two')"
+
+    async def run() -> None:
+        started = time.monotonic()
+        result = await run_process(
+            python(code),
+            on_line=lambda stream, line: seen.append((stream, line, time.monotonic() - started))
+        )
+        assert result.returncode == 0
+        assert result.stdout == "one\ntwo\n"
+        assert result.stderr == "oops\n"
+
+    asyncio.run(run())
+    assert [(stream, line) for stream, line, _ in seen] == [("stdout", "one"), ("stderr", "oops"), ("stdout", "two")]
+    assert seen[0][2] < 0.25  # Arrived before the process finished
+
+
+def test_event_loop_keeps_running_during_a_process() -> None:
+    ticks = 0
+
+    async def ticker() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    async def run() -> None:
+        task = asyncio.create_task(ticker())
+        await run_process(python("import time; time.sleep(0.3)"))
+        task.cancel()
+
+    asyncio.run(run())
+    assert ticks >= 10
+
+
+def test_timeout_kills_the_whole_process_group(tmp_path: Path) -> None:
+    pid_file = tmp_path / "grandchild.pid"
+
+    with pytest.raises(subprocess.TimeoutExpired) as excinfo:
+        asyncio.run(run_process(python(SPAWNS_GRANDCHILD) + [str(pid_file)], timeout=1.0))
+
+    assert "ready" in excinfo.value.output
+    assert wait_for_exit(int(pid_file.read_text()))
+
+
+def test_cancellation_kills_the_process_group(tmp_path: Path) -> None:
+    pid_file = tmp_path / "grandchild.pid"
+
+    async def run() -> None:
+        task = asyncio.create_task(run_process(python(SPAWNS_GRANDCHILD) + [str(pid_file)]))
+        while not pid_file.exists() or not pid_file.read_text():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert wait_for_exit(int(pid_file.read_text()))
+
+
+def test_missing_executable_raises_os_error() -> None:
+    with pytest.raises(OSError):
+        asyncio.run(run_process(["ai-studio-no-such-binary"]))
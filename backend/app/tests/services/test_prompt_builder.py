@@ -0,0 +1,59 @@
+from app.services.prompt_builder import (
+    PromptBuilder,
+    compact_json,
+    count_tokens,
+    extract_failure_excerpts,
+    files_referenced_by,
+    truncate_lines,
+)
+
+
+def test_compact_json_has_no_padding() -> None:
+    assert compact_json({"a": [1, 2], "b": "x"}) == '{"a":[1,2],"b":"x"}'
+
+
+def test_truncate_lines_never_cuts_mid_line() -> None:
+    text = "\n".join(f"const value{i} = {i};" for i in range(200))
+    truncated = truncate_lines(text, budget=50)
+    assert count_tokens(truncated) <= 50
+    kept = truncated.split("\n")
+    assert kept[-1].endswith("more lines)")
+    for line in kept[:-1]:
+        assert line in text.split("\n")
+
+
+def test_builder_fills_budget_by_priority() -> None:
+    builder = PromptBuilder(budget=120)
+    builder.add("header", priority=0, truncatable=False)
+    builder.add("low priority\n" * 100, priority=2)
+    builder.add("failing test excerpt", priority=1)
+    prompt = builder.build()
+
+    assert prompt.startswith("header")
+    assert "failing test excerpt" in prompt
+    # Output keeps insertion order even though the budget was filled by priority
+    assert prompt.index("low priority") < prompt.index("failing test excerpt")
+    assert builder.tokens_used <= 120
+
+
+def test_builder_drops_sections_that_do_not_fit() -> None:
+    builder = PromptBuilder(budget=10)
+    builder.add("a fairly long section that cannot be truncated " * 5, priority=0, truncatable=False)
+    builder.add("short", priority=1)
+    assert builder.build() == "short"
+    assert builder.sections_dropped == 1
+
+
+def test_failure_excerpts_and_referenced_files() -> None:
+    output = "\n".join(
+        ["RUN v1.0.0"] + [f"noise {i}" for i in range(20)] + [
+            " FAIL  src/Counter.test.tsx > increments",
+            "AssertionError: expected 1 to be 2",
+        ] + [f"tail {i}" for i in range(20)]
+    )
+    excerpt = extract_failure_excerpts(output, context_lines=1)
+    assert "AssertionError" in excerpt
+    assert "noise 0" not in excerpt
+
+    files = ["src/App.tsx", "src/Counter.tsx", "src/Counter.test.tsx"]
+    assert files_referenced_by(excerpt, files) == ["src/Counter.tsx", "src/Counter.test.tsx"]
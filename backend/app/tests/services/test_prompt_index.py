@@ -0,0 +1,50 @@
+from app.services.prompt_index import PromptIndex, normalize_prompt
+
+
+def test_normalize_prompt_drops_stopwords_and_punctuation() -> None:
+    assert normalize_prompt("Build me a Todo app, with DARK mode!") == ["todo", "dark", "mode"]
+
+
+def test_reordered_prompt_reuses_contract() -> None:
+    index = PromptIndex()
+    contract = {"summary": "Todo list with dark mode"}
+    index.add("todo app with dark mode", contract, "owner")
+
+    match = index.query("dark mode todo app", threshold=0.8, scope="owner")
+    assert match is not None
+    assert match[0] == contract
+    assert match[1] >= 0.8
+
+
+def test_unrelated_prompt_does_not_match() -> None:
+    index = PromptIndex()
+    index.add("todo app with dark mode", {"summary": "todo"}, "owner")
+    assert index.query("weather dashboard with charts", threshold=0.8, scope="owner") is None
+
+
+def test_index_is_bounded() -> None:
+    index = PromptIndex(max_entries=2)
+    index.add("todo app", {"summary": "1"}, "owner")
+    index.add("weather dashboard", {"summary": "2"}, "owner")
+    index.add("recipe finder", {"summary": "3"}, "owner")
+    assert len(index) == 2
+    assert not index.contains("todo app", "owner")
+    assert index.query("todo app", threshold=0.8, scope="owner") is None
+
+
+def test_prompts_without_shingles_are_not_indexed() -> None:
+    index = PromptIndex()
+    # Nothing but stopwords: every such prompt would share one signature
+    index.add("build me an app", {"summary": "someone else's app"}, "owner")
+
+    assert len(index) == 0
+    assert index.signature("make it please") == []
+    assert index.query("make it please", threshold=0.8, scope="owner") is None
+
+
+def test_contracts_are_not_shared_across_scopes() -> None:
+    index = PromptIndex()
+    index.add("todo app with dark mode", {"summary": "todo"}, "alice")
+
+    assert index.query("dark mode todo app", threshold=0.8, scope="bob") is None
+    assert index.query("dark mode todo app", threshold=0.8, scope="alice") is not None
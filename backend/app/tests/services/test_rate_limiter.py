@@ -0,0 +1,90 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+from app.services.rate_limiter import RateLimiter
+
+
+class DownRedis:
+    """Client whose script calls fail, as when Redis is unreachable"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def register_script(self, script: str) -> Any:
+        async def run(keys: Any, args: Any) -> Any:
+            self.calls += 1
+            raise ConnectionError("Connection refused")
+        return run
+
+
+def test_charges_by_weight_within_the_burst() -> None:
+    async def scenario() -> None:
+        limiter = RateLimiter(limit=3600, period=3600.0, burst=1000)
+
+        first = await limiter.acquire("alice", 600)
+        assert first.allowed and first.remaining == pytest.approx(400, abs=1)
+        second = await limiter.acquire("alice", 600)
+        assert not second.allowed
+        # 200 more tokens at one per second
+        assert second.retry_after == pytest.approx(200, abs=1)
+        assert (await limiter.acquire("alice", 400)).allowed
+        # Other keys have their own allowance
+        assert (await limiter.acquire("bob", 1000)).allowed
+
+    asyncio.run(scenario())
+
+
+def test_allowance_refills_over_time() -> None:
+    async def scenario() -> None:
+        limiter = RateLimiter(limit=1000, period=1.0, burst=100)
+
+        assert (await limiter.acquire("alice", 100)).allowed
+        assert not (await limiter.acquire("alice", 50)).allowed
+        await asyncio.sleep(0.06)
+        assert (await limiter.acquire("alice", 50)).allowed
+        assert limiter.get_stats()["denied"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_requests_over_the_burst_cost_a_full_burst() -> None:
+    async def scenario() -> None:
+        limiter = RateLimiter(limit=3600, period=3600.0, burst=1000)
+
+        assert (await limiter.acquire("alice", 50000)).allowed
+        assert not (await limiter.acquire("alice", 1)).allowed
+
+    asyncio.run(scenario())
+
+
+def test_falls_back_to_in_process_limits_when_redis_is_down() -> None:
+    async def scenario() -> None:
+        client = DownRedis()
+        limiter = RateLimiter(limit=3600, period=3600.0, burst=1000, client=client)
+
+        assert (await limiter.acquire("alice", 1000)).allowed
+        assert not (await limiter.acquire("alice", 1000)).allowed
+        # Redis is not retried on every request
+        assert client.calls == 1
+        stats = limiter.get_stats()
+        assert stats["backend"] == "local" and stats["fallbacks"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_redis_script_is_atomic_under_concurrency() -> None:
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # Lua scripting in fakeredis
+
+    async def scenario() -> None:
+        limiter = RateLimiter(limit=3600, period=3600.0, burst=1000, client=fakeredis.FakeAsyncRedis())
+
+        results = await asyncio.gather(*(limiter.acquire("alice", 100) for _ in range(25)))
+        assert sum(result.allowed for result in results) == 10
+        denied = next(result for result in results if not result.allowed)
+        assert denied.retry_after == pytest.approx(100, abs=1)
+        assert limiter.get_stats()["fallbacks"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,107 @@
+import asyncio
+
+import httpx
+import openai
+
+from app.services.retry_policy import (
+    LatencyTracker,
+    RetryPolicy,
+    call_with_retries,
+    hedged,
+    parse_retry_after,
+)
+
+
+def _status_error(status: int, headers: dict[str, str] | None = None) -> openai.APIStatusError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    error_class = openai.RateLimitError if status == 429 else openai.InternalServerError
+    if status < 429:
+        error_class = openai.BadRequestError
+    return error_class("error", response=response, body=None)
+
+
+def test_retries_transient_errors_until_success() -> None:
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001)
+    attempts = 0
+
+    async def call() -> str:
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise _status_error(503)
+        return "ok"
+
+    assert asyncio.run(call_with_retries(policy, call)) == "ok"
+    assert attempts == 3
+
+
+def test_does_not_retry_client_errors() -> None:
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001)
+    attempts = 0
+
+    async def call() -> str:
+        nonlocal attempts
+        attempts += 1
+        raise _status_error(400)
+
+    try:
+        asyncio.run(call_with_retries(policy, call))
+    except openai.BadRequestError:
+        pass
+    assert attempts == 1
+
+
+def test_retry_after_header_is_honored() -> None:
+    assert parse_retry_after(_status_error(429, {"retry-after": "2"})) == 2.0
+    assert parse_retry_after(_status_error(429, {"retry-after-ms": "250"})) == 0.25
+    assert parse_retry_after(_status_error(429)) is None
+
+    policy = RetryPolicy(max_retry_after=1.0)
+    assert policy.delay_for(_status_error(429, {"retry-after": "30"}), attempt=1) == 1.0
+
+
+def test_backoff_is_bounded() -> None:
+    policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+    for attempt in range(1, 10):
+        assert 0 <= policy.backoff(attempt) <= 2.0
+
+
+def test_hedge_takes_faster_duplicate() -> None:
+    delays = [0.5, 0.01]
+    started = 0
+
+    async def call() -> str:
+        nonlocal started
+        delay = delays[started]
+        started += 1
+        await asyncio.sleep(delay)
+        return f"call-{started}"
+
+    async def run() -> str:
+        return await hedged(call, hedge_after=0.02)
+
+    assert asyncio.run(run()) == "call-2"
+    assert started == 2
+
+
+def test_no_hedge_when_primary_is_fast() -> None:
+    started = 0
+
+    async def call() -> str:
+        nonlocal started
+        started += 1
+        return "fast"
+
+    assert asyncio.run(hedged(call, hedge_after=0.5)) == "fast"
+    assert started == 1
+
+
+def test_latency_percentile_needs_samples() -> None:
+    tracker = LatencyTracker(min_samples=10)
+    for i in range(9):
+        tracker.record("scaffold", i / 100)
+    assert tracker.percentile("scaffold", 0.95) is None
+    for i in range(9, 100):
+        tracker.record("scaffold", i / 100)
+    assert tracker.percentile("scaffold", 0.95) == 0.95
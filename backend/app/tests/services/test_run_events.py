@@ -0,0 +1,95 @@
+import asyncio
+import uuid
+from typing import Any, AsyncIterator, Dict, List
+
+import pytest
+
+from app.services.run_events import InMemoryRunEventLog, RunEventLog
+
+JOB = uuid.uuid4()
+
+
+def token(seq: int) -> Dict[str, Any]:
+    return {"type": "token", "content": f"t{seq}", "seq": seq}
+
+
+def final(seq: int) -> Dict[str, Any]:
+    return {"type": "job_status", "content": "succeeded", "data": {"status": "succeeded"}, "seq": seq}
+
+
+async def live_from(messages: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    for message in messages:
+        yield message
+
+
+async def collect(events: AsyncIterator[Dict[str, Any]]) -> List[int]:
+    return [message["seq"] async for message in events]
+
+
+def test_appends_are_written_in_batches_and_readable_before() -> None:
+    async def scenario() -> None:
+        log = InMemoryRunEventLog(batch_size=3, flush_interval=60)
+        for seq in range(1, 5):
+            await log.append(JOB, seq, token(seq))
+
+        # One full batch written, one event still buffered, all readable
+        assert log.get_stats() == {"appended": 4, "batches": 1, "dropped": 0, "pending": 1}
+        assert [m["seq"] for m in await log.read(JOB, after=1)] == [2, 3, 4]
+        assert await log.last_seq(JOB) == 4
+        assert await log.last_seq(uuid.uuid4()) == 0
+
+        await log.flush()
+        assert log.get_stats()["pending"] == 0
+        assert [m["content"] for m in await log.read(JOB, after=2, before=4)] == ["t3"]
+
+    asyncio.run(scenario())
+
+
+def test_replay_sends_missed_events_then_live_ones_once() -> None:
+    async def scenario() -> None:
+        log = InMemoryRunEventLog()
+        for seq in range(1, 6):
+            await log.append(JOB, seq, token(seq))
+
+        # Live messages overlap the log (published before it was read)
+        live = live_from([token(4), token(5), token(6), final(7)])
+        assert await collect(log.replay(JOB, 2, live)) == [3, 4, 5, 6, 7]
+
+    asyncio.run(scenario())
+
+
+def test_replay_of_a_finished_run_stops_at_its_final_status() -> None:
+    async def scenario() -> None:
+        log = InMemoryRunEventLog()
+        await log.append(JOB, 1, token(1))
+        await log.append(JOB, 2, final(2))
+
+        assert await collect(log.replay(JOB, 0, live_from([token(3)]))) == [1, 2]
+        assert await collect(log.replay(JOB, 2, None)) == []
+
+    asyncio.run(scenario())
+
+
+def test_replay_fills_gaps_from_batches_written_later() -> None:
+    async def scenario() -> None:
+        # Another process's log: events 1-3 land only after live message 4 arrives
+        log = InMemoryRunEventLog(flush_interval=0.02)
+
+        async def written_late() -> None:
+            await asyncio.sleep(0.05)
+            await log._write([(JOB, seq, token(seq)) for seq in range(1, 4)])
+
+        writer = asyncio.create_task(written_late())
+        assert await collect(log.replay(JOB, 0, live_from([token(4), final(5)]))) == [1, 2, 3, 4, 5]
+        await writer
+
+    asyncio.run(scenario())
+
+
+def test_incomplete_event_log_fails_at_construction() -> None:
+    class WriteOnlyLog(RunEventLog):
+        async def _write(self, batch: Any) -> None:
+            pass
+
+    with pytest.raises(TypeError):
+        WriteOnlyLog()  # type: ignore[abstract]
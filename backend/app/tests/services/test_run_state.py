@@ -0,0 +1,94 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+from sqlalchemy import Engine, event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.models import AgentStage, TestRun
+from app.services.run_state import RunState
+
+
+def make_run() -> Tuple[Engine, TestRun, List[str]]:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine, tables=[TestRun.__table__])
+    updates: List[str] = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany) -> None:  # type: ignore[no-untyped-def]
+        if statement.startswith("UPDATE"):
+            updates.append(statement)
+
+    with Session(engine) as session:
+        run = TestRun(project_id=uuid.uuid4(), created_at=datetime.now(timezone.utc))
+        session.add(run)
+        session.commit()
+        session.refresh(run)
+        session.expunge(run)
+    return engine, run, updates
+
+
+def stored(engine: Engine, run_id: uuid.UUID) -> TestRun:
+    with Session(engine) as session:
+        return session.get(TestRun, run_id)
+
+
+def test_changes_are_coalesced_into_one_update_of_dirty_columns() -> None:
+    async def scenario() -> None:
+        engine, record, updates = make_run()
+        state = RunState(record, engine, flush_interval=60)
+
+        state.test_files = {"src/App.test.tsx": "v1"}
+        state.test_files = {"src/App.test.tsx": "v2"}
+        state.repair_attempts += 1
+        assert state.repair_attempts == 1
+        assert updates == []  # Nothing written yet
+
+        await state.close()
+
+        assert len(updates) == 1
+        assert "test_files" in updates[0] and "repair_attempts" in updates[0]
+        assert "scaffold_files" not in updates[0] and "current_stage" not in updates[0]
+        saved = stored(engine, record.id)
+        assert saved.test_files == {"src/App.test.tsx": "v2"}
+        assert saved.repair_attempts == 1
+
+    asyncio.run(scenario())
+
+
+def test_stage_change_flushes_without_waiting_for_the_interval() -> None:
+    async def scenario() -> None:
+        engine, record, updates = make_run()
+        state = RunState(record, engine, flush_interval=60)
+
+        state.scaffold_files = {"src/App.tsx": "export default 1"}
+        state.current_stage = AgentStage.EXECUTE
+        assert updates == []  # Written in the background
+        for _ in range(100):
+            if updates:
+                break
+            await asyncio.sleep(0.01)
+
+        saved = stored(engine, record.id)
+        assert saved.current_stage == AgentStage.EXECUTE
+        assert saved.scaffold_files == {"src/App.tsx": "export default 1"}
+        await state.close()
+        assert len(updates) == 1
+
+    asyncio.run(scenario())
+
+
+def test_interval_flushes_changes_made_between_stages() -> None:
+    async def scenario() -> None:
+        engine, record, updates = make_run()
+        state = RunState(record, engine, flush_interval=0.01)
+
+        state.success = True
+        await asyncio.sleep(0.2)
+
+        assert stored(engine, record.id).success is True
+        assert state.flushes == 1
+
+    asyncio.run(scenario())
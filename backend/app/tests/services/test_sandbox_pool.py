@@ -0,0 +1,94 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.services import node_modules_cache as cache_module
+from app.services import sandbox_pool as sandbox_pool_module
+from app.services.node_modules_cache import NodeModulesCache
+from app.services.process_runner import ProcessResult
+from app.services.sandbox_pool import (
+    BASE_DEPENDENCIES,
+    Sandbox,
+    SandboxPool,
+    sandbox_dependencies,
+    write_base_files,
+)
+
+
+async def fake_npm_install(args: Any, cwd: Path, **kwargs: Any) -> ProcessResult:
+    (Path(cwd) / "node_modules" / "vitest").mkdir(parents=True)
+    return ProcessResult(args, 0, "", "", 0.0)
+
+
+@pytest.fixture(autouse=True)
+def node_modules_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> NodeModulesCache:
+    cache = NodeModulesCache(directory=str(tmp_path / "node-modules-cache"))
+    monkeypatch.setattr(cache_module, "run_process", fake_npm_install)
+    monkeypatch.setattr(sandbox_pool_module, "node_modules_cache", cache)
+    return cache
+
+
+def test_reset_keeps_toolchain_and_removes_generated_files(tmp_path: Path) -> None:
+    write_base_files(tmp_path)
+    (tmp_path / "node_modules" / "vitest").mkdir(parents=True)
+    sandbox = Sandbox(tmp_path)
+    sandbox.write_files({"src/App.tsx": "x", "package.json": "{}"})
+
+    sandbox.reset()
+
+    assert not (tmp_path / "src").exists()
+    assert (tmp_path / "node_modules" / "vitest").exists()
+    assert "vitest" in (tmp_path / "package.json").read_text()
+
+
+def test_files_cannot_escape_the_sandbox(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        Sandbox(tmp_path).write_files({"../outside.ts": "x"})
+
+
+def test_sandbox_dependencies_keep_the_base_toolchain_versions() -> None:
+    package_json = {"dependencies": {"react": "^18.2.0", "zustand": "^4.0.0"}, "devDependencies": {"vitest": "^1.0.0"}}
+    assert sandbox_dependencies(package_json) == {**BASE_DEPENDENCIES, "zustand": "^4.0.0"}
+    assert sandbox_dependencies({"dependencies": {"react": "^18.2.0"}}) == BASE_DEPENDENCIES
+
+
+def test_pool_serves_warm_sandboxes_and_recycles_them(tmp_path: Path) -> None:
+    pool = SandboxPool(size=1, root=str(tmp_path / "sandboxes"))
+
+    async def run() -> None:
+        await pool.start()
+        while not pool.get_stats()["idle"]:
+            await asyncio.sleep(0.01)
+
+        async with pool.lease() as sandbox:
+            assert not sandbox.dirty
+            sandbox.write_files({"src/App.tsx": "x"})
+
+        await asyncio.sleep(0.05)
+        async with pool.lease() as sandbox:
+            assert not (sandbox.path / "src").exists()
+        await pool.close()
+
+    asyncio.run(run())
+    stats = pool.get_stats()
+    assert stats["warm_hit_rate"] == 1.0
+    assert stats["recycled"] >= 1
+
+
+def test_sandboxes_with_extra_dependencies_are_discarded(tmp_path: Path, node_modules_cache: NodeModulesCache) -> None:
+    pool = SandboxPool(size=1, root=str(tmp_path / "sandboxes"))
+
+    async def run() -> Path:
+        async with pool.lease() as sandbox:
+            await pool.use_dependencies(sandbox, {**BASE_DEPENDENCIES, "zustand": "^4.0.0"})
+            assert sandbox.dirty
+            path = sandbox.path
+        await asyncio.sleep(0.05)
+        await pool.close()
+        return path
+
+    assert not asyncio.run(run()).exists()
+    assert pool.get_stats()["discarded"] == 1
+    assert node_modules_cache.get_stats()["entries"] == 2
@@ -0,0 +1,91 @@
+import asyncio
+import time
+from typing import Any, Callable, List
+
+import pytest
+
+from app.services.stage_graph import StageGraph
+
+
+def collect(graph: StageGraph) -> List[Any]:
+    async def run() -> List[Any]:
+        return [message async for message in graph.run()]
+
+    return asyncio.run(run())
+
+
+def test_independent_stages_overlap() -> None:
+    graph = StageGraph()
+
+    def sleeper(name: str) -> Callable:
+        async def run(emit: Callable) -> str:
+            await asyncio.sleep(0.1)
+            return name
+        return run
+
+    graph.add("a", sleeper("a"))
+    graph.add("b", sleeper("b"))
+    graph.add("c", sleeper("c"), after=["a", "b"])
+
+    started = time.monotonic()
+    collect(graph)
+    elapsed = time.monotonic() - started
+
+    assert graph.results == {"a": "a", "b": "b", "c": "c"}
+    assert elapsed < 0.28  # a and b ran together
+    assert graph.timings["c"] >= graph.timings["a"]
+
+
+def test_messages_are_released_in_stage_order() -> None:
+    graph = StageGraph()
+
+    async def slow(emit: Callable) -> None:
+        emit("slow:start")
+        await asyncio.sleep(0.05)
+        emit("slow:end")
+
+    async def fast(emit: Callable) -> None:
+        emit("fast:start")
+        emit("fast:end")
+
+    async def last(emit: Callable) -> None:
+        emit("last")
+
+    graph.add("slow", slow)
+    graph.add("fast", fast)
+    graph.add("last", last, after=["fast"])
+
+    assert collect(graph) == ["slow:start", "slow:end", "fast:start", "fast:end", "last"]
+
+
+def test_stage_failure_is_raised_in_order() -> None:
+    graph = StageGraph()
+
+    async def ok(emit: Callable) -> None:
+        emit("ok")
+
+    async def broken(emit: Callable) -> None:
+        raise RuntimeError("boom")
+
+    async def dependent(emit: Callable) -> None:
+        emit("never")
+
+    graph.add("ok", ok)
+    graph.add("broken", broken)
+    graph.add("dependent", dependent, after=["broken"])
+
+    seen: List[Any] = []
+
+    async def run() -> None:
+        async for message in graph.run():
+            seen.append(message)
+
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(run())
+    assert seen == ["ok"]
+
+
+def test_dependencies_must_exist() -> None:
+    graph = StageGraph()
+    with pytest.raises(ValueError):
+        graph.add("a", lambda emit: asyncio.sleep(0), after=["missing"])
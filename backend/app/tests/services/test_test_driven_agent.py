@@ -0,0 +1,314 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+# The shared OpenAI client needs a key at import; no requests are made
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from app.services import test_driven_agent as agent_module  # noqa: E402
+from app.services.completion_cache import CompletionCache  # noqa: E402
+from app.services.prompt_index import PromptIndex  # noqa: E402
+from app.services.test_driven_agent import TestDrivenAgent  # noqa: E402
+
+
+def test_interpret_continues_when_the_prompt_index_cannot_load(monkeypatch: pytest.MonkeyPatch) -> None:
+    index = PromptIndex()
+
+    async def failing_load(session: Any) -> None:
+        raise ConnectionError("database is down")
+
+    async def completion(**kwargs: Any) -> str:
+        return json.dumps({"summary": "Todo app"})
+
+    monkeypatch.setattr(index, "load", failing_load)
+    monkeypatch.setattr(agent_module, "prompt_index", index)
+    monkeypatch.setattr(agent_module.openai_service, "generate_completion", completion)
+
+    contract = asyncio.run(TestDrivenAgent()._interpret_prompt("todo app", None, "owner"))
+
+    assert contract == {"summary": "Todo app"}
+    # Retried by the next run
+    assert not index.loaded
+
+
+def test_repair_candidates_cannot_edit_the_tests(monkeypatch: pytest.MonkeyPatch) -> None:
+    files = {"src/App.tsx": "export default 1"}
+    test_files = {"src/App.test.tsx": "expect(1).toBe(2)"}
+    repairs = [
+        {"src/App.test.tsx": "expect(1).toBe(1)"},
+        {"src/App.test.tsx": "expect(1).toBe(1)", "src/App.tsx": "export default 2"},
+    ]
+    reruns = []
+
+    async def repair_code(*args: Any, **kwargs: Any) -> Any:
+        return repairs.pop(0), {}
+
+    async def rerun_tests(candidate_files: Any, candidate_tests: Any, changed: Any, *args: Any) -> Any:
+        reruns.append((candidate_files, candidate_tests, changed))
+        return {"all_passed": True, "passed": 1}
+
+    agent = TestDrivenAgent()
+    monkeypatch.setattr(agent_module.settings, "REPAIR_CANDIDATES", 1)
+    monkeypatch.setattr(agent, "_repair_code", repair_code)
+    monkeypatch.setattr(agent, "_rerun_tests", rerun_tests)
+
+    async def scenario() -> Any:
+        deadline = asyncio.get_running_loop().time() + 60
+        return await agent._repair_round(files, test_files, {"all_passed": False}, {}, None, deadline)
+
+    # Weakening the assertion alone is no repair at all
+    assert asyncio.run(scenario()) is None
+    assert reruns == []
+
+    # Alongside a real fix, the test edit is dropped and the original tests judge it
+    candidate_files, results = asyncio.run(scenario())
+    assert reruns == [({"src/App.tsx": "export default 2"}, test_files, {"src/App.tsx"})]
+    assert candidate_files == {"src/App.tsx": "export default 2"}
+
+
+def test_repair_drops_edits_to_test_files(monkeypatch: pytest.MonkeyPatch) -> None:
+    response = """```src/App.test.tsx
+<<<<<<< SEARCH
+expect(1).toBe(2)
+=======
+expect(1).toBe(1)
+>>>>>>> REPLACE
+```
+```src/App.tsx
+<<<<<<< SEARCH
+export default 1
+=======
+export default 2
+>>>>>>> REPLACE
+```
+"""
+
+    async def completion(**kwargs: Any) -> str:
+        return response
+
+    monkeypatch.setattr(agent_module.openai_service, "generate_completion", completion)
+
+    repaired_files, stats = asyncio.run(TestDrivenAgent()._repair_code(
+        {"src/App.tsx": "export default 1\n"}, {"src/App.test.tsx": "expect(1).toBe(2)\n"},
+        {"all_passed": False, "output": "expected 1 to be 2"}, {}, None
+    ))
+
+    assert repaired_files == {"src/App.tsx": "export default 2\n"}
+    assert stats["rejected_test_edits"] == ["src/App.test.tsx"]
+    assert stats["fallback_files"] == []
+
+
+def race_repairs(
+    monkeypatch: pytest.MonkeyPatch, outcomes: Dict[float, Tuple[float, Dict[str, Any]]], budget: float = 60
+) -> Tuple[Any, List[float]]:
+    """Run a repair round whose candidate at each temperature takes (delay, results)"""
+    cancelled: List[float] = []
+
+    async def repair_code(*args: Any, temperature: float, **kwargs: Any) -> Any:
+        return {"src/App.tsx": f"// repaired at {temperature}"}, {"temperature": temperature}
+
+    async def rerun_tests(candidate_files: Any, *args: Any) -> Any:
+        temperature = float(candidate_files["src/App.tsx"].rsplit(" ", 1)[1])
+        delay, results = outcomes[temperature]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(temperature)
+            raise
+        return results
+
+    agent = TestDrivenAgent()
+    monkeypatch.setattr(agent_module.settings, "REPAIR_CANDIDATES", len(outcomes))
+    monkeypatch.setattr(agent_module.settings, "REPAIR_TEMPERATURES", list(outcomes))
+    monkeypatch.setattr(agent, "_repair_code", repair_code)
+    monkeypatch.setattr(agent, "_rerun_tests", rerun_tests)
+
+    async def scenario() -> Any:
+        deadline = asyncio.get_running_loop().time() + budget
+        return await agent._repair_round(
+            {"src/App.tsx": "broken"}, {"src/App.test.tsx": "test"}, {"all_passed": False}, {}, None, deadline
+        )
+
+    return asyncio.run(scenario()), cancelled
+
+
+def test_first_passing_repair_candidate_wins_and_cancels_the_rest(monkeypatch: pytest.MonkeyPatch) -> None:
+    outcome, cancelled = race_repairs(monkeypatch, {
+        0.2: (30, {"all_passed": True, "passed": 3}),
+        0.5: (0.01, {"all_passed": True, "passed": 3}),
+        0.8: (30, {"all_passed": False, "passed": 1}),
+    })
+
+    files, results = outcome
+    assert files["src/App.tsx"] == "// repaired at 0.5"
+    assert results["repair"] == {"temperature": 0.5}
+    assert sorted(cancelled) == [0.2, 0.8]
+
+
+def test_best_failing_repair_candidate_is_chosen(monkeypatch: pytest.MonkeyPatch) -> None:
+    outcome, cancelled = race_repairs(monkeypatch, {
+        0.2: (0.01, {"all_passed": False, "passed": 1}),
+        # More passes, but the run itself failed
+        0.5: (0.02, {"all_passed": False, "passed": 5, "error": "timed out"}),
+        0.8: (0.03, {"all_passed": False, "passed": 2}),
+    })
+
+    files, results = outcome
+    assert files["src/App.tsx"] == "// repaired at 0.8"
+    assert results["passed"] == 2
+    assert cancelled == []
+
+
+def test_repair_budget_settles_for_the_best_finished_candidate(monkeypatch: pytest.MonkeyPatch) -> None:
+    outcome, cancelled = race_repairs(monkeypatch, {
+        0.2: (0.01, {"all_passed": False, "passed": 1}),
+        0.5: (30, {"all_passed": True, "passed": 3}),
+        0.8: (30, {"all_passed": True, "passed": 3}),
+    }, budget=0.2)
+
+    files, results = outcome
+    assert files["src/App.tsx"] == "// repaired at 0.2"
+    assert sorted(cancelled) == [0.5, 0.8]
+
+
+def caching_agent(monkeypatch: pytest.MonkeyPatch, results: Dict[str, Any]) -> Tuple[TestDrivenAgent, List[Any]]:
+    """Agent with an in-process test cache whose runs are recorded, not executed"""
+    runs: List[Any] = []
+
+    async def run_tests(files: Any, test_files: Any, emit: Any = None, only: Any = None) -> Dict[str, Any]:
+        runs.append((dict(files), dict(test_files), only))
+        return dict(results)
+
+    agent = TestDrivenAgent()
+    agent.test_cache = CompletionCache(max_bytes=1 << 20, ttl_seconds=60)
+    monkeypatch.setattr(agent, "_run_tests", run_tests)
+    return agent, runs
+
+
+FILES = {"src/App.tsx": "export default () => null"}
+TESTS = {"src/App.test.tsx": "it('renders', () => {})"}
+
+
+def test_identical_workspace_reuses_test_results(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent, runs = caching_agent(monkeypatch, {"all_passed": True, "passed": 1})
+
+    async def scenario() -> None:
+        first = await agent._execute_tests(FILES, TESTS, None)
+        second = await agent._execute_tests(dict(FILES), dict(TESTS), None)
+
+        assert "cached" not in first
+        assert second == {"all_passed": True, "passed": 1, "cached": True}
+        assert len(runs) == 1
+
+    asyncio.run(scenario())
+
+
+def test_any_change_to_the_workspace_misses_the_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent, runs = caching_agent(monkeypatch, {"all_passed": False, "passed": 0})
+
+    async def scenario() -> None:
+        await agent._execute_tests(FILES, TESTS, None)
+        await agent._execute_tests({"src/App.tsx": "export default () => 1"}, TESTS, None)
+        await agent._execute_tests(FILES, {"src/App.test.tsx": "it('renders twice', () => {})"}, None)
+        await agent._execute_tests(FILES, TESTS, None, only={"src/App.test.tsx"})
+        monkeypatch.setattr(agent_module, "VITEST_CONFIG", agent_module.VITEST_CONFIG + "\n// changed")
+        await agent._execute_tests(FILES, TESTS, None)
+
+        assert len(runs) == 5
+
+    asyncio.run(scenario())
+
+
+def test_failed_test_runs_are_not_cached(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent, runs = caching_agent(monkeypatch, {"all_passed": False, "error": "npm install failed"})
+
+    async def scenario() -> None:
+        await agent._execute_tests(FILES, TESTS, None)
+        second = await agent._execute_tests(FILES, TESTS, None)
+
+        assert "cached" not in second
+        assert len(runs) == 2
+
+    asyncio.run(scenario())
+
+
+def shown_files(messages: List[Any]) -> Dict[str, str]:
+    """What the client ends up showing, applying token messages like the frontend"""
+    files: Dict[str, str] = {}
+    for message in messages:
+        if message.type == "token" and message.filename:
+            previous = "" if message.stream_metadata.get("file_start") else files.get(message.filename, "")
+            files[message.filename] = previous + (message.content or "")
+    return files
+
+
+def test_repair_streams_files_under_the_default_config(monkeypatch: pytest.MonkeyPatch) -> None:
+    messages: List[Any] = []
+    shown_at_rerun: List[Dict[str, str]] = []
+
+    async def completion(**kwargs: Any) -> str:
+        return "```src/App.tsx\n<<<<<<< SEARCH\nexport default 1\n=======\nexport default 2\n>>>>>>> REPLACE\n```\n"
+
+    async def rerun_tests(*args: Any) -> Any:
+        shown_at_rerun.append(shown_files(messages))
+        await asyncio.sleep(0.01)
+        return {"all_passed": True, "passed": 1}
+
+    agent = TestDrivenAgent()
+    monkeypatch.setattr(agent_module.openai_service, "generate_completion", completion)
+    monkeypatch.setattr(agent, "_rerun_tests", rerun_tests)
+
+    async def scenario() -> Any:
+        deadline = asyncio.get_running_loop().time() + 60
+        return await agent._repair_round(
+            {"src/App.tsx": "export default 1\n"}, {"src/App.test.tsx": "test"},
+            {"all_passed": False, "output": "expected 2"}, {}, None, deadline, messages.append
+        )
+
+    assert agent_module.settings.REPAIR_CANDIDATES > 1
+    files, results = asyncio.run(scenario())
+
+    # Shown before its tests ran, not only once a winner was chosen
+    assert shown_at_rerun[0] == {"src/App.tsx": "export default 2\n"}
+    assert shown_files(messages) == files == {"src/App.tsx": "export default 2\n"}
+
+
+def test_streamed_files_of_a_losing_leader_are_replaced(monkeypatch: pytest.MonkeyPatch) -> None:
+    messages: List[Any] = []
+    agent = TestDrivenAgent()
+
+    async def repair_code(*args: Any, temperature: float, **kwargs: Any) -> Any:
+        emit = args[5]
+        repaired = (
+            {"src/App.tsx": "// leader", "src/util.ts": "// leader"} if temperature == 0.2
+            else {"src/App.tsx": f"// repaired at {temperature}"}
+        )
+        if emit:
+            agent._announce_files(repaired, agent_module.AgentStage.REPAIR, emit)
+        return repaired, {}
+
+    async def rerun_tests(candidate_files: Any, *args: Any) -> Any:
+        if candidate_files["src/App.tsx"] == "// leader":
+            return {"all_passed": False, "passed": 0}
+        await asyncio.sleep(0.01)
+        return {"all_passed": True, "passed": 1}
+
+    monkeypatch.setattr(agent_module.settings, "REPAIR_CANDIDATES", 2)
+    monkeypatch.setattr(agent_module.settings, "REPAIR_TEMPERATURES", [0.2, 0.5])
+    monkeypatch.setattr(agent, "_repair_code", repair_code)
+    monkeypatch.setattr(agent, "_rerun_tests", rerun_tests)
+
+    async def scenario() -> Any:
+        deadline = asyncio.get_running_loop().time() + 60
+        return await agent._repair_round(
+            {"src/App.tsx": "broken", "src/util.ts": "util"}, {"src/App.test.tsx": "test"},
+            {"all_passed": False}, {}, None, deadline, messages.append
+        )
+
+    files, _ = asyncio.run(scenario())
+
+    assert files == {"src/App.tsx": "// repaired at 0.5", "src/util.ts": "util"}
+    assert shown_files(messages) == files
@@ -0,0 +1,96 @@
+import json
+from pathlib import Path
+
+from app.services.vitest_results import format_failures, load_report, merge_results, parse_report, summarize
+
+ROOT = Path("/sandbox")
+
+REPORT = {
+    "numTotalTests": 4,
+    "success": False,
+    "testResults": [
+        {
+            "name": "/sandbox/src/Button.test.tsx",
+            "status": "failed",
+            "startTime": 1000,
+            "endTime": 1040,
+            "assertionResults": [
+                {
+                    "ancestorTitles": ["Button"],
+                    "title": "renders its label",
+                    "status": "passed",
+                    "duration": 12.3456,
+                    "failureMessages": [],
+                },
+                {
+                    "ancestorTitles": ["Button", "when disabled"],
+                    "title": "ignores clicks",
+                    "status": "failed",
+                    "duration": 8,
+                    "failureMessages": ["AssertionError: expected 1 to be +0\n    at src/Button.test.tsx:14:5"],
+                },
+                {
+                    "ancestorTitles": ["Button"],
+                    "title": "supports icons",
+                    "status": "todo",
+                    "duration": None,
+                    "failureMessages": [],
+                },
+            ],
+        },
+        {
+            "name": "/sandbox/src/Broken.test.tsx",
+            "status": "failed",
+            "message": "Failed to resolve import \"./Missing\"",
+            "startTime": 1000,
+            "endTime": 1005,
+            "assertionResults": [],
+        },
+    ],
+}
+
+
+def test_report_becomes_one_record_per_test() -> None:
+    tests = parse_report(REPORT, ROOT)
+
+    assert [(test["file"], test["name"], test["status"]) for test in tests] == [
+        ("src/Button.test.tsx", "Button > renders its label", "passed"),
+        ("src/Button.test.tsx", "Button > when disabled > ignores clicks", "failed"),
+        ("src/Button.test.tsx", "Button > supports icons", "skipped"),
+        ("src/Broken.test.tsx", "src/Broken.test.tsx", "failed"),
+    ]
+    assert tests[0]["duration"] == 12.35
+    assert tests[0]["failure_message"] is None
+    assert tests[1]["failure_message"].startswith("AssertionError")
+    assert tests[3]["failure_message"] == "Failed to resolve import \"./Missing\""
+    assert tests[3]["duration"] == 5
+
+
+def test_summary_counts_statuses() -> None:
+    summary = summarize(parse_report(REPORT, ROOT))
+    assert summary == {"passed": 1, "failed": 2, "skipped": 1, "total": 4, "summary": "1/4 tests passed"}
+
+
+def test_failures_are_formatted_for_repair() -> None:
+    failures = format_failures(parse_report(REPORT, ROOT))
+    assert "FAIL src/Button.test.tsx > Button > when disabled > ignores clicks\nAssertionError" in failures
+    assert "renders its label" not in failures
+    assert "Failed to resolve import" in failures
+
+
+def test_missing_or_corrupt_report_loads_as_none(tmp_path: Path) -> None:
+    assert load_report(tmp_path / "missing.json") is None
+    (tmp_path / "corrupt.json").write_text("{")
+    assert load_report(tmp_path / "corrupt.json") is None
+    (tmp_path / "report.json").write_text(json.dumps(REPORT))
+    assert load_report(tmp_path / "report.json") == REPORT
+
+
+def test_rerun_records_replace_those_of_their_files() -> None:
+    previous = parse_report(REPORT, ROOT)
+    rerun = [{"name": "Button > renders its label", "file": "src/Button.test.tsx", "status": "passed", "duration": 3.0, "failure_message": None}]
+
+    merged = merge_results(previous, rerun, {"src/Button.test.tsx"})
+
+    assert [test["file"] for test in merged] == ["src/Broken.test.tsx", "src/Button.test.tsx"]
+    assert summarize(merged)["failed"] == 1
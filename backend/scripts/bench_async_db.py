@@ -0,0 +1,89 @@
+"""
+Benchmark: sync Session vs. AsyncSession inside async routes, under concurrency.
+
+Serves the query behind GET /projects/{id}/test-runs/ both ways, in-process
+through httpx's ASGI transport, against the configured Postgres. The sync
+variant is how the studio's async routes used to query: every query blocks
+the event loop, so concurrent requests queue behind each other. Run from
+backend/ with the database up:
+
+    PYTHONPATH=. python scripts/bench_async_db.py [--requests 500] [--concurrency 50] [--query-delay 0.005]
+
+--query-delay adds pg_sleep() to each query, standing in for a slower query
+or a remote database.
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import async_crud, crud
+from app.core.db import async_engine, engine
+
+
+def build_app(query_delay: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/sync/{project_id}")
+    async def sync_route(project_id: uuid.UUID) -> int:
+        with Session(engine) as session:
+            if query_delay:
+                session.exec(text("SELECT pg_sleep(:delay)").bindparams(delay=query_delay))
+            return len(crud.get_test_runs_by_project(session=session, project_id=project_id))
+
+    @app.get("/async/{project_id}")
+    async def async_route(project_id: uuid.UUID) -> int:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            if query_delay:
+                await session.exec(text("SELECT pg_sleep(:delay)").bindparams(delay=query_delay))
+            return len(await async_crud.get_test_runs_by_project(session=session, project_id=project_id))
+
+    return app
+
+
+async def drive(app: FastAPI, path: str, requests: int, concurrency: int) -> float:
+    """Requests per second for `requests` GETs, `concurrency` at a time"""
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one() -> None:
+            async with semaphore:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        await one()  # Warm up the pool
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return requests / (time.perf_counter() - started)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--query-delay", type=float, default=0.005)
+    args = parser.parse_args()
+
+    app = build_app(args.query_delay)
+    project_id = uuid.uuid4()
+
+    print(f"{args.requests} requests, {args.concurrency} concurrent, query delay {args.query_delay * 1000:.1f} ms")
+    sync_rate = await drive(app, f"/sync/{project_id}", args.requests, args.concurrency)
+    print(f"{'sync Session (blocks the loop)':<40} {sync_rate:10.1f} req/s")
+    async_rate = await drive(app, f"/async/{project_id}", args.requests, args.concurrency)
+    print(f"{'AsyncSession':<40} {async_rate:10.1f} req/s")
+    print(f"{'speedup':<40} {async_rate / sync_rate:10.2f}x")
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark: incremental fence parser vs. the buffered line-split parser.
+
+Streaming with the buffered parser means re-parsing the accumulated response
+after every chunk (O(n^2) overall); the incremental parser touches each
+character once. Run from backend/:
+
+    PYTHONPATH=. python scripts/bench_fence_parser.py [--files 200] [--lines 200] [--chunk 16]
+"""
+
+import argparse
+import time
+from typing import Callable, Dict
+
+from app.services.fence_parser import FenceParser, parse_files
+
+
+def legacy_parse(response: str) -> Dict[str, str]:
+    """The original TestDrivenAgent._parse_files_from_response"""
+    files = {}
+    current_file = None
+    current_content = []
+    in_code_block = False
+
+    for line in response.split('\n'):
+        if line.startswith('```') and not in_code_block:
+            filename = line[3:].strip()
+            if filename:
+                current_file = filename
+                current_content = []
+                in_code_block = True
+        elif line.startswith('```') and in_code_block:
+            if current_file:
+                files[current_file] = '\n'.join(current_content)
+            current_file = None
+            current_content = []
+            in_code_block = False
+        elif in_code_block:
+            current_content.append(line)
+
+    return files
+
+
+def make_response(file_count: int, lines_per_file: int) -> str:
+    parts = ["Here are the generated files.\n"]
+    for i in range(file_count):
+        body = "\n".join(f"  const value{j} = compute({j}, 'component {i}');" for j in range(lines_per_file))
+        parts.append(f"```src/components/Component{i}.tsx\nexport function Component{i}() {{\n{body}\n}}\n```\n")
+    return "\n".join(parts)
+
+
+def timed(label: str, fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<40} {best * 1000:10.2f} ms")
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--chunk", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    response = make_response(args.files, args.lines)
+    chunks = [response[i:i + args.chunk] for i in range(0, len(response), args.chunk)]
+    print(f"response: {len(response) / 1024:.0f} KiB, {len(chunks)} chunks of {args.chunk} chars\n")
+
+    assert parse_files(response) == legacy_parse(response)
+
+    def incremental() -> None:
+        fence_parser = FenceParser()
+        for chunk in chunks:
+            fence_parser.feed(chunk)
+        fence_parser.close()
+
+    # Quadratic, so only a prefix of the stream is re-parsed and the rest extrapolated
+    sample = chunks[:2000]
+
+    def legacy_per_chunk() -> None:
+        buffered = ""
+        for chunk in sample:
+            buffered += chunk
+            legacy_parse(buffered)
+
+    timed("legacy, whole response", lambda: legacy_parse(response), args.repeat)
+    timed("incremental, whole response", lambda: parse_files(response), args.repeat)
+    timed("incremental, streamed chunks", incremental, args.repeat)
+    elapsed = timed(f"legacy, re-parse per chunk ({len(sample)} chunks)", legacy_per_chunk, 1)
+    if len(sample) < len(chunks):
+        estimate = elapsed * (len(chunks) / len(sample)) ** 2
+        print(f"{'  extrapolated to all chunks':<40} {estimate * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ import { useStudioStore } from '../stores/studioStore'
 import type { AgentStage, FileNode, TestResult, ReasoningStep } from '../stores/studioStore'
 
 export interface StreamingMessage {
-  type: 'token' | 'file_closed' | 'build_progress' | 'build_ok' | 'build_error' | 'stage_complete' | 'test_result' | 'reasoning_step' | 'hot_reload' | 'plugin_result' | 'error'
+  type: 'token' | 'file_closed' | 'build_progress' | 'build_ok' | 'build_error' | 'stage_complete' | 'test_result' | 'reasoning_step' | 'hot_reload' | 'plugin_result' | 'job_status' | 'error'
   content?: string
   filename?: string
   stage?: AgentStage
@@ -15,8 +15,13 @@ export interface StreamingMessage {
   new_value?: any
   plugin_name?: string
   files?: Record<string, string>
+  stream_metadata?: Record<string, any>
+  data?: Record<string, any>
+  seq?: number
 }
 
+const FINAL_JOB_STATUSES = ['succeeded', 'failed', 'cancelled']
+
 export interface UseEnhancedWebSocketOptions {
   projectId: string
   onMessage?: (message: StreamingMessage) => void
@@ -29,6 +34,9 @@ export function useEnhancedWebSocket({ projectId, onMessage, onError, onClose }:
   const reconnectTimeoutRef = useRef<NodeJS.Timeout>()
   const reconnectAttempts = useRef(0)
   const maxReconnectAttempts = 5
+  // Run being followed, so a reconnect resumes it instead of starting over
+  const runRef = useRef<{ id: string, lastSeq: number } | null>(null)
+  const runStorageKey = `studio-run:${projectId}`
   
   const {
     setConnectionStatus,
@@ -43,6 +51,23 @@ export function useEnhancedWebSocket({ projectId, onMessage, onError, onClose }:
     stopGeneration
   } = useStudioStore()
 
+  const trackRun = useCallback((message: StreamingMessage) => {
+    if (message.type === 'job_status' && message.data?.job_id) {
+      if (FINAL_JOB_STATUSES.includes(message.data.status)) {
+        runRef.current = null
+        sessionStorage.removeItem(runStorageKey)
+        return
+      }
+      if (runRef.current?.id !== message.data.job_id) {
+        runRef.current = { id: message.data.job_id, lastSeq: 0 }
+        sessionStorage.setItem(runStorageKey, message.data.job_id)
+      }
+    }
+    if (runRef.current && typeof message.seq === 'number') {
+      runRef.current.lastSeq = Math.max(runRef.current.lastSeq, message.seq)
+    }
+  }, [runStorageKey])
+
   const connect = useCallback(() => {
     if (wsRef.current?.readyState === WebSocket.OPEN) {
       return
@@ -60,11 +85,19 @@ export function useEnhancedWebSocket({ projectId, onMessage, onError, onClose }:
       console.log('WebSocket connected')
       setConnectionStatus('connected')
       reconnectAttempts.current = 0
+
+      // Resume an unfinished run: replayed from where this page left off, or
+      // from the start after a reload
+      const runId = runRef.current?.id ?? sessionStorage.getItem(runStorageKey)
+      if (runId) {
+        ws.send(JSON.stringify({ type: 'subscribe', run_id: runId, last_seq: runRef.current?.lastSeq ?? 0 }))
+      }
     }
 
     ws.onmessage = (event) => {
       try {
         const message: StreamingMessage = JSON.parse(event.data)
+        trackRun(message)
         handleMessage(message)
         onMessage?.(message)
       } catch (error) {
@@ -93,27 +126,29 @@ export function useEnhancedWebSocket({ projectId, onMessage, onError, onClose }:
         }, delay)
       }
     }
-  }, [projectId, setConnectionStatus, onMessage, onError, onClose])
+  }, [projectId, runStorageKey, trackRun, setConnectionStatus, onMessage, onError, onClose])
 
   const handleMessage = useCallback((message: StreamingMessage) => {
     switch (message.type) {
       case 'token':
         // Handle streaming code tokens
-        if (message.filename && message.content) {
+        if (message.filename && (message.content || message.stream_metadata?.file_start)) {
           // Update or create file with new content
           const fileId = message.filename.replace(/[^a-zA-Z0-9]/g, '_')
           const existingFile = useStudioStore.getState().files[fileId]
+          const content = message.content || ''
           
           if (existingFile) {
+            // file_start marks a fresh copy of the file (e.g. after a repair)
             updateFile(fileId, {
-              content: existingFile.content + message.content
+              content: message.stream_metadata?.file_start ? content : existingFile.content + content
             })
           } else {
             const newFile: FileNode = {
               id: fileId,
               name: message.filename.split('/').pop() || 'untitled',
               path: message.filename,
-              content: message.content,
+              content,
               language: getLanguageFromPath(message.filename),
               isModified: false,
               isNew: true
@@ -183,13 +218,14 @@ export function useEnhancedWebSocket({ projectId, onMessage, onError, onClose }:
         if (message.test_results) {
           clearTestResults()
           
-          if (message.test_results.test_details) {
-            message.test_results.test_details.forEach((test: any) => {
+          if (message.test_results.tests) {
+            message.test_results.tests.forEach((test: any) => {
               const result: TestResult = {
                 file: test.file,
-                status: test.status,
+                name: test.name,
+                status: test.status === 'passed' ? 'pass' : test.status === 'failed' ? 'fail' : 'pending',
                 duration: test.duration,
-                error: test.error
+                error: test.failure_message ?? undefined
               }
               addTestResult(result)
             })
@@ -252,6 +288,13 @@ export function useEnhancedWebSocket({ projectId, onMessage, onError, onClose }:
         }
         break
 
+      case 'job_status':
+        // Queued generation job changed state (progress arrives as other messages)
+        if (message.content === 'failed' || message.content === 'cancelled') {
+          stopGeneration()
+        }
+        break
+
       case 'error':
         // Error message
         setState('ERROR')
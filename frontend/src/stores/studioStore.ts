@@ -19,6 +19,7 @@ export interface FileNode {
 
 export interface TestResult {
   file: string
+  name?: string
   status: 'pass' | 'fail' | 'pending'
   duration?: number
   error?: string